@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Benchmark of sanitizing and parsing multi-megabyte Bugzilla responses.
+'''
+from __future__ import print_function
+
+import functools
+import os
+import timeit
+
+# pylint: disable=import-error
+from lxml import etree as ElementTree
+
+from suseapi.bugzilla import escape_xml_bytes, escape_xml_text
+
+TEST_DATA = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'suseapi',
+    'testdata'
+)
+
+
+def generate_response(size):
+    '''
+    Generates show_bug response of given size (in bytes) by repeating bug
+    from test data and adding some control chars.
+    '''
+    with open(os.path.join(TEST_DATA, 'bug-81873.xml'), 'rb') as handle:
+        data = handle.read()
+    bug = data[data.find(b'<bug>'):data.rfind(b'</bugzilla>')]
+    bug = bug.replace(b'testing', b'test\x02ing')
+    count = size // len(bug) + 1
+    return b''.join(
+        [data[:data.find(b'<bug>')]] + [bug] * count + [b'</bugzilla>']
+    )
+
+
+def sanitize_text(data):
+    '''
+    Original string based sanitizing.
+    '''
+    return escape_xml_text(data.decode('utf-8')).encode('utf-8')
+
+
+def parse_text(data):
+    '''
+    Original string based pipeline.
+    '''
+    # pylint: disable=no-member
+    parser = ElementTree.XMLParser(recover=True)
+    # pylint: disable=no-member
+    return ElementTree.fromstring(sanitize_text(data), parser)
+
+
+def parse_bytes(data):
+    '''
+    Bytes based pipeline.
+    '''
+    # pylint: disable=no-member
+    parser = ElementTree.XMLParser(recover=True)
+    # pylint: disable=no-member
+    return ElementTree.fromstring(escape_xml_bytes(data), parser)
+
+
+def main(size=8 * 1024 * 1024, repeat=5):
+    '''
+    Runs the benchmark.
+    '''
+    data = generate_response(size)
+    print('Response size: {0:.1f} MiB'.format(len(data) / 1024.0 / 1024.0))
+    assert len(parse_text(data)) == len(parse_bytes(data))
+
+    for name, function in (('sanitize text', sanitize_text),
+                           ('sanitize bytes', escape_xml_bytes),
+                           ('parse text', parse_text),
+                           ('parse bytes', parse_bytes)):
+        duration = min(timeit.repeat(
+            functools.partial(function, data), number=1, repeat=repeat
+        ))
+        print('{0:<30} {1:10.1f} ms'.format(name, duration * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+Benchmark suite of Bugzilla parsing on synthetic data.
+
+Measures throughput and peak memory and optionally compares the results
+with stored baseline, exiting with error on regressions.
+'''
+from __future__ import print_function
+
+import argparse
+import functools
+import json
+import sys
+import timeit
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from suseapi.bugzilla import (Bugzilla, CompactBug, escape_xml_bytes,
+                              escape_xml_text)
+from suseapi.cassette import synthetic_buglist, synthetic_bugs
+
+BASE = 'https://bugzilla.novell.com'
+
+
+def get_bugzilla(bug_class):
+    '''
+    Returns Bugzilla instance used for parsing.
+    '''
+    bugzilla = Bugzilla('', '', BASE, transport='urllib3')
+    bugzilla.bug_class = bug_class
+    return bugzilla
+
+
+def benchmarks(count, comments):
+    '''
+    Returns list of (name, data, function) benchmarks for given number of
+    bugs.
+    '''
+    ids = list(range(1, count + 1))
+    bugs = synthetic_bugs(ids, comments, control_chars=True)
+    buglist = synthetic_buglist(ids, BASE)
+    text = bugs.decode('utf-8')
+    bugzilla = get_bugzilla(Bugzilla.bug_class)
+    compact = get_bugzilla(CompactBug)
+    return [
+        ('escape_xml_text', text, escape_xml_text),
+        ('escape_xml_bytes', bugs, escape_xml_bytes),
+        ('parse bugs', bugs, lambda data: list(
+            bugzilla.parse_bugs(data, ids)
+        )),
+        ('parse compact bugs', bugs, lambda data: list(
+            compact.parse_bugs(data, ids)
+        )),
+        ('parse search', buglist, bugzilla.parse_search),
+    ]
+
+
+def measure_memory(function, data):
+    '''
+    Returns peak memory allocated by function in bytes.
+    '''
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    try:
+        function(data)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(sizes, comments, repeat):
+    '''
+    Runs the benchmarks and returns dictionary with results.
+    '''
+    results = {}
+    for count in sizes:
+        for name, data, function in benchmarks(count, comments):
+            duration = min(timeit.repeat(
+                functools.partial(function, data), number=1, repeat=repeat
+            ))
+            key = '{0} [{1}]'.format(name, count)
+            results[key] = {
+                'time': duration,
+                'items_per_second': count / duration,
+                'mb_per_second': len(data) / duration / 1024.0 / 1024.0,
+                'peak_memory': measure_memory(function, data),
+            }
+            print('{0:<32} {1:10.1f} ms {2:10.0f} bugs/s {3}'.format(
+                key,
+                duration * 1000,
+                count / duration,
+                format_memory(results[key]['peak_memory']),
+            ))
+    return results
+
+
+def format_memory(value):
+    '''
+    Formats memory size.
+    '''
+    if value is None:
+        return 'n/a'
+    return '{0:.1f} MiB'.format(value / 1024.0 / 1024.0)
+
+
+def compare(results, baseline, threshold):
+    '''
+    Compares results with baseline, returns list of regressions as tuples
+    of kind (time or memory) and description.
+    '''
+    regressions = []
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+        current = results[key]
+        previous = baseline[key]
+        limit = 1.0 + threshold
+        if previous['time'] * limit < current['time']:
+            regressions.append(('time', '{0}: {1:.1f} ms > {2:.1f} ms'.format(
+                key, current['time'] * 1000, previous['time'] * 1000
+            )))
+        if (current['peak_memory'] is not None and
+                previous['peak_memory'] is not None and
+                previous['peak_memory'] * limit < current['peak_memory']):
+            regressions.append(('memory', '{0}: {1} > {2}'.format(
+                key,
+                format_memory(current['peak_memory']),
+                format_memory(previous['peak_memory'])
+            )))
+    return regressions
+
+
+def main(args=None):
+    '''
+    Command line interface.
+    '''
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--sizes', default='1,100,1000,10000',
+        help='comma separated numbers of bugs'
+    )
+    parser.add_argument(
+        '--comments', type=int, default=10, help='comments per bug'
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=3, help='number of repeats'
+    )
+    parser.add_argument('--save', help='store results as baseline JSON')
+    parser.add_argument('--baseline', help='compare with baseline JSON')
+    parser.add_argument(
+        '--threshold', type=float, default=0.2,
+        help='allowed slowdown or memory increase (default 0.2 = 20%%)'
+    )
+    parser.add_argument(
+        '--time-warning', action='store_true',
+        help='only warn about slowdowns, timing is noisy on shared machines'
+    )
+    params = parser.parse_args(args)
+
+    results = run(
+        [int(size) for size in params.sizes.split(',')],
+        params.comments,
+        params.repeat
+    )
+
+    if params.save:
+        with open(params.save, 'w') as handle:
+            json.dump(results, handle, indent=2, sort_keys=True)
+
+    if params.baseline:
+        with open(params.baseline) as handle:
+            baseline = json.load(handle)
+        failed = False
+        for kind, regression in compare(results, baseline, params.threshold):
+            if kind == 'time' and params.time_warning:
+                print('WARNING {0} {1}'.format(kind, regression))
+            else:
+                print('REGRESSION {0} {1}'.format(kind, regression))
+                failed = True
+        if failed:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
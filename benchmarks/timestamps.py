@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Benchmark of Bugzilla timestamp parsing on test data.
+'''
+from __future__ import print_function
+
+import functools
+import glob
+import os
+import timeit
+
+import dateutil.parser
+# pylint: disable=import-error
+from lxml import etree as ElementTree
+
+from suseapi.bugzilla import Bug, parse_timestamp
+
+TEST_DATA = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'suseapi',
+    'testdata'
+)
+
+TIMESTAMP_TAGS = ('creation_ts', 'delta_ts', 'bug_when', 'date')
+
+
+def load_bugs():
+    '''
+    Loads bug elements from test data.
+    '''
+    result = []
+    for name in sorted(glob.glob(os.path.join(TEST_DATA, 'bug-*.xml'))):
+        # pylint: disable=no-member
+        tree = ElementTree.parse(name)
+        result.extend(
+            [bug for bug in tree.findall('bug') if bug.get('error') is None]
+        )
+    return result
+
+
+def load_timestamps(bugs):
+    '''
+    Extracts all timestamps from bug elements.
+    '''
+    result = []
+    for bug in bugs:
+        for tag in TIMESTAMP_TAGS:
+            result.extend([element.text for element in bug.iter(tag)])
+    return result
+
+
+def parse_all(function, timestamps):
+    '''
+    Parses all timestamps using given function.
+    '''
+    return [function(value) for value in timestamps]
+
+
+def report(name, count, duration):
+    '''
+    Prints benchmark result.
+    '''
+    print('{0:<30} {1:10.2f} us/item'.format(
+        name, duration * 1000000 / count
+    ))
+
+
+def main(repeat=20):
+    '''
+    Runs the benchmark.
+    '''
+    bugs = load_bugs()
+    timestamps = load_timestamps(bugs)
+    print('Loaded {0} bugs with {1} timestamps'.format(
+        len(bugs), len(timestamps)
+    ))
+
+    for name, function in (('dateutil.parser.parse', dateutil.parser.parse),
+                           ('parse_timestamp', parse_timestamp)):
+        duration = min(timeit.repeat(
+            functools.partial(parse_all, function, timestamps),
+            number=1,
+            repeat=repeat
+        ))
+        report(name, len(timestamps), duration)
+
+    duration = min(timeit.repeat(
+        lambda: [Bug(bug) for bug in bugs],
+        number=1,
+        repeat=repeat
+    ))
+    report('Bug', len(bugs), duration)
+
+
+if __name__ == '__main__':
+    main()
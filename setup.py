@@ -21,7 +21,9 @@
 #
 """Setup file for easy installation"""
 from setuptools import setup
+from setuptools.command.build_py import build_py
 import os
+import sys
 
 VERSION = __import__('suseapi').__version__
 
@@ -30,6 +32,22 @@ with open(os.path.join(os.path.dirname(__file__), 'README.rst')) as readme:
 
 REQUIRES = open('requirements.txt').read().split()
 
+# Modules using async/await syntax
+ASYNC_MODULES = ('aiobugzilla', 'test_aiobugzilla')
+
+
+class BuildPy(build_py):
+    """Skips asyncio based modules on Python without async support"""
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info < (3, 5):
+            modules = [
+                module for module in modules
+                if module[1] not in ASYNC_MODULES
+            ]
+        return modules
+
+
 setup(
     name='python-suseapi',
     version=VERSION,
@@ -47,6 +65,7 @@ setup(
     package_dir={'suseapi': 'suseapi'},
     package_data={'suseapi': [
         'testdata/*.xml',
+        'testdata/*.csv',
         'testdata/maintained/opensuse',
         'testdata/maintained/sles',
         'testdata/maintained/_svn/*',
@@ -54,6 +73,9 @@ setup(
     ]},
     long_description=LONG_DESCRIPTION,
     install_requires=REQUIRES,
+    extras_require={
+        'async:python_version >= "3.5"': ['aiohttp'],
+    },
     classifiers=[
         'Development Status :: 4 - Beta',
         'Topic :: Internet',
@@ -65,6 +87,7 @@ setup(
         'Programming Language :: Python :: 2.7',
     ],
 
+    cmdclass={'build_py': BuildPy},
     entry_points={
         'console_scripts': ['suseapi = suseapi.main:main']
     },
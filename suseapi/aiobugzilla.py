@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Asynchronous access to Bugzilla using asyncio and aiohttp.
+
+This module requires Python 3.5 or newer.
+'''
+import asyncio
+
+# pylint: disable=import-error
+from six.moves.urllib.parse import urlencode
+
+from suseapi.browser import DEFAULT_TIMEOUT, WebScraperError
+from suseapi.bugzilla import (APIBugzilla, BATCH_WORKERS,
+                              BugzillaLoginFailed, BugzillaNotPermitted,
+                              parse_sr_ids)
+
+# The parsing is shared with wrapped Bugzilla instance
+# pylint: disable=protected-access
+
+
+class AsyncBugzilla(object):
+    '''
+    Asynchronous counterpart of Bugzilla class.
+
+    It uses configuration, cookies and parsing of the wrapped Bugzilla
+    instance, only the HTTP requests are done using aiohttp.
+    '''
+    def __init__(self, bugzilla, limit=BATCH_WORKERS):
+        self.bugzilla = bugzilla
+        self.limit = limit
+        self.logger = bugzilla.logger
+        self._session = None
+        self._login_lock = None
+        # Number of logins done, used to detect concurrent relogin
+        self._logins = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        '''
+        Closes HTTP session.
+        '''
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        '''
+        Returns HTTP session, creating it on first use.
+        '''
+        if self._session is None:
+            import aiohttp
+            headers = {}
+            if self.bugzilla.useragent is not None:
+                headers['User-agent'] = self.bugzilla.useragent
+            auth = None
+            if (isinstance(self.bugzilla, APIBugzilla) and
+                    not self.bugzilla.anonymous):
+                auth = aiohttp.BasicAuth(
+                    self.bugzilla.user, self.bugzilla.password
+                )
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.limit),
+                timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT),
+                headers=headers,
+                auth=auth,
+            )
+            self._update_cookies()
+        return self._session
+
+    def _update_cookies(self):
+        '''
+        Copies cookies from wrapped Bugzilla instance.
+        '''
+        from yarl import URL
+        self._session.cookie_jar.update_cookies(
+            dict([
+                (cookie.name, cookie.value)
+                for cookie in self.bugzilla.get_cookies()
+            ]),
+            URL(self.bugzilla.base)
+        )
+
+    async def login(self, logins=None):
+        '''
+        Logins using wrapped Bugzilla instance and takes over its cookies.
+
+        The logins are serialized, when logins count is passed, the login
+        is skipped if other one has been completed meanwhile.
+        '''
+        if self._login_lock is None:
+            self._login_lock = asyncio.Lock()
+        async with self._login_lock:
+            if logins is not None and logins != self._logins:
+                return
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self.bugzilla.login)
+            self._logins += 1
+            if self._session is not None:
+                self._update_cookies()
+
+    async def request(self, action, paramlist=None, **kwargs):
+        '''
+        Performs single request on a server.
+
+        Returns tuple with content type and body.
+        '''
+        import aiohttp
+        url = self.bugzilla._get_req_url(action)
+        if paramlist is not None:
+            params = urlencode(paramlist)
+        elif kwargs == {}:
+            params = None
+        else:
+            params = urlencode(kwargs)
+        headers = {}
+        if params is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            async with self._get_session().post(
+                    url, data=params, headers=headers) as response:
+                if response.status >= 400:
+                    raise WebScraperError(
+                        'Status code error: {0!s}'.format(response.status),
+                        response
+                    )
+                return response.content_type, await response.read()
+        except aiohttp.ClientError as exc:
+            raise WebScraperError(
+                'HTTP error {0!s}: {1!s}'.format(type(exc).__name__, exc),
+                exc
+            )
+        except asyncio.TimeoutError as exc:
+            raise WebScraperError('Timeout error: {0!s}'.format(exc), exc)
+
+    async def get_bug(self, bugid, retry=True):
+        '''
+        Returns Bug object based on data received from bugzilla.
+
+        Returns None in case of failure.
+        '''
+        result = await self.get_bugs([bugid], retry)
+        if result:
+            return result[0]
+        return None
+
+    async def get_bugs(self, ids, retry=True, permissive=False,
+                       store_errors=False, include_fields=None,
+                       exclude_fields=None):
+        '''
+        Returns Bug objects based on data received from bugzilla for each
+        bug ID.
+        '''
+        ids = [bugid for bugid in ids if bugid is not None]
+        logins = self._logins
+        dummy, data = await self.request(
+            'show_bug',
+            paramlist=self.bugzilla.get_bugs_params(
+                ids, include_fields, exclude_fields
+            )
+        )
+        try:
+            return list(self.bugzilla.parse_bugs(
+                data, ids, permissive, store_errors
+            ))
+        except BugzillaNotPermitted as exc:
+            if not retry or self.bugzilla.anonymous:
+                raise exc
+            self.logger.error("%s - login and retry", exc)
+            await self.login(logins)
+            return await self.get_bugs(
+                ids, False, permissive, store_errors,
+                include_fields, exclude_fields
+            )
+
+    async def do_search(self, params):
+        '''
+        Performs search and returns list of IDs.
+        '''
+        req = [('ctype', 'atom')] + params
+        self.logger.info('Doing bugzilla search: %s', req)
+        content_type, data = await self.request('buglist', paramlist=req)
+        if content_type == 'text/html':
+            # Errors are reported as HTML pages
+            self.bugzilla._handle_parse_error(
+                'search', data.decode('utf-8', 'replace')
+            )
+            return []
+        return self.bugzilla.parse_search(data)
+
+    async def get_sr(self, bugid):
+        '''
+        Obtains SR ids from bugzilla.
+        '''
+        self.logger.info('Loading bug page for %d', bugid)
+        content_type, data = await self.request('show_bug', id=bugid)
+        if content_type != 'text/html':
+            raise BugzillaLoginFailed('Failed to load bugzilla form')
+        return parse_sr_ids(data)
@@ -21,7 +21,11 @@
 '''
 Web browser wrapper for convenient scraping of web based services.
 '''
+from contextlib import contextmanager
+import email
 import socket
+import time
+import zlib
 
 # import mechanize
 import grab
@@ -31,10 +35,27 @@ from six.moves.http_client import HTTPException
 from six.moves.urllib.error import URLError
 # pylint: disable=import-error
 from six.moves.urllib.parse import urlencode
+# pylint: disable=import-error
+from six.moves.urllib.request import Request
+
+from suseapi.pool import get_pool
 
 # The default timeout has to be an integer.
 DEFAULT_TIMEOUT = 50
 
+# Maximal number of parallel transfers in request_many
+DEFAULT_CONCURRENCY = 8
+
+# Content encodings we can decompress
+ACCEPT_ENCODING = 'gzip, deflate'
+CONTENT_ENCODINGS = ('gzip', 'x-gzip', 'deflate')
+
+# Size of compressed chunks fed to decompressor
+DECOMPRESS_CHUNK_SIZE = 64 * 1024
+
+# Longest URL of cacheable request sent as GET, longer ones are POSTed
+MAX_GET_URL_LENGTH = 2000
+
 
 class WebScraperError(Exception):
     '''
@@ -76,6 +97,137 @@ def webscraper_safely(call, *args, **kwargs):
         raise WebScraperError('IO error: {0!s}'.format(exc), exc)
 
 
+class WebResponse(object):
+    '''
+    Response returned by WebScraper.request_many.
+    '''
+    def __init__(self, url, code, headers, body):
+        self.url = url
+        self.code = code
+        self.headers = headers
+        self.body = body
+        self.total_time = 0.0
+
+    def info(self):
+        '''
+        Returns headers, for compatibility with cookie jar.
+        '''
+        return self.headers
+
+    def unicode_body(self):
+        '''
+        Returns decoded body.
+        '''
+        charset = self.headers.get_content_charset() or 'utf-8'
+        return self.body.decode(charset, 'replace')
+
+
+def parse_headers(lines):
+    '''
+    Parses raw header lines of last response.
+    '''
+    block = []
+    for line in lines:
+        line = line.decode('iso-8859-1')
+        # New status line starts headers of another response (redirect)
+        if line.startswith('HTTP/'):
+            block = []
+            continue
+        block.append(line)
+    return email.message_from_string(''.join(block))
+
+
+def get_content_encoding(headers):
+    '''
+    Returns content encoding we know to decompress or None.
+    '''
+    encoding = headers.get('Content-Encoding', '').strip().lower()
+    if encoding in CONTENT_ENCODINGS:
+        return encoding
+    return None
+
+
+class BodyStream(object):
+    '''
+    Iterator over response body, incrementally decompressing it.
+
+    This allows streaming parsers to consume decompressed data without
+    keeping whole decompressed body in memory. The callback is called with
+    number of decompressed bytes once the body is consumed.
+    '''
+    def __init__(self, body, encoding=None, callback=None,
+                 chunk_size=DECOMPRESS_CHUNK_SIZE):
+        self.body = body
+        self.encoding = encoding
+        self.callback = callback
+        self.chunk_size = chunk_size
+        self.compressed_size = len(body)
+        self.uncompressed_size = 0
+
+    def __iter__(self):
+        size = 0
+        if self.encoding is None:
+            for offset in range(0, len(self.body), self.chunk_size):
+                chunk = self.body[offset:offset + self.chunk_size]
+                size += len(chunk)
+                yield chunk
+        else:
+            # Accepts both gzip and zlib wrapped data, raw deflate streams
+            # sent by some servers are retried without header
+            wbits = zlib.MAX_WBITS | 32
+            if not self._has_header():
+                wbits = -zlib.MAX_WBITS
+            decompressor = zlib.decompressobj(wbits)
+            for offset in range(0, len(self.body), self.chunk_size):
+                chunk = decompressor.decompress(
+                    self.body[offset:offset + self.chunk_size]
+                )
+                if chunk:
+                    size += len(chunk)
+                    yield chunk
+            chunk = decompressor.flush()
+            if chunk:
+                size += len(chunk)
+                yield chunk
+        self.uncompressed_size = size
+        if self.callback is not None:
+            self.callback(size)
+            self.callback = None
+
+    def _has_header(self):
+        '''
+        Checks whether body starts with gzip or zlib header.
+        '''
+        header = bytearray(self.body[:2])
+        if len(header) < 2:
+            return True
+        if header[0] == 0x1f and header[1] == 0x8b:
+            return True
+        return (
+            (header[0] & 0x0f) == 8 and
+            (header[0] * 256 + header[1]) % 31 == 0
+        )
+
+    def read(self):
+        '''
+        Returns whole decompressed body.
+        '''
+        return b''.join(self)
+
+
+def load_document(browser, url, code, headers, body, reason='OK'):
+    '''
+    Loads stored response into grab browser as if it was downloaded.
+    '''
+    head = ['HTTP/1.1 {0} {1}'.format(code, reason)]
+    head.extend(['{0}: {1}'.format(name, value) for name, value in headers])
+    browser.setup_document(body, url=url)
+    browser.doc.head = '\r\n'.join(head + ['', '']).encode('utf-8')
+    browser.doc.parse()
+    browser.doc.code = code
+    return browser.doc
+
+
 class WebScraper(object):
     '''
     Web based scraper using mechanize.
@@ -85,21 +237,37 @@ class WebScraper(object):
         self.base = base
         self.user = user
         self.password = password
+        self.useragent = useragent
+        self.transport = transport
 
         self.cookie_set = False
 
+        # Instrumentation listeners
+        self.listeners = []
+
+        # Cassette for recording or replaying traffic
+        self.cassette = None
+
+        # Conditional HTTP cache
+        self.http_cache = None
+
         # Browser instance
         self.browser = grab.Grab(
             timeout=DEFAULT_TIMEOUT
         )
         self.browser.setup_transport(transport)
-        if transport == "urllib3":
-            import urllib3
-            import certifi
-            self.browser.transport.pool = urllib3.PoolManager(
-                cert_reqs='CERT_REQUIRED',
-                ca_certs=certifi.where()
-            )
+        # Negotiate compression, pycurl transport is told not to decode
+        # body, so that it can be decompressed incrementally
+        self.browser.setup(encoding='')
+        self.browser.config['common_headers']['Accept-Encoding'] = (
+            ACCEPT_ENCODING
+        )
+        # Sizes of bodies received from the network and after decoding
+        self.received_bytes = 0
+        self.decoded_bytes = 0
+        # Keep-alive connections shared with other instances
+        self.pool = None
+        self.set_pool(get_pool())
         # Grab automatically handles cookies.
 
         # Are we anonymous?
@@ -115,28 +283,461 @@ class WebScraper(object):
         '''
         return '%s/%s' % (self.base, action)
 
-    def request(self, action, paramlist=None, **kwargs):
+    def set_pool(self, pool):
+        '''
+        Configures connection pool to use.
+        '''
+        self.pool = pool
+        pool.setup(self.browser, self.transport)
+
+    def _prepare_pool(self):
+        '''
+        Prepares connection pool for request.
+        '''
+        self.pool.prepare(getattr(self.browser.transport, 'curl', None))
+
+    def _record_pool(self):
+        '''
+        Records finished request in connection pool.
+        '''
+        self.pool.record(getattr(self.browser.transport, 'curl', None))
+
+    def add_listener(self, listener):
+        '''
+        Adds instrumentation listener.
+        '''
+        self.listeners.append(listener)
+
+    def notify_timing(self, phase, duration, **tags):
+        '''
+        Passes duration of phase to listeners.
+        '''
+        for listener in self.listeners:
+            listener.timing(phase, duration, **tags)
+
+    def notify_count(self, name, value=1, **tags):
+        '''
+        Passes counted event to listeners.
+        '''
+        for listener in self.listeners:
+            listener.count(name, value, **tags)
+
+    @contextmanager
+    def measure(self, phase, **tags):
+        '''
+        Measures duration of the block and passes it to listeners.
+
+        The block can add tags to yielded dictionary, exception name is
+        added as error tag.
+        '''
+        start = time.time()
+        try:
+            yield tags
+        except Exception as exc:
+            tags['error'] = type(exc).__name__
+            raise
+        finally:
+            self.notify_timing(phase, time.time() - start, **tags)
+
+    def _measure_response(self, phase, tags, call, *args, **kwargs):
+        '''
+        Performs HTTP call with instrumentation.
+        '''
+        with self.measure(phase, **tags) as tags:
+            result = webscraper_safely(call, *args, **kwargs)
+            tags['status'] = result.code
+            tags['size'] = len(result.body)
+        return result
+
+    def request(self, action, paramlist=None, cacheable=False, **kwargs):
         '''
         Performs single request on a server (loads single page).
+
+        Cacheable requests are sent as GET when HTTP cache is configured.
         '''
-        url = self._get_req_url(action)
         if paramlist is not None:
             params = urlencode(paramlist)
         elif kwargs == {}:
             params = None
         else:
             params = urlencode(kwargs)
-        return webscraper_safely(
-            self.browser.go,
+        url, params = self._get_req_target(action, params, cacheable)
+        return self._measure_response(
+            'request', {'action': action},
+            self._go,
             url, post=params
         )
 
+    def request_stream(self, action, paramlist=None, cacheable=False):
+        '''
+        Performs single request on a server and returns BodyStream
+        yielding chunks of decompressed body.
+        '''
+        if paramlist is not None:
+            params = urlencode(paramlist)
+        else:
+            params = None
+        url, params = self._get_req_target(action, params, cacheable)
+        result = self._measure_response(
+            'request', {'action': action},
+            self._go,
+            url, post=params, decode=False
+        )
+        return BodyStream(
+            result.body, self._get_encoding(result), self._record_decoded
+        )
+
+    def _get_req_target(self, action, params, cacheable):
+        '''
+        Returns URL and POST data for request.
+
+        Only GET responses are stored in HTTP cache, so parameters of
+        cacheable (idempotent) requests are moved to the query string
+        when the cache is configured.
+        '''
+        url = self._get_req_url(action)
+        if cacheable and self.http_cache is not None and params is not None:
+            query_url = '{0}?{1}'.format(url, params)
+            # Servers and proxies reject too long URLs
+            if len(query_url) <= MAX_GET_URL_LENGTH:
+                return query_url, None
+        return url, params
+
+    def _go(self, url, post=None, decode=True):
+        '''
+        Loads URL, using cassette if configured.
+
+        Unless decode is False, compressed body is decompressed.
+        '''
+        if self.cassette is None:
+            self._prepare_pool()
+            if self.http_cache is None or post is not None:
+                result = self._fetch(url, post=post)
+            else:
+                result = self._go_cached(url)
+            self._record_pool()
+        else:
+            result = self.cassette.perform(self.browser, url, post)
+            self._record_received(len(result.body))
+        if decode:
+            return self._decode_document(result)
+        return result
+
+    def _fetch(self, url, **kwargs):
+        '''
+        Loads URL using browser, counting received bytes.
+        '''
+        result = self.browser.go(url, **kwargs)
+        self._record_received(self._get_received_size(result))
+        return result
+
+    def _get_received_size(self, result):
+        '''
+        Returns size of body as received from the network.
+        '''
+        if self.transport == 'urllib3':
+            # urllib3 decompresses the body itself, but knows how much
+            # data it has read
+            response = getattr(self.browser.transport, '_response', None)
+            if response is not None:
+                return response.tell()
+        return len(result.body)
+
+    def _get_encoding(self, result):
+        '''
+        Returns encoding of document body which needs to be decompressed.
+        '''
+        if self.transport == 'urllib3':
+            return None
+        return get_content_encoding(result.headers)
+
+    def _decode_document(self, result):
+        '''
+        Decompresses document body if needed.
+        '''
+        encoding = self._get_encoding(result)
+        if encoding is None:
+            self._record_decoded(len(result.body))
+            return result
+        body = BodyStream(result.body, encoding, self._record_decoded).read()
+        headers = [
+            (name, value) for name, value in result.headers.items()
+            if name.lower() not in ('content-encoding', 'content-length')
+        ]
+        return load_document(
+            self.browser, result.url, result.code, headers, body
+        )
+
+    def _record_received(self, size):
+        '''
+        Records size of body received from the network.
+        '''
+        self.received_bytes += size
+        self.notify_count('received_bytes', size)
+
+    def _record_decoded(self, size):
+        '''
+        Records size of decompressed body.
+        '''
+        self.decoded_bytes += size
+        self.notify_count('decoded_bytes', size)
+
+    def transfer_stats(self):
+        '''
+        Returns dictionary with sizes of received and decoded bodies.
+        '''
+        ratio = None
+        if self.received_bytes:
+            ratio = float(self.decoded_bytes) / self.received_bytes
+        return {
+            'received': self.received_bytes,
+            'decoded': self.decoded_bytes,
+            'ratio': ratio,
+        }
+
+    def _get_cache_key(self, url):
+        '''
+        Returns HTTP cache key for URL, responses depend on logged in user.
+        '''
+        return u'{0}@{1} {2}'.format(self.user or '', self.base, url)
+
+    def _go_cached(self, url):
+        '''
+        Loads URL, revalidating response stored in HTTP cache.
+        '''
+        key = self._get_cache_key(url)
+        entry = self.http_cache.get(key)
+        if entry is None:
+            result = self._fetch(url)
+            self.http_cache.store(key, result)
+            return result
+        headers = self.browser.config['headers']
+        conditional = dict(headers)
+        conditional.update(self.http_cache.validators(entry))
+        try:
+            result = self._fetch(url, headers=conditional)
+        finally:
+            self.browser.config['headers'] = headers
+        if result.code != 304:
+            self.http_cache.store(key, result)
+            return result
+        entry = self.http_cache.revalidated(key, entry, result)
+        self.notify_count('cache_hit', size=len(entry['body']))
+        return load_document(
+            self.browser, url, entry['code'], entry['headers'],
+            entry['body']
+        )
+
+    def request_many(self, requests, concurrency=DEFAULT_CONCURRENCY,
+                     raise_errors=True):
+        '''
+        Performs several requests concurrently using single pycurl multi
+        handle and cookies of the browser.
+
+        The requests are list of (action, paramlist) tuples, the responses
+        are returned in the same order. With raise_errors, first failure
+        is raised as WebScraperError, otherwise errors are returned in place
+        of responses.
+
+        Without pycurl transport the requests are performed sequentially.
+        '''
+        actions = [action for action, dummy in requests]
+        requests = [
+            (self._get_req_url(action), self._encode_params(paramlist))
+            for action, paramlist in requests
+        ]
+        if self.transport == 'pycurl' and self.cassette is None:
+            results = self._request_many_curl(requests, concurrency)
+        else:
+            results = [self._request_single(*request) for request in requests]
+        for action, result in zip(actions, results):
+            if isinstance(result, WebResponse):
+                self.notify_timing(
+                    'request', result.total_time,
+                    action=action, status=result.code, size=len(result.body)
+                )
+        if raise_errors:
+            for result in results:
+                if isinstance(result, WebScraperError):
+                    raise result
+        return results
+
+    @staticmethod
+    def _encode_params(paramlist):
+        '''
+        Encodes request parameters.
+        '''
+        if not paramlist:
+            return None
+        return urlencode(paramlist)
+
+    def _request_single(self, url, post):
+        '''
+        Performs request using browser, returning WebResponse or error.
+        '''
+        start = time.time()
+        try:
+            doc = webscraper_safely(self._go, url, post=post)
+        except WebScraperError as error:
+            return error
+        response = WebResponse(url, doc.code, doc.headers, doc.body)
+        response.total_time = time.time() - start
+        return response
+
+    def _create_curl(self):
+        '''
+        Creates curl handle for concurrent requests.
+
+        Every handle is driven by own clone of the browser, so that it is
+        configured same way as single requests.
+        '''
+        grab = self.browser.clone()
+        grab.init_transport()
+        curl = grab.transport.curl
+        curl.grab = grab
+        self.pool.setup_curl(curl)
+        return curl
+
+    def _setup_curl(self, curl, url, post):
+        '''
+        Configures curl handle for request.
+        '''
+        import pycurl
+        grab = curl.grab
+        grab.cookies = self.browser.cookies
+        grab.setup(url=url, post=post)
+        grab.prepare_request()
+        # Redirects are handled by grab for single requests
+        curl.setopt(pycurl.FOLLOWLOCATION, 1)
+        curl.url = url
+
+    def _finish_curl(self, curl):
+        '''
+        Creates WebResponse from finished curl handle and stores cookies.
+        '''
+        import pycurl
+        transport = curl.grab.transport
+        headers = parse_headers(transport.response_header_chunks)
+        body = b''.join(transport.response_body_chunks)
+        self._record_received(len(body))
+        encoding = get_content_encoding(headers)
+        if encoding is None:
+            self._record_decoded(len(body))
+        else:
+            body = BodyStream(body, encoding, self._record_decoded).read()
+            del headers['Content-Encoding']
+            del headers['Content-Length']
+        response = WebResponse(
+            curl.url, curl.getinfo(pycurl.RESPONSE_CODE), headers, body
+        )
+        response.total_time = curl.getinfo(pycurl.TOTAL_TIME)
+        self.browser.cookies.cookiejar.extract_cookies(
+            response, Request(curl.url)
+        )
+        if response.code >= 400:
+            return WebScraperError(
+                'Status code error: {0!s}'.format(response.code), response
+            )
+        return response
+
+    @staticmethod
+    def _perform_multi(multi):
+        '''
+        Runs transfers of multi handle as long as it is ready.
+        '''
+        import pycurl
+        while True:
+            ret, dummy = multi.perform()
+            if ret != pycurl.E_CALL_MULTI_PERFORM:
+                return
+
+    def _collect_curl(self, multi):
+        '''
+        Yields finished curl handles with their results.
+        '''
+        import pycurl
+        while True:
+            queued, succeeded, failed = multi.info_read()
+            for curl in succeeded:
+                multi.remove_handle(curl)
+                result = self._finish_curl(curl)
+                self.pool.record(curl)
+                yield curl, result
+            for curl, errno, message in failed:
+                multi.remove_handle(curl)
+                yield curl, WebScraperError(
+                    'Curl error {0}: {1}'.format(errno, message),
+                    pycurl.error(errno, message)
+                )
+            if not queued:
+                return
+
+    def _request_many_curl(self, requests, concurrency):
+        '''
+        Performs requests using pycurl multi handle.
+        '''
+        import pycurl
+        multi = pycurl.CurlMulti()
+        handles = [
+            self._create_curl()
+            for dummy in range(min(concurrency, len(requests)))
+        ]
+        free = list(handles)
+        pending = list(enumerate(requests))
+        pending.reverse()
+        results = [None] * len(requests)
+        try:
+            while pending or len(free) < len(handles):
+                # Start new transfers
+                while pending and free:
+                    index, (url, post) = pending.pop()
+                    curl = free.pop()
+                    self._setup_curl(curl, url, post)
+                    curl.index = index
+                    multi.add_handle(curl)
+
+                self._perform_multi(multi)
+
+                for curl, result in self._collect_curl(multi):
+                    results[curl.index] = result
+                    free.append(curl)
+
+                if len(free) < len(handles):
+                    multi.select(1.0)
+        finally:
+            for curl in handles:
+                curl.close()
+            multi.close()
+        return results
+
+    def _submit(self):
+        '''
+        Submits form, using cassette if configured.
+        '''
+        if self.cassette is None:
+            self._prepare_pool()
+            self.browser.doc.submit()
+            result = self.browser.doc
+            self._record_received(self._get_received_size(result))
+            self._record_pool()
+        else:
+            request = self.browser.doc.get_form_request()
+            post = request['post']
+            if post is not None:
+                post = urlencode(post)
+            result = self.cassette.perform(
+                self.browser, request['url'], post
+            )
+            self._record_received(len(result.body))
+        return self._decode_document(result)
+
     def submit(self):
         '''
         Submits currently selected browser form.
         '''
-        return webscraper_safely(
-            self.browser.doc.submit,
+        return self._measure_response(
+            'submit', {},
+            self._submit,
         )
 
     def set_cookies(self, cookies):
@@ -153,6 +754,21 @@ class WebScraper(object):
         '''
         return [cookie for cookie in self.browser.cookies.cookiejar]
 
+    def load_cookies(self, cookies):
+        '''
+        Loads cookies as returned by get_cookies, keeping their attributes.
+        '''
+        for cookie in cookies:
+            self.browser.cookies.cookiejar.set_cookie(cookie)
+        self.cookie_set = True
+
+    def copy_cookies(self, other):
+        '''
+        Copies all cookies from other scraper instance.
+        '''
+        self.load_cookies(other.get_cookies())
+        self.cookie_set = other.cookie_set
+
     def viewing_html(self):
         if not self.browser.doc:
             return False
@@ -0,0 +1,597 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Parsing of bug data returned by Novell Bugzilla.
+'''
+
+# pylint: disable=import-error
+from lxml import etree as ElementTree
+# pylint: disable=import-error
+from lxml import html as HTMLTree
+import dateutil.parser
+import dateutil.tz
+import re
+from datetime import datetime
+
+from suseapi.browser import WebScraperError
+
+
+SR_MATCH = re.compile(r'\[(\d+)\]')
+
+# pylint: disable=no-member
+REPORT_VIEW_LINK = ElementTree.XPath("//a[text()='Report View']/@href")
+
+# Control chars which confuse XML parser, skip newline, carriage return and
+# tabulator chars
+XML_CONTROL_CHARS = [char for char in range(32) if char not in (9, 10, 13)]
+
+ESCAPE_XML_TEXT = dict([
+    (chr(char), '\\x%02d' % char) for char in XML_CONTROL_CHARS
+])
+ESCAPE_XML_TEXT_MATCH = re.compile(
+    '[%s]' % ''.join([re.escape(char) for char in ESCAPE_XML_TEXT])
+)
+
+ESCAPE_XML_BYTES = dict([
+    (key.encode('ascii'), value.encode('ascii'))
+    for key, value in ESCAPE_XML_TEXT.items()
+])
+ESCAPE_XML_BYTES_MATCH = re.compile(
+    b'[' + b''.join([re.escape(char) for char in ESCAPE_XML_BYTES]) + b']'
+)
+
+# Timestamp format used by Bugzilla, eg. 2014-07-17 11:38:53 +0200
+TIMESTAMP_MATCH = re.compile(
+    r'^(\d{4})-(\d\d)-(\d\d) (\d\d):(\d\d)(?::(\d\d))? ([+-])(\d\d)(\d\d)$'
+)
+
+# Cache of timezone objects for parse_timestamp
+TIMEZONES = {}
+
+# Marker of successfully changed bug in process_bug output
+MASS_UPDATE_MATCH = re.compile(
+    r'Changes submitted for\s*<a[^>]*show_bug\.cgi\?id=(\d+)'
+)
+
+# Fields stored in slots by CompactBug
+BUG_FIELDS = (
+    'bug_id', 'creation_ts', 'short_desc', 'delta_ts', 'reporter_accessible',
+    'cclist_accessible', 'classification_id', 'classification', 'product',
+    'component', 'version', 'rep_platform', 'op_sys', 'bug_status',
+    'resolution', 'dup_id', 'see_also', 'bug_file_loc', 'status_whiteboard',
+    'keywords', 'priority', 'bug_severity', 'target_milestone',
+    'everconfirmed', 'reporter', 'assigned_to', 'qa_contact', 'votes',
+    'comment_sort_order', 'estimated_time', 'remaining_time', 'actual_time',
+    'deadline', 'token',
+)
+
+
+class BugzillaError(WebScraperError):
+    '''Generic error'''
+
+    def __init__(self, error, bug_id=None):
+        super(BugzillaError, self).__init__(error)
+        self.bug_id = bug_id
+        self.error = error
+
+    def __str__(self):
+        if self.bug_id is not None:
+            return "%s: %s: %s" % (self.__doc__, self.error, self.bug_id)
+        return "%s: %s" % (self.__doc__, self.error)
+
+
+class BugzillaNotPermitted(BugzillaError):
+    '''Access not permitted'''
+    pass
+
+
+class BugzillaNotFound(BugzillaError):
+    '''Bug was not found'''
+    pass
+
+
+class BugzillaInvalidBugId(BugzillaError):
+    '''Bug Id is invalid'''
+    pass
+
+
+def escape_xml_text(data):
+    '''
+    Fix some XML errors in bugzilla xml, which confuse proper XML parser.
+    '''
+    return ESCAPE_XML_TEXT_MATCH.sub(
+        lambda match: ESCAPE_XML_TEXT[match.group(0)], data
+    )
+
+
+def escape_xml_bytes(data):
+    '''
+    Same as escape_xml_text, but operates on encoded data.
+
+    This is safe for UTF-8 as the escaped bytes never appear within
+    multibyte sequences.
+    '''
+    return ESCAPE_XML_BYTES_MATCH.sub(
+        lambda match: ESCAPE_XML_BYTES[match.group(0)], data
+    )
+
+
+def parse_timestamp(value):
+    '''
+    Parses timestamp in format used by Bugzilla.
+
+    Falls back to dateutil for other formats.
+    '''
+    match = TIMESTAMP_MATCH.match(value)
+    if match is None:
+        return dateutil.parser.parse(value)
+    (year, month, day, hour, minute, second,
+     tz_sign, tz_hours, tz_minutes) = match.groups()
+    offset = tz_sign + tz_hours + tz_minutes
+    try:
+        tzinfo = TIMEZONES[offset]
+    except KeyError:
+        seconds = int(tz_hours) * 3600 + int(tz_minutes) * 60
+        if seconds == 0:
+            tzinfo = dateutil.tz.tzutc()
+        elif tz_sign == '-':
+            tzinfo = dateutil.tz.tzoffset(None, -seconds)
+        else:
+            tzinfo = dateutil.tz.tzoffset(None, seconds)
+        TIMEZONES[offset] = tzinfo
+    return datetime(
+        int(year), int(month), int(day), int(hour), int(minute),
+        int(second or 0), tzinfo=tzinfo
+    )
+
+
+def check_bug_error(bug_et):
+    '''
+    Raises exception if bug element contains error.
+    '''
+    error = bug_et.get('error')
+    if error is not None:
+        bug_id = bug_et.find("bug_id")
+        if bug_id is not None:
+            bug_id = bug_id.text
+        if error == 'NotPermitted':
+            raise BugzillaNotPermitted(error, bug_id)
+        if error == 'NotFound':
+            raise BugzillaNotFound(error, bug_id)
+        if error == 'InvalidBugId':
+            raise BugzillaInvalidBugId(error, bug_id)
+        raise BugzillaError(error)
+
+
+def check_comment(element, anonymous=False, bug_id=None):
+    '''
+    Checks whether comment element contains author and time of change.
+    '''
+    if anonymous:
+        return
+    if element.find('who') is None:
+        raise BugzillaNotPermitted(
+            'Could not load author from bugzilla', bug_id
+        )
+    if element.find('bug_when') is None:
+        raise BugzillaNotPermitted(
+            'Could not load time of change from bugzilla', bug_id
+        )
+
+
+def get_element_text(element, tag):
+    '''
+    Returns text of child element, None if it is missing or empty.
+
+    Unlike findtext, this keeps None for empty elements.
+    '''
+    child = element.find(tag)
+    if child is None:
+        return None
+    return child.text
+
+
+def parse_comment(element, anonymous=False, bug_id=None):
+    '''
+    Parses comment data from element tree instance.
+    '''
+    check_comment(element, anonymous, bug_id)
+
+    who_elm = element.find('who')
+    if who_elm is None:
+        who = ''
+    else:
+        who = who_elm.text
+
+    when_elm = element.find('bug_when')
+    if when_elm is None:
+        when = None
+    else:
+        when = parse_timestamp(when_elm.text)
+
+    return {
+        'who': who,
+        'bug_when': when,
+        'private': (element.get('isprivate') == '1'),
+        'thetext': get_element_text(element, 'thetext'),
+    }
+
+
+def parse_attachment(element):
+    '''
+    Parses attachment data from element tree instance.
+    '''
+    date = get_element_text(element, 'date')
+    if date is not None:
+        date = parse_timestamp(date)
+    return {
+        'attachid': get_element_text(element, 'attachid'),
+        'desc': get_element_text(element, 'desc'),
+        'date': date,
+        'filename': get_element_text(element, 'filename'),
+        'type': get_element_text(element, 'type'),
+        'size': get_element_text(element, 'size'),
+        'attacher': get_element_text(element, 'attacher'),
+        'ispatch': element.get('ispatch', '0') == '1',
+        'isobsolete': element.get('isobsolete', '0') == '1',
+    }
+
+
+def parse_flag(element):
+    '''
+    Parses flag data from element tree instance.
+    '''
+    flag = {}
+    flag_attributes = ['name', 'id', 'type_id', 'status', 'setter',
+                       'requestee']
+    for attribute in flag_attributes:
+        value = element.get(attribute)
+        if value:
+            flag[attribute] = value
+    return flag
+
+
+def update_whiteboard(whiteboard, remove=None, add=None):
+    '''
+    Returns whiteboard with given text removed and added.
+    '''
+    if remove is not None and remove in whiteboard:
+        whiteboard = whiteboard.replace(remove, '')
+
+    if add is not None and add not in whiteboard:
+        whiteboard = '%s %s' % (whiteboard, add)
+
+    return whiteboard
+
+
+def parse_mass_update(data):
+    '''
+    Returns set of bug ids reported as changed by process_bug.
+    '''
+    return set([int(bugid) for bugid in MASS_UPDATE_MATCH.findall(data)])
+
+
+def parse_sr_ids(data):
+    '''
+    Extracts SR ids from HTML page with a bug.
+    '''
+    # pylint: disable=no-member
+    links = REPORT_VIEW_LINK(HTMLTree.fromstring(data))
+    if not links:
+        return []
+
+    # Split parts (URL encoded)
+    urlpart = [x for x in links[0].split('%26') if x[:7] == 'lsMSRID']
+
+    if not urlpart:
+        return []
+
+    # Find SR ids
+    match = SR_MATCH.findall(urlpart[0])
+
+    # Convert to integers
+    return [int(x) for x in match]
+
+
+class Bug(object):
+    '''
+    Class holding bug information.
+    '''
+
+    def __init__(self, bug_et, anonymous=False):
+        self.bug_id = None
+        check_bug_error(bug_et)
+        self.cc_list = []
+        self.groups = []
+        self.comments = []
+        self.attachments = []
+        self.aliases = []
+        self.delta_ts = None
+        self.creation_ts = None
+        self.anonymous = anonymous
+        self.flags = []
+        for element in bug_et.getchildren():
+            self.process_element(element)
+
+    def has_nonempty(self, name):
+        '''
+        Checks whether object has nonempty attribute.
+        '''
+        value = getattr(self, name, None)
+        return value is not None and value != ''
+
+    @property
+    def comment_count(self):
+        '''
+        Number of comments.
+        '''
+        return len(self.comments)
+
+    @property
+    def attachment_count(self):
+        '''
+        Number of attachments.
+        '''
+        return len(self.attachments)
+
+    @property
+    def flag_count(self):
+        '''
+        Number of flags.
+        '''
+        return len(self.flags)
+
+    @property
+    def cc_count(self):
+        '''
+        Number of people on CC list.
+        '''
+        return len(self.cc_list)
+
+    def to_dict(self):
+        '''
+        Returns dictionary with bug data.
+        '''
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, data):
+        '''
+        Creates bug from dictionary returned by to_dict.
+        '''
+        bug = cls.__new__(cls)
+        bug.__dict__.update(data)
+        return bug
+
+    def process_element(self, element):
+        '''
+        Parses data from element tree instance and stores them within
+        this object.
+        '''
+        if element.tag == 'cc':
+            self.cc_list.append(element.text)
+        elif element.tag == 'alias':
+            self.aliases.append(element.text)
+        elif element.tag == 'group':
+            self.groups.append(element.text)
+        elif element.tag == 'creation_ts':
+            self.creation_ts = parse_timestamp(element.text)
+        elif element.tag == 'delta_ts':
+            self.delta_ts = parse_timestamp(element.text)
+        elif element.tag == 'flag':
+            self.process_flag(element)
+        elif not element.getchildren():
+            setattr(self, element.tag, element.text)
+        elif element.tag == 'long_desc':
+            self.process_comment(element)
+        elif element.tag == 'attachment':
+            self.process_attachment(element)
+
+    def process_attachment(self, element):
+        '''
+        Stores attachment data within this object.
+        '''
+        self.attachments.append(parse_attachment(element))
+
+    def process_comment(self, element):
+        '''
+        Stores commend data within this object.
+        '''
+        self.comments.append(
+            parse_comment(element, self.anonymous, self.bug_id)
+        )
+
+    def process_flag(self, element):
+        '''
+        Store the given flag in the flag-list.
+        '''
+        self.flags.append(parse_flag(element))
+
+
+class CompactBug(object):
+    '''
+    Memory efficient class holding bug information.
+
+    Known fields are stored in slots, comments and attachments are kept as
+    raw XML and parsed on first access.
+    '''
+    __slots__ = BUG_FIELDS + (
+        'anonymous', 'cc_list', 'groups', 'aliases', 'flags', '_extra',
+        '_raw_comments', '_raw_attachments', '_comments', '_attachments',
+    )
+
+    def __init__(self, bug_et, anonymous=False):
+        self._extra = {}
+        self.bug_id = None
+        check_bug_error(bug_et)
+        self.cc_list = []
+        self.groups = []
+        self.aliases = []
+        self.flags = []
+        self._raw_comments = []
+        self._raw_attachments = []
+        self._comments = None
+        self._attachments = None
+        self.delta_ts = None
+        self.creation_ts = None
+        self.anonymous = anonymous
+        for element in bug_et.iterchildren():
+            self.process_element(element)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._extra[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    @property
+    def comments(self):
+        '''
+        List of comments, parsed on first access.
+        '''
+        if self._comments is None:
+            self._comments = [
+                parse_comment(
+                    ElementTree.fromstring(raw), self.anonymous, self.bug_id
+                )
+                for raw in self._raw_comments
+            ]
+            self._raw_comments = None
+        return self._comments
+
+    @property
+    def attachments(self):
+        '''
+        List of attachments, parsed on first access.
+        '''
+        if self._attachments is None:
+            self._attachments = [
+                parse_attachment(ElementTree.fromstring(raw))
+                for raw in self._raw_attachments
+            ]
+            self._raw_attachments = None
+        return self._attachments
+
+    @property
+    def comment_count(self):
+        '''
+        Number of comments, does not parse them.
+        '''
+        if self._comments is None:
+            return len(self._raw_comments)
+        return len(self._comments)
+
+    @property
+    def attachment_count(self):
+        '''
+        Number of attachments, does not parse them.
+        '''
+        if self._attachments is None:
+            return len(self._raw_attachments)
+        return len(self._attachments)
+
+    @property
+    def flag_count(self):
+        '''
+        Number of flags.
+        '''
+        return len(self.flags)
+
+    @property
+    def cc_count(self):
+        '''
+        Number of people on CC list.
+        '''
+        return len(self.cc_list)
+
+    def has_nonempty(self, name):
+        '''
+        Checks whether object has nonempty attribute.
+        '''
+        value = getattr(self, name, None)
+        return value is not None and value != ''
+
+    def to_dict(self):
+        '''
+        Returns dictionary with bug data, comments and attachments are
+        parsed.
+        '''
+        data = dict(self._extra)
+        for name in BUG_FIELDS + ('anonymous', 'cc_list', 'groups',
+                                  'aliases', 'flags'):
+            try:
+                data[name] = getattr(self, name)
+            except AttributeError:
+                continue
+        data['comments'] = self.comments
+        data['attachments'] = self.attachments
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        '''
+        Creates bug from dictionary returned by to_dict.
+        '''
+        bug = cls.__new__(cls)
+        bug._extra = {}
+        bug._raw_comments = None
+        bug._raw_attachments = None
+        bug._comments = data.get('comments', [])
+        bug._attachments = data.get('attachments', [])
+        for name, value in data.items():
+            if name in ('comments', 'attachments'):
+                continue
+            elif name in cls.__slots__:
+                setattr(bug, name, value)
+            else:
+                bug._extra[name] = value
+        return bug
+
+    def process_element(self, element):
+        '''
+        Parses data from element tree instance and stores them within
+        this object.
+        '''
+        if element.tag == 'cc':
+            self.cc_list.append(element.text)
+        elif element.tag == 'alias':
+            self.aliases.append(element.text)
+        elif element.tag == 'group':
+            self.groups.append(element.text)
+        elif element.tag == 'creation_ts':
+            self.creation_ts = parse_timestamp(element.text)
+        elif element.tag == 'delta_ts':
+            self.delta_ts = parse_timestamp(element.text)
+        elif element.tag == 'flag':
+            self.flags.append(parse_flag(element))
+        elif not len(element):
+            if element.tag in BUG_FIELDS:
+                setattr(self, element.tag, element.text)
+            else:
+                self._extra[element.tag] = element.text
+        elif element.tag == 'long_desc':
+            # Check permissions now to behave same as Bug
+            check_comment(element, self.anonymous, self.bug_id)
+            self._raw_comments.append(ElementTree.tostring(element))
+        elif element.tag == 'attachment':
+            self._raw_attachments.append(ElementTree.tostring(element))
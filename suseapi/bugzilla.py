@@ -28,54 +28,79 @@ It uses XML to load the data (when applicable) and HTML forms to update it.
 from six.moves.urllib.parse import urljoin
 # pylint: disable=import-error
 from lxml import etree as ElementTree
-import dateutil.parser
 import traceback
-import re
+import hashlib
+import time
 import logging
+from datetime import datetime, timedelta
+import threading
+from multiprocessing.pool import ThreadPool
 from bs4 import BeautifulSoup
 from weblib.error import DataNotFound
 
-from suseapi.browser import WebScraper, WebScraperError, webscraper_safely
+from suseapi.browser import WebScraper, WebScraperError
+from suseapi.bugdata import (
+    BugzillaError, BugzillaNotPermitted, BugzillaNotFound,
+    BugzillaInvalidBugId, escape_xml_text, escape_xml_bytes, parse_timestamp,
+    parse_comment, parse_attachment, update_whiteboard, parse_mass_update,
+    parse_sr_ids, Bug, CompactBug,
+)
+from suseapi.cacher import CacherMixin, DjangoCacherMixin
+from suseapi.export import (
+    EXPORT_COLUMNS, iter_bug_rows, export_numpy, export_csv, iter_csv_rows,
+    BuglistRow,
+)
+from suseapi.instrument import PhaseTimer
 from .compat import text_type
 
+# Parsing and export helpers live in suseapi.bugdata and suseapi.export,
+# they are still available here for compatibility
+__all__ = (
+    'BugzillaError', 'BugzillaNotPermitted', 'BugzillaNotFound',
+    'BugzillaInvalidBugId', 'BugzillaConnectionError', 'BugzillaLoginFailed',
+    'BuglistTooLarge', 'BugzillaUpdateError', 'BugzillaMidAirCollision',
+    'escape_xml_text', 'escape_xml_bytes', 'parse_timestamp',
+    'parse_comment', 'parse_attachment', 'update_whiteboard',
+    'parse_mass_update', 'parse_sr_ids', 'Bug', 'CompactBug',
+    'EXPORT_COLUMNS', 'iter_bug_rows', 'export_numpy', 'export_csv',
+    'BuglistRow', 'Bugzilla', 'APIBugzilla', 'DjangoBugzilla',
+    'get_django_bugzilla',
+)
 
-SR_MATCH = re.compile(r'\[(\d+)\]')
 
-IGNORABLE_FIELDS = frozenset((
-    'commentprivacy',
-    'comment_is_private',
-    'addselfcc',
-    'groups',
-))
+# Size of chunks fed to incremental XML parser
+STREAM_CHUNK_SIZE = 65536
 
+# Number of bugs fetched in single request in batched mode
+BATCH_SIZE = 100
 
-class BugzillaError(WebScraperError):
-    '''Generic error'''
+# Number of parallel connections in batched mode
+BATCH_WORKERS = 4
 
-    def __init__(self, error, bug_id=None):
-        super(BugzillaError, self).__init__(error)
-        self.bug_id = bug_id
-        self.error = error
+# Number of retries on mid-air collision in bulk update
+UPDATE_RETRIES = 3
 
-    def __str__(self):
-        if self.bug_id is not None:
-            return "%s: %s: %s" % (self.__doc__, self.error, self.bug_id)
-        return "%s: %s" % (self.__doc__, self.error)
+# Shortest interval which is split in range search
+MIN_SEARCH_INTERVAL = timedelta(seconds=1)
 
+# Format of date used in search
+SEARCH_DATE_FORMAT = '%Y-%m-%d %H:%M:%S +0000'
 
-class BugzillaNotPermitted(BugzillaError):
-    '''Access not permitted'''
-    pass
-
+# Search for security bugs
+SECBUGS_SEARCH = [
+    ('short_desc', '^VUL-[0-9]'),
+    ('query_format', 'advanced'),
+    ('short_desc_type', 'regexp'),
+    ('component', 'Incidents'),
+    ('product', 'SUSE Security Incidents'),
+]
 
-class BugzillaNotFound(BugzillaError):
-    '''Bug was not found'''
-    pass
-
-
-class BugzillaInvalidBugId(BugzillaError):
-    '''Bug Id is invalid'''
-    pass
+IGNORABLE_FIELDS = frozenset((
+    'commentprivacy',
+    'comment_is_private',
+    'addselfcc',
+    'groups',
+))
 
 
 class BugzillaConnectionError(BugzillaError):
@@ -98,158 +123,99 @@ class BugzillaUpdateError(BugzillaConnectionError):
     pass
 
 
-def escape_xml_text(data):
-    '''
-    Fix some XML errors in bugzilla xml, which confuse proper XML parser.
-    '''
-    replacement_map = dict([
-        (chr(orig), '\\x%02d' % orig) for orig in range(32)
-        # skipt newline, carriage return and tabulator chars
-        if orig not in (9, 10, 13)
-    ])
-
-    substrs = sorted(replacement_map, key=len, reverse=True)
-    regexp = re.compile('|'.join([re.escape(s) for s in substrs]))
-    return regexp.sub(lambda match: replacement_map[match.group(0)], data)
+class BugzillaMidAirCollision(BugzillaUpdateError):
+    '''Bug was changed while updating'''
+    pass
 
 
-class Bug(object):
+class Bugzilla(WebScraper, CacherMixin):
     '''
-    Class holding bug information.
+    Class for access to Novell bugzilla.
     '''
+    # Class used to hold bug data, can be set to CompactBug
+    bug_class = Bug
+    # Number of seconds search results are cached, None disables caching
+    search_cache_ttl = None
+    # Number of seconds expired search results are still returned while
+    # being refreshed in background
+    search_cache_stale = 0
+    cache_key_template = 'bugzilla-search-%s'
+    # Searches being currently performed, shared by all instances
+    _search_pending = {}
+    _search_lock = threading.Lock()
 
-    def __init__(self, bug_et, anonymous=False):
-        error = bug_et.get('error')
-        self.bug_id = None
-        if error is not None:
-            bug_id = bug_et.find("bug_id")
-            if bug_id is not None:
-                self.bug_id = bug_id.text
-            if error == 'NotPermitted':
-                raise BugzillaNotPermitted(error, self.bug_id)
-            if error == 'NotFound':
-                raise BugzillaNotFound(error, self.bug_id)
-            if error == 'InvalidBugId':
-                raise BugzillaInvalidBugId(error, self.bug_id)
-            raise BugzillaError(error)
-        self.cc_list = []
-        self.groups = []
-        self.comments = []
-        self.attachments = []
-        self.aliases = []
-        self.delta_ts = None
-        self.creation_ts = None
-        self.anonymous = anonymous
-        self.flags = []
-        for element in bug_et.getchildren():
-            self.process_element(element)
-
-    def has_nonempty(self, name):
-        '''
-        Checks whether object has nonempty attribute.
-        '''
-        value = getattr(self, name, None)
-        return value is not None and value != ''
-
-    def process_element(self, element):
-        '''
-        Parses data from element tree instance and stores them within
-        this object.
-        '''
-        if element.tag == 'cc':
-            self.cc_list.append(element.text)
-        elif element.tag == 'alias':
-            self.aliases.append(element.text)
-        elif element.tag == 'group':
-            self.groups.append(element.text)
-        elif element.tag == 'creation_ts':
-            self.creation_ts = dateutil.parser.parse(element.text)
-        elif element.tag == 'delta_ts':
-            self.delta_ts = dateutil.parser.parse(element.text)
-        elif element.tag == 'flag':
-            self.process_flag(element)
-        elif not element.getchildren():
-            setattr(self, element.tag, element.text)
-        elif element.tag == 'long_desc':
-            self.process_comment(element)
-        elif element.tag == 'attachment':
-            self.process_attachment(element)
-
-    def process_attachment(self, element):
-        '''
-        Stores attachment data within this object.
-        '''
-        self.attachments.append({
-            'attachid': element.find('attachid').text,
-            'desc': element.find('desc').text,
-            'date': dateutil.parser.parse(element.find('date').text),
-            'filename': element.find('filename').text,
-            'type': element.find('type').text,
-            'size': element.find('size').text,
-            'attacher': element.find('attacher').text,
-            'ispatch': element.get('ispatch', '0') == '1',
-            'isobsolete': element.get('isobsolete', '0') == '1',
-        })
-
-    def process_comment(self, element):
-        '''
-        Stores commend data within this object.
-        '''
-        who_elm = element.find('who')
-        if who_elm is None:
-            if not self.anonymous:
-                raise BugzillaNotPermitted(
-                    'Could not load author from bugzilla', self.bug_id
-                )
-            else:
-                who = ''
-        else:
-            who = who_elm.text
+    def __init__(self, user, password, base='https://bugzilla.novell.com',
+                 useragent=None, force_readonly=False, transport='pycurl',
+                 session_store=None):
+        super(Bugzilla, self).__init__(
+            user, password, base, useragent, transport
+        )
+        self.force_readonly = force_readonly
+        self.session_store = session_store
+        # Cookies thrown away on relogin, not to be picked up again
+        self.discarded_cookies = None
+        self.logger = logging.getLogger('suse.bugzilla')
 
-        when_elm = element.find('bug_when')
-        if when_elm is None:
-            if not self.anonymous:
-                raise BugzillaNotPermitted(
-                    'Could not load time of change from bugzilla', self.bug_id
-                )
-            else:
-                when = None
-        else:
-            when = dateutil.parser.parse(when_elm.text)
+    def clone(self):
+        '''
+        Creates new instance with same configuration and cookies, but
+        separate browser, so it can be used from another thread.
+        '''
+        result = self.__class__(
+            self.user, self.password, self.base, self.useragent,
+            self.force_readonly, self.transport, self.session_store
+        )
+        result.copy_cookies(self)
+        result.set_pool(self.pool)
+        result.http_cache = self.http_cache
+        result.bug_class = self.bug_class
+        result.search_cache_ttl = self.search_cache_ttl
+        result.search_cache_stale = self.search_cache_stale
+        result.listeners = self.listeners
+        result.cassette = self.cassette
+        return result
+
+    def _parallel_map(self, function, items, workers):
+        '''
+        Calls function(bugzilla, item) for every item using pool of worker
+        threads, each having own cloned browser.
 
-        self.comments.append({
-            'who': who,
-            'bug_when': when,
-            'private': (element.get('isprivate') == '1'),
-            'thetext': element.find('thetext').text,
-        })
+        Returns list of results in the same order as items.
+        '''
+        return list(
+            self._parallel_imap(function, items, min(workers, len(items)))
+        )
 
-    def process_flag(self, element):
+    def _parallel_imap(self, function, items, workers):
         '''
-        Store the given flag in the flag-list.
+        Calls function(bugzilla, item) for every item from iterable using
+        pool of worker threads, each having own cloned browser.
+
+        Yields results in the same order as items as soon as they are
+        available.
         '''
-        flag = {}
-        flag_attributes = ['name', 'id', 'type_id', 'status', 'setter',
-                           'requestee']
-        for attribute in flag_attributes:
-            value = element.get(attribute)
-            if value:
-                flag[attribute] = value
-        self.flags.append(flag)
+        if workers <= 1:
+            for item in items:
+                yield function(self, item)
+            return
 
+        local = threading.local()
 
-class Bugzilla(WebScraper):
-    '''
-    Class for access to Novell bugzilla.
-    '''
+        def worker(item):
+            '''
+            Performs call with thread local Bugzilla instance.
+            '''
+            if not hasattr(local, 'bugzilla'):
+                local.bugzilla = self.clone()
+            return function(local.bugzilla, item)
 
-    def __init__(self, user, password, base='https://bugzilla.novell.com',
-                 useragent=None, force_readonly=False, transport='pycurl'):
-        super(Bugzilla, self).__init__(
-            user, password, base, useragent, transport
-        )
-        self.force_readonly = force_readonly
-        self.logger = logging.getLogger('suse.bugzilla')
+        pool = ThreadPool(workers)
+        try:
+            for result in pool.imap(worker, items):
+                yield result
+        finally:
+            pool.terminate()
+            pool.join()
 
     def possible_relogin(self, error):
         """
@@ -263,23 +229,40 @@ class Bugzilla(WebScraper):
                 'Got 502 (Bad Gateway), clearing cookies and loging in again'
             )
             self.cookie_set = False
+            self.discarded_cookies = self._cookie_pairs(self.get_cookies())
             self.browser.cookies.clear()
+            self.notify_count('relogin')
             self.login(force=True)
             return True
         return False
 
-    def request(self, action, paramlist=None, **kwargs):
+    def request(self, action, paramlist=None, cacheable=False, **kwargs):
         '''
         Performs single request on a server (loads single page).
         '''
         try:
             return super(Bugzilla, self).request(
-                action, paramlist, **kwargs
+                action, paramlist, cacheable, **kwargs
             )
         except WebScraperError as error:
             if self.possible_relogin(error):
                 return super(Bugzilla, self).request(
-                    action, paramlist, **kwargs
+                    action, paramlist, cacheable, **kwargs
+                )
+            raise error
+
+    def request_stream(self, action, paramlist=None, cacheable=False):
+        '''
+        Performs single request on a server and returns BodyStream.
+        '''
+        try:
+            return super(Bugzilla, self).request_stream(
+                action, paramlist, cacheable
+            )
+        except WebScraperError as error:
+            if self.possible_relogin(error):
+                return super(Bugzilla, self).request_stream(
+                    action, paramlist, cacheable
                 )
             raise error
 
@@ -307,7 +290,7 @@ class Bugzilla(WebScraper):
         Check whether we're logged in.
         '''
         self.logger.info('Getting login page')
-        self.request('index', GoAheadAndLogIn=1)
+        self.request('index', GoAheadAndLogIn=1, cacheable=True)
 
         return self._check_login()
 
@@ -330,6 +313,62 @@ class Bugzilla(WebScraper):
 
     # pylint: disable=W0613
     def login(self, force=False):
+        '''
+        Login to Bugzilla, reusing cookies from session store if configured.
+
+        Only one process sharing the session store is doing login at a
+        time, others pick up cookies it has stored.
+
+        With force, stored cookies are used only if they differ from the
+        ones discarded on relogin (another process has refreshed them).
+        '''
+        discarded = self.discarded_cookies
+        self.discarded_cookies = None
+        if self.session_store is None:
+            with self.measure('login'):
+                self._login()
+            return
+
+        key = '{0}@{1}'.format(self.user, self.base)
+        with self.session_store.lock(key):
+            cookies = self.session_store.load(key)
+            # Stored cookies we already have are apparently not working
+            if (cookies and not self._has_cookies(cookies) and
+                    not self._is_discarded(cookies, force, discarded)):
+                self.logger.info('Using cookies from session store')
+                self.load_cookies(cookies)
+                return
+            with self.measure('login'):
+                self._login()
+            self.session_store.save(key, self.get_cookies())
+
+    @staticmethod
+    def _cookie_pairs(cookies):
+        '''
+        Returns set of name, value pairs for given cookies.
+        '''
+        return set([(cookie.name, cookie.value) for cookie in cookies])
+
+    @classmethod
+    def _is_discarded(cls, cookies, force, discarded):
+        '''
+        Checks whether stored cookies must not be used for forced login.
+        '''
+        if not force:
+            return False
+        if not discarded:
+            return True
+        return cls._cookie_pairs(cookies) <= discarded
+
+    def _has_cookies(self, cookies):
+        '''
+        Checks whether browser has all given cookies set.
+        '''
+        return self._cookie_pairs(cookies) <= self._cookie_pairs(
+            self.get_cookies()
+        )
+
+    def _login(self):
         '''
         Login to Bugzilla using Access Manager.
         '''
@@ -394,7 +433,7 @@ class Bugzilla(WebScraper):
         if data.find('Buglist Too Large') != -1:
             raise BuglistTooLarge('Buglist too large')
 
-        if data.find('Bugzilla has suffered an internal error.'):
+        if data.find('Bugzilla has suffered an internal error.') != -1:
             raise BugzillaError('Bugzilla has suffered an internal error.')
 
         if data == '':
@@ -428,89 +467,464 @@ class Bugzilla(WebScraper):
             return result[0]
         return None
 
-    def get_bugs(self, ids, retry=True, permissive=False, store_errors=False):
+    def get_bugs(self, ids, retry=True, permissive=False, store_errors=False,
+                 include_fields=None, exclude_fields=None):
         '''
         Returns Bug objects based on data received from bugzilla for each bug
         ID.
 
         Returns empty list in case of some problems.
         '''
-        # Generate request query
-        req = [('id', bugid) for bugid in ids if bugid is not None]
-        req += [('ctype', 'xml'), ('excludefield', 'attachmentdata')]
+        return list(self.iter_bugs(
+            ids, retry, permissive, store_errors,
+            include_fields, exclude_fields
+        ))
+
+    def get_bugs_batched(self, ids, batch_size=BATCH_SIZE,
+                         workers=BATCH_WORKERS, retry=True, permissive=False,
+                         store_errors=False, include_fields=None,
+                         exclude_fields=None):
+        '''
+        Returns Bug objects for each bug ID, splitting the ID list into
+        batches which are fetched in parallel.
+
+        The result is in the same order as with get_bugs.
+        '''
+        return list(self.iter_bugs_batched(
+            ids, batch_size, workers, retry, permissive, store_errors,
+            include_fields, exclude_fields
+        ))
+
+    def iter_bugs_batched(self, ids, batch_size=BATCH_SIZE,
+                          workers=BATCH_WORKERS, retry=True, permissive=False,
+                          store_errors=False, include_fields=None,
+                          exclude_fields=None):
+        '''
+        Yields Bug objects for each bug ID, fetching batches in parallel.
+
+        The IDs can be any iterable, for example iter_search, and are
+        consumed as the batches are being fetched.
+        '''
+        def batches():
+            '''
+            Splits IDs into batches.
+            '''
+            batch = []
+            for bugid in ids:
+                if bugid is None:
+                    continue
+                batch.append(bugid)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        def fetch(bugzilla, batch):
+            '''
+            Fetches single batch of bugs.
+            '''
+            return bugzilla.get_bugs(
+                batch, retry, permissive, store_errors,
+                include_fields, exclude_fields
+            )
+
+        for result in self._parallel_imap(fetch, batches(), workers):
+            for bug in result:
+                yield bug
+
+    @staticmethod
+    def _iter_xml_elements(data, tag, timer=None):
+        '''
+        Incrementally parses XML data and yields elements with given tag as
+        soon as they are closed.
 
-        # Download data
-        data = self.request('show_bug', paramlist=req)
+        Consumed elements are cleared afterwards, so memory usage does not
+        grow with the size of the document. Time spent in sanitizing and
+        parsing is accumulated in timer.
 
-        # Fixup XML errors bugzilla produces
-        data = escape_xml_text(data.unicode_body())
+        The data can be also iterable of chunks, such as BodyStream
+        decompressing the response.
+        '''
+        if timer is None:
+            timer = PhaseTimer()
+        chunks = data
+        if isinstance(data, bytes):
+            chunks = (
+                data[offset:offset + STREAM_CHUNK_SIZE]
+                for offset in range(0, len(data), STREAM_CHUNK_SIZE)
+            )
+        # pylint: disable=no-member
+        parser = ElementTree.XMLPullParser(
+            events=('end',), tag=tag, recover=True
+        )
+        for chunk in chunks:
+            # Fixup XML errors bugzilla produces
+            with timer('sanitize'):
+                chunk = escape_xml_bytes(chunk)
+            with timer('parse'):
+                parser.feed(chunk)
+                events = list(parser.read_events())
+            for dummy, element in events:
+                yield element
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+        with timer('parse'):
+            parser.close()
+            events = list(parser.read_events())
+        for dummy, element in events:
+            yield element
+            element.clear()
+
+    def _notify_timer(self, timer, **tags):
+        '''
+        Passes durations accumulated in timer to listeners.
+        '''
+        for phase in sorted(timer.durations):
+            self.notify_timing(phase, timer.durations[phase], **tags)
 
-        # Parse XML
+    @staticmethod
+    def get_bugs_params(ids, include_fields=None, exclude_fields=None):
+        '''
+        Generates request query for fetching bugs.
+        '''
+        req = [('id', bugid) for bugid in ids]
+        req += [('ctype', 'xml'), ('excludefield', 'attachmentdata')]
+        if include_fields:
+            # Bug ID is needed to match the results
+            if 'bug_id' not in include_fields:
+                req.append(('field', 'bug_id'))
+            req += [('field', field) for field in include_fields]
+        if exclude_fields:
+            req += [
+                ('excludefield', field) for field in exclude_fields
+                if field != 'attachmentdata'
+            ]
+        return req
+
+    def parse_bugs(self, data, ids, permissive=False, store_errors=False):
+        '''
+        Parses show_bug XML response and yields Bug objects.
+
+        Errors are raised unless in permissive mode.
+        '''
+        timer = PhaseTimer()
         try:
-            # pylint: disable=no-member
-            parser = ElementTree.XMLParser(recover=True)
-            # pylint: disable=no-member
-            response_et = ElementTree.fromstring(data.encode('utf-8'), parser)
+            for bug in self._iter_xml_elements(data, 'bug', timer):
+                try:
+                    with timer('parse'):
+                        result = self.bug_class(bug, self.anonymous)
+                except BugzillaError as exc:
+                    if not permissive:
+                        raise exc
+                    if store_errors:
+                        yield exc
+                    self.logger.error(exc)
+                else:
+                    yield result
         except SyntaxError:
+            if not isinstance(data, bytes):
+                data = data.read()
             self._handle_parse_error(
                 ','.join([str(bugid) for bugid in ids]),
-                data
+                escape_xml_text(data.decode('utf-8', 'replace'))
             )
-            return []
+        finally:
+            self._notify_timer(timer, action='show_bug')
+
+    def iter_bugs(self, ids, retry=True, permissive=False,
+                  store_errors=False, include_fields=None,
+                  exclude_fields=None):
+        '''
+        Generator variant of get_bugs, which parses the response
+        incrementally and yields Bug objects as soon as they are parsed.
+        '''
+        ids = [bugid for bugid in ids if bugid is not None]
+
+        # Download data, it is decompressed while parsing
+        stream = self.request_stream(
+            'show_bug',
+            paramlist=self.get_bugs_params(
+                ids, include_fields, exclude_fields
+            ),
+            cacheable=True
+        )
+
+        position = 0
         try:
-            bugs = []
-            for bug in response_et.findall('bug'):
-                try:
-                    bugs.append(Bug(bug, self.anonymous))
-                except BugzillaError as exc:
-                    if store_errors:
-                        bugs.append(exc)
-                    if permissive:
-                        self.logger.error(exc)
-                    else:
-                        raise exc
-            return bugs
+            for bug in self.parse_bugs(stream, ids, permissive,
+                                       store_errors):
+                yield bug
+                position += 1
         except BugzillaNotPermitted as exc:
-            if retry and not self.anonymous:
-                self.logger.error("%s - login and retry", exc)
-                self.login()
-                return self.get_bugs(ids, False, permissive)
-            raise exc
-
-    def do_search(self, params):
+            if not retry or self.anonymous:
+                raise exc
+            self.logger.error("%s - login and retry", exc)
+            self.notify_count('retry', action='show_bug')
+            self.login()
+            # Bugs are returned in the same order as requested
+            for bug in self.iter_bugs(ids[position:], False, permissive,
+                                      store_errors, include_fields,
+                                      exclude_fields):
+                yield bug
+
+    def do_search(self, params, columns=None):
         '''
         Performs search and returns list of IDs.
+
+        With list of columns, returns list of BuglistRow objects with
+        values of these columns instead.
+
+        The results are cached when search_cache_ttl is set, identical
+        searches running concurrently share single request to the server.
+        '''
+        if not self.search_cache_ttl:
+            return self._do_search(params, columns)
+
+        key = self._search_cache_key(params, columns)
+        cached = self.cache_get(key, True)
+        if cached is not None:
+            timestamp, ids = cached
+            age = time.time() - timestamp
+            if age < self.search_cache_ttl:
+                return list(ids)
+            if age < self.search_cache_ttl + self.search_cache_stale:
+                self.logger.info('Refreshing cached search: %s', params)
+                self._refresh_search(key, params, columns)
+                return list(ids)
+            # Expired, do not keep it around
+            self.cache_delete(key)
+
+        with self._search_lock:
+            event = self._search_pending.get(key)
+            if event is None:
+                event = self._search_pending[key] = threading.Event()
+                waiting = False
+            else:
+                waiting = True
+
+        if not waiting:
+            return self._cached_search(self, key, params, columns, event)
+
+        # Same search is already running, wait for its result
+        started = time.time()
+        event.wait(self.browser.config['timeout'])
+        cached = self.cache_get(key, True)
+        if cached is not None and cached[0] >= started:
+            return list(cached[1])
+        return self._do_search(params, columns)
+
+    def _search_cache_key(self, params, columns=None):
+        '''
+        Returns cache key for search parameters.
+        '''
+        if columns:
+            params = params + [('columnlist', ','.join(columns))]
+        normalized = u'&'.join([
+            u'{0}={1}'.format(name, value) for name, value in sorted(params)
+        ])
+        return hashlib.sha1(
+            u'{0}@{1}?{2}'.format(self.user, self.base, normalized).encode(
+                'utf-8'
+            )
+        ).hexdigest()
+
+    def _cached_search(self, bugzilla, key, params, columns, event):
+        '''
+        Performs search using given bugzilla and stores result in cache.
+
+        The pending search event is removed and set once done.
+        '''
+        try:
+            ids = bugzilla._do_search(params, columns)
+            self.cache_set(
+                key,
+                (time.time(), ids),
+                self.search_cache_ttl + self.search_cache_stale
+            )
+            return list(ids)
+        finally:
+            with self._search_lock:
+                del self._search_pending[key]
+            event.set()
+
+    def _refresh_search(self, key, params, columns):
+        '''
+        Refreshes cached search in background thread.
+
+        Returns the thread or None if the search is already running.
+        '''
+        with self._search_lock:
+            if key in self._search_pending:
+                return None
+            event = self._search_pending[key] = threading.Event()
+
+        bugzilla = self.clone()
+
+        def refresh():
+            '''
+            Performs the search, keeping stale result on failure.
+            '''
+            try:
+                self._cached_search(bugzilla, key, params, columns, event)
+            except WebScraperError as error:
+                self.logger.warning('Failed to refresh search: %s', error)
+
+        thread = threading.Thread(target=refresh)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def _do_search(self, params, columns=None):
+        '''
+        Performs search on the server and returns list of IDs or rows.
+        '''
+        if columns:
+            return list(self.iter_search_rows(params, columns))
+        return list(self.iter_search(params))
+
+    def iter_search_rows(self, params, columns):
+        '''
+        Performs search returning CSV with given columns and yields
+        BuglistRow objects as they are parsed.
+
+        The search is performed once the iteration starts.
+        '''
+        req = [
+            ('ctype', 'csv'), ('columnlist', ','.join(columns))
+        ] + params
+        self.logger.info('Doing bugzilla search: %s', req)
+        response = self.request('buglist', paramlist=req)
+        if self.viewing_html():
+            # Errors are reported as HTML pages
+            self._handle_parse_error('search', response.unicode_body())
+            return
+        timer = PhaseTimer()
+        try:
+            with timer('parse'):
+                reader = iter_csv_rows(response.unicode_body())
+                header = next(reader, None)
+            if header is None:
+                return
+            while True:
+                with timer('parse'):
+                    row = next(reader, None)
+                    if row is None:
+                        break
+                    result = BuglistRow(dict(zip(header, row)))
+                yield result
+        finally:
+            self._notify_timer(timer, action='buglist')
+
+    def iter_search(self, params):
+        '''
+        Performs search and yields IDs as they are parsed.
+
+        The search is performed once the iteration starts.
         '''
         req = [('ctype', 'atom')] + params
         self.logger.info('Doing bugzilla search: %s', req)
         response = self.request('buglist', paramlist=req)
-        data = escape_xml_text(response.unicode_body())
+        if self.viewing_html():
+            # Errors are reported as HTML pages
+            self._handle_parse_error('search', response.unicode_body())
+            return
         try:
-            # pylint: disable=no-member
-            parser = ElementTree.XMLParser(recover=True)
-            # pylint: disable=no-member
-            response_et = ElementTree.fromstring(data.encode('utf-8'), parser)
+            for bugid in self._iter_search_ids(response.body):
+                yield bugid
         except SyntaxError:
-            self._handle_parse_error('recent', data)
+            self._handle_parse_error(
+                'recent',
+                escape_xml_text(response.body.decode('utf-8', 'replace'))
+            )
+
+    def parse_search(self, data):
+        '''
+        Parses Atom search result and returns list of IDs.
+        '''
+        try:
+            return list(self._iter_search_ids(data))
+        except SyntaxError:
+            self._handle_parse_error(
+                'recent', escape_xml_text(data.decode('utf-8', 'replace'))
+            )
             return []
 
+    def _iter_search_ids(self, data):
+        '''
+        Incrementally parses Atom search result and yields IDs.
+        '''
         id_query = '{http://www.w3.org/2005/Atom}id'
         entry_query = '{http://www.w3.org/2005/Atom}entry'
 
-        bugs = [
-            bug.find(id_query).text for bug in response_et.findall(entry_query)
-        ]
-
-        # Strip http://bugzilla.novell.com/show_bug.cgi?id=
-        return [int(bugid[bugid.find("?id=") + 4:]) for bugid in bugs]
+        timer = PhaseTimer()
+        try:
+            for entry in self._iter_xml_elements(data, entry_query, timer):
+                bugid = entry.findtext(id_query)
+                # Strip http://bugzilla.novell.com/show_bug.cgi?id=
+                yield int(bugid[bugid.find("?id=") + 4:])
+        finally:
+            self._notify_timer(timer, action='buglist')
+
+    def do_range_search(self, params, startdate, enddate=None,
+                        workers=BATCH_WORKERS):
+        '''
+        Performs search for bugs changed in given interval and returns list
+        of IDs.
 
-    def get_recent_bugs(self, startdate):
+        If the result is too large, the interval is split in halves, which
+        are searched in parallel.
+        '''
+        if enddate is None:
+            enddate = datetime.utcnow()
+
+        def search(bugzilla, interval):
+            '''
+            Performs search for single interval, returns None if the
+            result is too large.
+            '''
+            try:
+                return bugzilla.do_search(params + [
+                    ('chfieldfrom', interval[0].strftime(SEARCH_DATE_FORMAT)),
+                    ('chfieldto', interval[1].strftime(SEARCH_DATE_FORMAT)),
+                ])
+            except BuglistTooLarge:
+                return None
+
+        result = []
+        seen = set()
+        intervals = [(startdate, enddate)]
+        while intervals:
+            results = self._parallel_map(search, intervals, workers)
+            split = []
+            for interval, ids in zip(intervals, results):
+                if ids is None:
+                    start, end = interval
+                    if end - start <= MIN_SEARCH_INTERVAL:
+                        raise BuglistTooLarge('Buglist too large')
+                    middle = start + (end - start) // 2
+                    self.logger.info(
+                        'Buglist too large, splitting search at %s', middle
+                    )
+                    split.extend([(start, middle), (middle, end)])
+                    continue
+                for bugid in ids:
+                    if bugid not in seen:
+                        seen.add(bugid)
+                        result.append(bugid)
+            intervals = split
+        return result
+
+    def get_recent_bugs(self, startdate, split=False):
         '''
         Returns lis of bugs changed since start date.
         '''
+        if split:
+            return self.do_range_search([], startdate)
         return self.do_search([
             ('chfieldto', 'Now'),
-            ('chfieldfrom', startdate.strftime('%Y-%m-%d %H:%M:%S +0000'))
+            ('chfieldfrom', startdate.strftime(SEARCH_DATE_FORMAT))
         ])
 
     def get_opensec_bugs(self):
@@ -529,18 +943,15 @@ class Bugzilla(WebScraper):
             ('short_desc_type', 'regexp')
         ])
 
-    def get_recent_secbugs(self, startdate):
+    def get_recent_secbugs(self, startdate, split=False):
         '''
         Returns lis of security bugs changed since start date.
         '''
-        return self.do_search([
-            ('short_desc', '^VUL-[0-9]'),
-            ('query_format', 'advanced'),
-            ('short_desc_type', 'regexp'),
+        if split:
+            return self.do_range_search(SECBUGS_SEARCH, startdate)
+        return self.do_search(SECBUGS_SEARCH + [
             ('chfieldto', 'Now'),
-            ('component', 'Incidents'),
-            ('product', 'SUSE Security Incidents'),
-            ('chfieldfrom', startdate.strftime('%Y-%m-%d %H:%M:%S +0000'))
+            ('chfieldfrom', startdate.strftime(SEARCH_DATE_FORMAT))
         ])
 
     def get_openl3_bugs(self):
@@ -573,28 +984,23 @@ class Bugzilla(WebScraper):
         '''
         # Load the form
         self.logger.info('Loading bug page for %d', bugid)
-        self.request('show_bug', id=bugid)
+        response = self.request('show_bug', id=bugid, cacheable=True)
 
         self.check_viewing_html()
 
-        # Find link containing SR ids
-        link = self.browser.doc.select(
-            "//a[text()='Report View']"
-        ).selector_list
-        if not link:
-            return []
-
-        # Split parts (URL encoded)
-        urlpart = [x for x in link.url.split('%26') if x[:7] == 'lsMSRID']
+        return parse_sr_ids(response.body)
 
-        if not urlpart:
-            return []
-
-        # Find SR ids
-        match = SR_MATCH.findall(urlpart[0])
+    def get_srs(self, bug_ids, workers=BATCH_WORKERS):
+        '''
+        Obtains SR ids for many bugs in parallel.
 
-        # Convert to integers
-        return [int(x) for x in match]
+        Returns dictionary with list of SR ids for every bug.
+        '''
+        bug_ids = list(bug_ids)
+        results = self._parallel_map(
+            lambda bugzilla, bugid: bugzilla.get_sr(bugid), bug_ids, workers
+        )
+        return dict(zip(bug_ids, results))
 
     def load_update_form(self, bugid):
         """
@@ -642,7 +1048,8 @@ class Bugzilla(WebScraper):
                 val = val.encode('utf-8')
             try:
                 self.browser.doc.set_input(k, val)
-            except DataNotFound:
+            except (DataNotFound, KeyError):
+                # Newer grab raises KeyError for missing fields
                 if k not in IGNORABLE_FIELDS:
                     raise
             changes = True
@@ -664,27 +1071,240 @@ class Bugzilla(WebScraper):
 
         # Submit
         response = self.submit()
-        data = webscraper_safely(response.read)
+        data = response.unicode_body()
         if 'Mid-air collision!' in data:
-            raise BugzillaUpdateError('Mid-air collision!')
+            raise BugzillaMidAirCollision('Mid-air collision!', bugid)
         if 'reason=invalid_token' in data:
             raise BugzillaUpdateError('Suspicious Action')
         if 'Changes submitted for' not in data:
             raise BugzillaUpdateError('Unknown error while submitting form')
 
-    def _update_bug_whiteboard(self, remove, add):
+    def bulk_update(self, updates, workers=BATCH_WORKERS,
+                    retries=UPDATE_RETRIES):
         '''
-        Callback for changing bug whiteboard.
+        Updates bugs in parallel.
+
+        The updates is list of (bugid, changes) tuples, where changes is
+        dictionary with update_bug keyword arguments. Updates failing with
+        mid-air collision are retried.
+
+        Returns list of (bugid, error) tuples, error is None on success.
+        '''
+        def update(bugzilla, item):
+            '''
+            Updates single bug, retrying on mid-air collision.
+            '''
+            bugid, changes = item
+            for dummy in range(retries + 1):
+                try:
+                    bugzilla.update_bug(bugid, **changes)
+                    return (bugid, None)
+                except BugzillaMidAirCollision as exc:
+                    bugzilla.logger.warning(
+                        'Mid-air collision while updating bug %d', bugid
+                    )
+                    bugzilla.notify_count('retry', action='update')
+                    error = exc
+                # Any failure is reported per bug, not stopping others
+                except Exception as exc:  # pylint: disable=broad-except
+                    bugzilla.logger.error(
+                        'Failed to update bug %d: %s', bugid, exc
+                    )
+                    return (bugid, exc)
+            return (bugid, error)
+
+        return self._parallel_map(update, list(updates), workers)
+
+    def mass_update(self, bug_ids, batch_size=BATCH_SIZE,
+                    workers=BATCH_WORKERS, whiteboard_add=None,
+                    whiteboard_remove=None, retries=UPDATE_RETRIES,
+                    **kwargs):
         '''
-        whiteboard = self.browser.doc.form_fields()['status_whiteboard']
+        Updates many bugs using buglist mass edit form.
 
-        if remove is not None and remove in whiteboard:
-            whiteboard = whiteboard.replace(remove, '')
+        The changes are same as for update_bug. For whiteboard changes,
+        current whiteboards are fetched using CSV search and bugs are
+        grouped by resulting whiteboard. Bugs changed by somebody else
+        since then are not submitted and are grouped again. Bugs not
+        confirmed as changed are updated one by one using bulk_update.
 
-        if add is not None and add not in whiteboard:
-            whiteboard = '%s %s' % (whiteboard, add)
+        Returns list of (bugid, error) tuples, error is None on success.
+        '''
+        if self.anonymous:
+            raise BugzillaUpdateError('No updates in anonymous mode!')
 
+        bug_ids = [int(bugid) for bugid in bug_ids]
+        done = set()
+        pending = bug_ids
+        for dummy in range(retries + 1):
+            if whiteboard_add is None and whiteboard_remove is None:
+                # Values do not depend on current state of bugs
+                groups, unchanged, seen = [(kwargs, pending)], [], None
+            else:
+                groups, unchanged, seen = self._group_whiteboards(
+                    pending, whiteboard_remove, whiteboard_add, kwargs
+                )
+            done.update(unchanged)
+            updated, pending = self._mass_update_groups(
+                groups, batch_size, seen
+            )
+            done.update(updated)
+            if not pending:
+                break
+            self.logger.warning(
+                'Mid-air collision in mass update of %d bugs', len(pending)
+            )
+            self.notify_count('retry', action='mass_update')
+
+        failed = [bugid for bugid in bug_ids if bugid not in done]
+        if failed:
+            self.logger.warning(
+                'Mass update failed for %d bugs, updating one by one',
+                len(failed)
+            )
+        changes = dict(kwargs)
+        changes['whiteboard_add'] = whiteboard_add
+        changes['whiteboard_remove'] = whiteboard_remove
+        errors = dict(self.bulk_update(
+            [(bugid, changes) for bugid in failed], workers, retries
+        ))
+        return [(bugid, errors.get(bugid)) for bugid in bug_ids]
+
+    def _mass_update_groups(self, groups, batch_size, seen):
+        '''
+        Updates groups of bugs in batches.
+
+        Returns set of updated bug ids and list of bugs skipped because
+        of collision.
+        '''
+        done = set()
+        collided = []
+        for changes, ids in groups:
+            for offset in range(0, len(ids), batch_size):
+                updated, skipped = self._mass_update_batch(
+                    ids[offset:offset + batch_size], changes, seen
+                )
+                done.update(updated)
+                collided.extend(skipped)
+        return done, collided
+
+    def _group_whiteboards(self, bug_ids, remove, add, kwargs):
+        '''
+        Groups bugs by whiteboard after the change.
+
+        Returns list of (changes, bug_ids), list of bugs where only the
+        whiteboard would be changed, but it stays same, and dictionary
+        with time of last change of every bug. Bugs missing in search
+        result are not included in either.
+        '''
+        # Not using do_search, cached whiteboards might be outdated
+        rows = self.iter_search_rows(
+            [('bug_id', ','.join([str(bugid) for bugid in bug_ids]))],
+            ['status_whiteboard', 'changeddate']
+        )
+        groups = {}
+        unchanged = []
+        seen = {}
+        for row in rows:
+            seen[row.bug_id] = row.changeddate
+            whiteboard = update_whiteboard(row.status_whiteboard, remove, add)
+            if not kwargs and whiteboard == row.status_whiteboard:
+                unchanged.append(row.bug_id)
+                continue
+            groups.setdefault(whiteboard, []).append(row.bug_id)
+        result = []
+        for whiteboard in sorted(groups):
+            changes = dict(kwargs)
+            changes['status_whiteboard'] = whiteboard
+            result.append((changes, groups[whiteboard]))
+        return result, unchanged, seen
+
+    def _get_changed_dates(self, bug_ids):
+        '''
+        Returns dictionary with time of last change of bugs.
+        '''
+        rows = self.iter_search_rows(
+            [('bug_id', ','.join([str(bugid) for bugid in bug_ids]))],
+            ['changeddate']
+        )
+        return dict([(row.bug_id, row.changeddate) for row in rows])
+
+    def _mass_update_batch(self, bug_ids, changes, seen=None):
+        '''
+        Updates batch of bugs using mass edit form.
+
+        The mass edit does mid-air collision check only for first bug, so
+        with seen times of last change, bugs changed since then are
+        detected just before loading the form and skipped.
+
+        Returns set of successfully updated bug ids and list of bugs
+        skipped because of collision.
+        '''
+        collided = []
+        try:
+            if seen is not None and not self.force_readonly:
+                current = self._get_changed_dates(bug_ids)
+                collided = [
+                    bugid for bugid in bug_ids
+                    if current.get(bugid) != seen.get(bugid)
+                ]
+                bug_ids = [
+                    bugid for bugid in bug_ids if bugid not in collided
+                ]
+                if not bug_ids:
+                    return set(), collided
+
+            self.logger.info(
+                'Loading mass edit form for %d bugs', len(bug_ids)
+            )
+            self.request(
+                'buglist',
+                bug_id=','.join([str(bugid) for bugid in bug_ids]),
+                tweak=1
+            )
+            self.check_viewing_html()
+            # pylint: disable=E1102
+            self.browser.doc.choose_form(xpath="//form[@name='changeform']")
+
+            # Select bugs present in the form
+            inputs = self.browser.doc.form.inputs
+            selected = set()
+            for bugid in bug_ids:
+                name = 'id_{0}'.format(bugid)
+                if name in inputs:
+                    self.browser.doc.set_input(name, True)
+                    selected.add(bugid)
+
+            for name in changes:
+                value = changes[name]
+                if isinstance(value, text_type):
+                    value = value.encode('utf-8')
+                if name not in inputs:
+                    if name in IGNORABLE_FIELDS:
+                        continue
+                    raise BugzillaUpdateError(
+                        'Field {0} not found in mass edit form'.format(name)
+                    )
+                self.browser.doc.set_input(name, value)
+
+            if self.force_readonly or not selected:
+                return selected, collided
+
+            response = self.submit()
+            data = response.unicode_body()
+            if 'reason=invalid_token' in data:
+                raise BugzillaUpdateError('Suspicious Action')
+            return parse_mass_update(data) & selected, collided
+        except (WebScraperError, DataNotFound) as exc:
+            self.logger.error('Failed to mass update bugs: %s', exc)
+            return set(), []
+
+    def _update_bug_whiteboard(self, remove, add):
+        '''
+        Callback for changing bug whiteboard.
+        '''
         current_wb = self.browser.doc.form_fields()['status_whiteboard']
+        whiteboard = update_whiteboard(current_wb, remove, add)
         changes = (current_wb != whiteboard)
 
         self.browser.doc.set_input('status_whiteboard', whiteboard)
@@ -698,9 +1318,11 @@ class APIBugzilla(Bugzilla):
     '''
 
     def __init__(self, user, password, base='https://apibugzilla.suse.com',
-                 useragent=None, force_readonly=False, transport='pycurl'):
+                 useragent=None, force_readonly=False, transport='pycurl',
+                 session_store=None):
         super(APIBugzilla, self).__init__(
-            user, password, base, useragent, transport=transport
+            user, password, base, useragent, transport=transport,
+            session_store=session_store
         )
         self.force_readonly = force_readonly
         # Use normal Bugzilla for anonymous access
@@ -712,7 +1334,7 @@ class APIBugzilla(Bugzilla):
                                                    password=password)
             )
 
-    def login(self, force=False):
+    def _login(self):
         '''
         Checks login to Bugzilla using HTTP authentication.
         '''
@@ -723,7 +1345,7 @@ class APIBugzilla(Bugzilla):
             raise BugzillaLoginFailed('Failed to login to bugzilla')
 
 
-class DjangoBugzilla(APIBugzilla):
+class DjangoBugzilla(APIBugzilla, DjangoCacherMixin):
     '''
     Adds Django specific things to bugzilla class.
     '''
@@ -775,6 +1397,10 @@ def get_django_bugzilla(transport='pycurl'):
         force_readonly=force_readonly,
         transport=transport
     )
+    if hasattr(settings, 'BUGZILLA_SEARCH_CACHE_TTL'):
+        bugzilla.search_cache_ttl = settings.BUGZILLA_SEARCH_CACHE_TTL
+    if hasattr(settings, 'BUGZILLA_SEARCH_CACHE_STALE'):
+        bugzilla.search_cache_stale = settings.BUGZILLA_SEARCH_CACHE_STALE
 
     # Check for anonymous access
     if settings.BUGZILLA_USERNAME == '':
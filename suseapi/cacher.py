@@ -24,17 +24,36 @@ Support classes for caching data.
 from datetime import datetime, timedelta
 import re
 import hashlib
+import threading
 
 # Valid keys regexp for memcached
 VALID_KEY_CHARS_RE = re.compile('[\x21-\x7e\x80-\xff]+$')
 
+# Default cache timeout in seconds
+CACHE_TIMEOUT = 24 * 3600
+
+# Maximal number of entries in internal cache namespace
+CACHE_MAXSIZE = 1024
+
 
 class CacherMixin(object):
     '''
     Generic cacher mixin using object attribute.
+
+    The entries are kept separately for every cache_key_template, so that
+    the size limit applies to each of them.
     '''
     _cache = {}
+    _cache_lock = threading.RLock()
     cache_key_template = 'cache-%s'
+    cache_maxsize = CACHE_MAXSIZE
+
+    def cache_entries(self):
+        '''
+        Returns internal cache entries for this cache namespace.
+        '''
+        with self._cache_lock:
+            return self._cache.setdefault(self.cache_key_template, {})
 
     def cache_key(self, key):
         '''
@@ -42,30 +61,57 @@ class CacherMixin(object):
         '''
         if not VALID_KEY_CHARS_RE.match(key):
             md5 = hashlib.md5()
-            md5.update(key)
+            md5.update(key.encode('utf-8'))
             key = md5.hexdigest()
         return self.cache_key_template % key
 
-    def cache_set(self, key, value):
+    def cache_set(self, key, value, timeout=CACHE_TIMEOUT):
         '''
         Remembers value in internal cache.
         '''
-        self._cache[self.cache_key(key)] = (value, datetime.now())
+        entries = self.cache_entries()
+        with self._cache_lock:
+            if len(entries) >= self.cache_maxsize:
+                self.cache_purge()
+            entries[self.cache_key(key)] = (
+                value, datetime.now() + timedelta(seconds=timeout)
+            )
+
+    def cache_delete(self, key):
+        '''
+        Removes value from internal cache.
+        '''
+        with self._cache_lock:
+            self.cache_entries().pop(self.cache_key(key), None)
+
+    def cache_purge(self):
+        '''
+        Removes expired entries from internal cache and the ones closest
+        to expiry if it is still full.
+        '''
+        now = datetime.now()
+        with self._cache_lock:
+            cache = self.cache_entries()
+            entries = sorted(cache.items(), key=lambda item: item[1][1])
+            for position, (key, value) in enumerate(entries):
+                if (value[1] > now and
+                        len(entries) - position < self.cache_maxsize):
+                    break
+                cache.pop(key, None)
 
     def cache_uptodate(self, key):
         '''
         Checks whether cache entry is valid.
         '''
-        expires = self._cache[self.cache_key(key)][1] + timedelta(days=1)
-        return expires > datetime.now()
+        return self.cache_entries()[self.cache_key(key)][1] > datetime.now()
 
     def cache_get(self, key, force=False):
         '''
         Gets value from internal cache.
         '''
-        cache_key = self.cache_key(key)
-        if cache_key in self._cache and (force or self.cache_uptodate(key)):
-            return self._cache[cache_key][0]
+        entry = self.cache_entries().get(self.cache_key(key))
+        if entry is not None and (force or entry[1] > datetime.now()):
+            return entry[0]
         return None
 
 
@@ -74,12 +120,19 @@ class DjangoCacherMixin(CacherMixin):
     Cacher mixin using Django.
     '''
 
-    def cache_set(self, key, value):
+    def cache_set(self, key, value, timeout=CACHE_TIMEOUT):
         '''
         Sets value in django cache.
         '''
         from django.core.cache import cache
-        cache.set(self.cache_key(key), value, 24 * 3600)
+        cache.set(self.cache_key(key), value, timeout)
+
+    def cache_delete(self, key):
+        '''
+        Removes value from django cache.
+        '''
+        from django.core.cache import cache
+        cache.delete(self.cache_key(key))
 
     def cache_get(self, key, force=False):
         '''
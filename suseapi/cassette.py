@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Recording and replaying of HTTP traffic for offline testing and
+benchmarking.
+'''
+import base64
+from collections import deque
+import gzip
+import json
+import random
+import threading
+import time
+from xml.sax.saxutils import escape
+
+# pylint: disable=import-error
+from six.moves.urllib.parse import urlencode
+
+from suseapi.browser import WebScraperError, load_document
+from suseapi.bugzilla import BATCH_SIZE, Bugzilla
+
+MODE_RECORD = 'record'
+MODE_REPLAY = 'replay'
+
+SYNTHETIC_WORDS = (
+    'kernel', 'crash', 'oops', 'package', 'update', 'build', 'fails',
+    'regression', 'security', 'patch', 'install', 'network', 'driver',
+    'memory', 'leak', 'timeout', 'server', 'client', 'upgrade', 'service',
+)
+
+SYNTHETIC_BUG = '''
+    <bug>
+          <bug_id>{bug_id}</bug_id>
+          <creation_ts>2014-01-01 10:00:00 +0000</creation_ts>
+          <short_desc>{short_desc}</short_desc>
+          <delta_ts>2014-01-{day:02d} 12:00:00 +0000</delta_ts>
+          <classification>SUSE Linux Enterprise</classification>
+          <product>SUSE Linux Enterprise Server 12</product>
+          <component>Kernel</component>
+          <version>GM</version>
+          <bug_status>{bug_status}</bug_status>
+          <status_whiteboard>{whiteboard}</status_whiteboard>
+          <priority>P3 - Medium</priority>
+          <bug_severity>Normal</bug_severity>
+          <reporter name="Reporter">reporter@example.com</reporter>
+          <assigned_to name="Assignee">assignee@example.com</assigned_to>
+          <cc>cc@example.com</cc>
+          <flag name="needinfo" id="{bug_id}" status="?"
+                setter="reporter@example.com"
+                requestee="assignee@example.com"/>
+{comments}
+    </bug>
+'''
+
+SYNTHETIC_COMMENT = '''
+          <long_desc isprivate="0">
+            <who name="Commenter">commenter@example.com</who>
+            <bug_when>2014-01-01 {hour:02d}:00:00 +0000</bug_when>
+            <thetext>{text}</thetext>
+          </long_desc>
+'''
+
+SYNTHETIC_ENTRY = '''
+  <entry>
+    <title>[Bug {bug_id}] {short_desc}</title>
+    <id>{base}/show_bug.cgi?id={bug_id}</id>
+    <updated>2014-01-01T12:00:00Z</updated>
+  </entry>
+'''
+
+
+class CassetteError(WebScraperError):
+    '''
+    Request not found in cassette.
+    '''
+    pass
+
+
+class Cassette(object):
+    '''
+    Storage of request and response pairs.
+
+    In record mode requests are performed and stored, in replay mode the
+    stored responses are returned instead. Identical requests are replayed
+    in the recorded order, the last response is repeated afterwards.
+    '''
+    def __init__(self, path=None, mode=MODE_REPLAY, realtime=False):
+        self.path = path
+        self.mode = mode
+        self.realtime = realtime
+        self.interactions = []
+        self.lock = threading.Lock()
+        self._pending = {}
+        if path is not None and mode == MODE_REPLAY:
+            self.load(path)
+
+    def load(self, path):
+        '''
+        Loads interactions from file.
+        '''
+        with gzip.open(path, 'rb') as handle:
+            for line in handle:
+                interaction = json.loads(line.decode('utf-8'))
+                interaction['body'] = base64.b64decode(interaction['body'])
+                self.add(**interaction)
+
+    def save(self, path=None):
+        '''
+        Saves interactions to file.
+        '''
+        if path is None:
+            path = self.path
+        with gzip.open(path, 'wb') as handle:
+            with self.lock:
+                interactions = list(self.interactions)
+            for interaction in interactions:
+                data = dict(interaction)
+                data['body'] = base64.b64encode(data['body']).decode('ascii')
+                handle.write(json.dumps(data, sort_keys=True).encode('utf-8'))
+                handle.write(b'\n')
+
+    def add(self, url, post, body, code=200, headers=None, duration=0.0):
+        '''
+        Adds interaction to the cassette.
+        '''
+        if headers is None:
+            headers = [['Content-Type', 'text/html; charset=utf-8']]
+        interaction = {
+            'url': url,
+            'post': post,
+            'body': body,
+            'code': code,
+            'headers': [list(header) for header in headers],
+            'duration': duration,
+        }
+        with self.lock:
+            self.interactions.append(interaction)
+            self._pending.setdefault((url, post), deque()).append(
+                interaction
+            )
+
+    def find(self, url, post):
+        '''
+        Returns response stored for request.
+        '''
+        with self.lock:
+            pending = self._pending.get((url, post))
+            if not pending:
+                raise CassetteError(
+                    'Request not found in cassette: {0} {1}'.format(url, post)
+                )
+            if len(pending) > 1:
+                return pending.popleft()
+            return pending[0]
+
+    def perform(self, browser, url, post=None):
+        '''
+        Performs request using grab browser, recording or replaying it.
+        '''
+        if self.mode == MODE_RECORD:
+            start = time.time()
+            result = browser.go(url, post=post)
+            self.add(
+                url, post, result.body, result.code,
+                result.headers.items(), time.time() - start
+            )
+            return result
+
+        interaction = self.find(url, post)
+        if self.realtime:
+            time.sleep(interaction['duration'])
+        return load_document(
+            browser, url, interaction['code'], interaction['headers'],
+            interaction['body'], 'Replayed'
+        )
+
+    def __len__(self):
+        return len(self.interactions)
+
+
+def synthetic_text(generator, words, control_chars=False):
+    '''
+    Returns random text with given number of words.
+
+    Optionally the words are separated by control chars, which Bugzilla
+    includes in the XML without escaping.
+    '''
+    if control_chars:
+        separators = (' ', ' ', ' ', '\x02', '\x1b')
+    else:
+        separators = (' ',)
+    result = []
+    for dummy in range(words):
+        result.append(generator.choice(SYNTHETIC_WORDS))
+        result.append(generator.choice(separators))
+    return ''.join(result[:-1])
+
+
+def synthetic_bugs(ids, comments=5, comment_words=50, seed=0,
+                   control_chars=False):
+    '''
+    Returns show_bug XML response with synthetic bugs.
+    '''
+    generator = random.Random(seed)
+    bugs = []
+    for bugid in ids:
+        bugs.append(SYNTHETIC_BUG.format(
+            bug_id=bugid,
+            short_desc=escape(synthetic_text(generator, 6)),
+            day=generator.randint(1, 28),
+            bug_status=generator.choice(('NEW', 'ASSIGNED', 'RESOLVED')),
+            whiteboard=generator.choice(('', 'openL3:1', 'wasL3:1')),
+            comments=''.join([
+                SYNTHETIC_COMMENT.format(
+                    hour=hour % 24,
+                    text=escape(synthetic_text(
+                        generator, comment_words, control_chars
+                    )),
+                )
+                for hour in range(comments)
+            ]),
+        ))
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<bugzilla version="4.4">{0}</bugzilla>\n'.format(''.join(bugs))
+    ).encode('utf-8')
+
+
+def synthetic_buglist(ids, base, seed=0):
+    '''
+    Returns Atom search result with synthetic bugs.
+    '''
+    generator = random.Random(seed)
+    entries = [
+        SYNTHETIC_ENTRY.format(
+            bug_id=bugid,
+            base=base,
+            short_desc=escape(synthetic_text(generator, 6)),
+        )
+        for bugid in ids
+    ]
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<feed xmlns="http://www.w3.org/2005/Atom">\n'
+        '  <title>Bugzilla Bugs</title>{0}</feed>\n'.format(''.join(entries))
+    ).encode('utf-8')
+
+
+def generate_bugzilla_cassette(ids, base='https://bugzilla.novell.com',
+                               search=None, batch_size=BATCH_SIZE,
+                               comments=5, comment_words=50, duration=0.0):
+    '''
+    Generates cassette with synthetic Bugzilla responses.
+
+    It contains search for given parameters returning the ids and bug
+    responses as requested by get_bugs_batched with given batch size.
+    '''
+    cassette = Cassette()
+    if search is not None:
+        cassette.add(
+            '{0}/buglist.cgi'.format(base),
+            urlencode([('ctype', 'atom')] + list(search)),
+            synthetic_buglist(ids, base),
+            headers=[['Content-Type', 'application/atom+xml']],
+            duration=duration,
+        )
+    for offset in range(0, len(ids), batch_size):
+        batch = ids[offset:offset + batch_size]
+        cassette.add(
+            '{0}/show_bug.cgi'.format(base),
+            urlencode(Bugzilla.get_bugs_params(batch)),
+            synthetic_bugs(batch, comments, comment_words, seed=offset),
+            headers=[['Content-Type', 'text/xml; charset=utf-8']],
+            duration=duration,
+        )
+    return cassette
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Bulk export of bug data.
+'''
+
+import csv
+from io import BytesIO, StringIO
+from datetime import datetime
+import dateutil.tz
+import six
+
+from suseapi.bugdata import parse_timestamp
+from suseapi.compat import text_type
+
+
+# Columns for bulk export of bugs with NumPy data types
+EXPORT_COLUMNS = (
+    ('bug_id', 'i8'),
+    ('creation_ts', 'M8[s]'),
+    ('delta_ts', 'M8[s]'),
+    ('classification', 'O'),
+    ('product', 'O'),
+    ('component', 'O'),
+    ('version', 'O'),
+    ('bug_status', 'O'),
+    ('resolution', 'O'),
+    ('priority', 'O'),
+    ('bug_severity', 'O'),
+    ('reporter', 'O'),
+    ('assigned_to', 'O'),
+    ('status_whiteboard', 'O'),
+    ('short_desc', 'O'),
+    ('comment_count', 'i4'),
+    ('attachment_count', 'i4'),
+    ('flag_count', 'i4'),
+    ('cc_count', 'i4'),
+)
+
+# Buglist columns containing timestamps
+BUGLIST_DATE_COLUMNS = ('changeddate', 'opendate')
+
+
+def _export_value(value, dtype):
+    '''
+    Converts bug attribute to exported value.
+    '''
+    if value is None:
+        if dtype[0] == 'i':
+            return -1
+        return None
+    if dtype[0] == 'i':
+        return int(value)
+    if dtype[0] == 'M':
+        # NumPy does not support timezone aware datetimes
+        if value.tzinfo is not None:
+            value = value.astimezone(dateutil.tz.tzutc()).replace(tzinfo=None)
+    return value
+
+
+def _csv_value(value):
+    '''
+    Formats exported value for CSV.
+    '''
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if six.PY2 and isinstance(value, text_type):
+        # Python 2 csv module can not handle unicode
+        return value.encode('utf-8')
+    return value
+
+
+def iter_csv_rows(data):
+    '''
+    Yields rows parsed from CSV text, cells are text as well.
+    '''
+    if six.PY2:
+        # Python 2 csv module can not handle unicode
+        for row in csv.reader(BytesIO(data.encode('utf-8'))):
+            yield [cell.decode('utf-8') for cell in row]
+    else:
+        for row in csv.reader(StringIO(data, newline='')):
+            yield row
+
+
+def iter_bug_rows(bugs, columns=EXPORT_COLUMNS):
+    '''
+    Yields tuple of column values for every bug.
+
+    Missing integer values are -1, other missing values None, timestamps
+    are converted to naive UTC.
+    '''
+    for bug in bugs:
+        yield tuple([
+            _export_value(getattr(bug, name, None), dtype)
+            for name, dtype in columns
+        ])
+
+
+def export_numpy(bugs, columns=EXPORT_COLUMNS):
+    '''
+    Converts bugs to NumPy structured array.
+    '''
+    # pylint: disable=import-error
+    import numpy
+    dtype = numpy.dtype([(str(name), kind) for name, kind in columns])
+    return numpy.array(list(iter_bug_rows(bugs, columns)), dtype=dtype)
+
+
+def export_csv(bugs, handle, columns=EXPORT_COLUMNS):
+    '''
+    Writes bugs as CSV to file handle, one row at a time.
+
+    Returns number of written bugs.
+    '''
+    writer = csv.writer(handle)
+    writer.writerow([name for name, dtype in columns])
+    count = 0
+    for row in iter_bug_rows(bugs, columns):
+        writer.writerow([_csv_value(value) for value in row])
+        count += 1
+    return count
+
+
+class BuglistRow(object):
+    '''
+    Lightweight bug information from buglist CSV, columns are accessible
+    as attributes.
+    '''
+    __slots__ = ('bug_id', '_values')
+
+    def __init__(self, values):
+        self.bug_id = int(values.pop('bug_id'))
+        for name in BUGLIST_DATE_COLUMNS:
+            if values.get(name):
+                values[name] = parse_timestamp(values[name])
+        self._values = values
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __repr__(self):
+        return '<BuglistRow {0}>'.format(self.bug_id)
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Conditional HTTP caching using ETag and Last-Modified validators.
+'''
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Default number of responses kept in memory
+DEFAULT_MAXSIZE = 1000
+
+# Vary headers which are same for all requests, we always send same
+# Accept-Encoding
+HANDLED_VARY = frozenset(('accept-encoding',))
+
+
+def is_storable(document):
+    '''
+    Checks whether response can be stored in shared cache.
+    '''
+    headers = document.headers
+    if document.code != 200:
+        return False
+    cache_control = [
+        item.strip().lower()
+        for item in headers.get('Cache-Control', '').split(',')
+    ]
+    if 'no-store' in cache_control or 'private' in cache_control:
+        return False
+    vary = [
+        item.strip().lower() for item in headers.get('Vary', '').split(',')
+        if item.strip()
+    ]
+    return set(vary) <= HANDLED_VARY
+
+
+class MemoryHTTPCache(object):
+    '''
+    HTTP cache keeping responses in memory.
+
+    Only successful GET responses with ETag or Last-Modified header are
+    stored, they are revalidated using If-None-Match and
+    If-Modified-Since headers. Private responses and responses varying
+    on request headers are not stored.
+
+    The entries are identified by key, which should include user the
+    response was fetched for.
+    '''
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def get(self, key):
+        '''
+        Returns cached entry for key or None.
+        '''
+        with self.lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+            return entry
+
+    def set(self, key, entry):
+        '''
+        Stores entry for key.
+        '''
+        with self.lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        '''
+        Removes entry for key.
+        '''
+        with self.lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def validators(entry):
+        '''
+        Returns request headers for revalidating entry.
+        '''
+        headers = {}
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, key, document):
+        '''
+        Stores downloaded document if it can be revalidated.
+        '''
+        headers = document.headers
+        if not is_storable(document):
+            self.delete(key)
+            return
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if not etag and not last_modified:
+            self.delete(key)
+            return
+        with self.lock:
+            self.misses += 1
+            self.stores += 1
+        self.set(key, {
+            'key': key,
+            'code': document.code,
+            'headers': [
+                (name, value) for name, value in headers.items()
+                if name.lower() != 'set-cookie'
+            ],
+            'body': document.body,
+            'etag': etag,
+            'last_modified': last_modified,
+            'stored': time.time(),
+        })
+
+    def revalidated(self, key, entry, document):
+        '''
+        Updates entry after server confirmed it is still valid.
+        '''
+        with self.lock:
+            self.hits += 1
+        etag = document.headers.get('ETag')
+        last_modified = document.headers.get('Last-Modified')
+        if etag or last_modified:
+            entry = dict(entry)
+            entry['etag'] = etag or entry['etag']
+            entry['last_modified'] = last_modified or entry['last_modified']
+            self.set(key, entry)
+        return entry
+
+    def stats(self):
+        '''
+        Returns dictionary with cache statistics.
+        '''
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'entries': len(self),
+        }
+
+
+class DiskHTTPCache(MemoryHTTPCache):
+    '''
+    HTTP cache storing responses in a directory, so that it can be shared
+    between processes.
+    '''
+    def __init__(self, path):
+        super(DiskHTTPCache, self).__init__()
+        self.path = path
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+    def filename(self, key):
+        '''
+        Returns name of file storing entry for key.
+        '''
+        return os.path.join(
+            self.path,
+            '{0}.cache'.format(hashlib.sha1(key.encode('utf-8')).hexdigest())
+        )
+
+    def get(self, key):
+        '''
+        Returns cached entry for key or None.
+        '''
+        try:
+            with open(self.filename(key), 'rb') as handle:
+                meta = handle.readline()
+                body = handle.read()
+        except IOError:
+            return None
+        entry = json.loads(meta.decode('utf-8'))
+        # Protect against hash collisions
+        if entry.get('key') != key:
+            return None
+        entry['headers'] = [tuple(item) for item in entry['headers']]
+        entry['body'] = body
+        return entry
+
+    def set(self, key, entry):
+        '''
+        Stores entry for key, the file is replaced atomically.
+        '''
+        meta = dict(entry)
+        body = meta.pop('body')
+        handle, name = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as output:
+            output.write(json.dumps(meta).encode('utf-8'))
+            output.write(b'\n')
+            output.write(body)
+        os.rename(name, self.filename(key))
+
+    def delete(self, key):
+        '''
+        Removes entry for key.
+        '''
+        try:
+            os.unlink(self.filename(key))
+        except OSError:
+            pass
+
+    def __len__(self):
+        return len([
+            name for name in os.listdir(self.path) if name.endswith('.cache')
+        ])
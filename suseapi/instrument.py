@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Instrumentation listeners for timing and counting of requests.
+'''
+from contextlib import contextmanager
+import logging
+import socket
+import threading
+import time
+
+
+class Listener(object):
+    '''
+    Instrumentation listener interface, this implementation ignores all
+    events.
+    '''
+    def timing(self, phase, duration, **tags):
+        '''
+        Called with duration of phase in seconds.
+        '''
+        pass
+
+    def count(self, name, value=1, **tags):
+        '''
+        Called when counted event happens.
+        '''
+        pass
+
+
+class LoggingListener(Listener):
+    '''
+    Listener logging all events.
+    '''
+    def __init__(self, logger=None, level=logging.DEBUG):
+        if logger is None:
+            logger = logging.getLogger('suse.instrument')
+        self.logger = logger
+        self.level = level
+
+    @staticmethod
+    def format_tags(tags):
+        '''
+        Formats tags for logging.
+        '''
+        return ' '.join([
+            '{0}={1}'.format(name, tags[name]) for name in sorted(tags)
+        ])
+
+    def timing(self, phase, duration, **tags):
+        self.logger.log(
+            self.level, '%s took %.3fs %s',
+            phase, duration, self.format_tags(tags)
+        )
+
+    def count(self, name, value=1, **tags):
+        self.logger.log(
+            self.level, '%s +%d %s', name, value, self.format_tags(tags)
+        )
+
+
+class HistogramListener(Listener):
+    '''
+    Listener keeping durations and counters in memory.
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations = {}
+        self.counters = {}
+        self.sizes = {}
+
+    def timing(self, phase, duration, **tags):
+        with self.lock:
+            self.durations.setdefault(phase, []).append(duration)
+            if tags.get('size') is not None:
+                self.sizes[phase] = self.sizes.get(phase, 0) + tags['size']
+
+    def count(self, name, value=1, **tags):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self):
+        '''
+        Returns dictionary with count, total, minimum, median, 95th
+        percentile and maximum duration for every phase.
+        '''
+        result = {}
+        with self.lock:
+            for phase, durations in self.durations.items():
+                values = sorted(durations)
+                result[phase] = {
+                    'count': len(values),
+                    'total': sum(values),
+                    'min': values[0],
+                    'median': values[len(values) // 2],
+                    'p95': values[int(len(values) * 0.95)],
+                    'max': values[-1],
+                    'size': self.sizes.get(phase, 0),
+                }
+        return result
+
+    def reset(self):
+        '''
+        Removes all collected data.
+        '''
+        with self.lock:
+            self.durations = {}
+            self.counters = {}
+            self.sizes = {}
+
+
+class StatsdListener(Listener):
+    '''
+    Listener sending metrics to StatsD server over UDP.
+    '''
+    def __init__(self, host='localhost', port=8125, prefix='suseapi'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, name, value, kind):
+        '''
+        Sends single metric, errors are ignored.
+        '''
+        data = '{0}.{1}:{2}|{3}'.format(self.prefix, name, value, kind)
+        try:
+            self.socket.sendto(data.encode('utf-8'), self.address)
+        except socket.error:
+            pass
+
+    def timing(self, phase, duration, **tags):
+        self.send(phase, int(duration * 1000), 'ms')
+        if tags.get('status') is not None:
+            self.send('{0}.status.{1}'.format(phase, tags['status']), 1, 'c')
+        if tags.get('size') is not None:
+            self.send('{0}.bytes'.format(phase), tags['size'], 'c')
+
+    def count(self, name, value=1, **tags):
+        self.send(name, value, 'c')
+
+
+class PhaseTimer(object):
+    '''
+    Accumulates durations of phases, useful for work interleaved with
+    consuming of generators.
+    '''
+    def __init__(self):
+        self.durations = {}
+
+    @contextmanager
+    def __call__(self, phase):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.durations[phase] = (
+                self.durations.get(phase, 0) + time.time() - start
+            )
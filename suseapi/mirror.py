@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Local mirror of Bugzilla data stored in SQLite database.
+'''
+from datetime import datetime, timedelta
+import json
+import logging
+import sqlite3
+
+import dateutil.parser
+
+from suseapi.bugzilla import BATCH_SIZE, BATCH_WORKERS
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Allowed difference between local and server clock
+SYNC_MARGIN = timedelta(minutes=5)
+
+# Number of synchronizations after which failing bug is given up
+PENDING_ATTEMPTS = 5
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS bugs ('
+    'bug_id INTEGER PRIMARY KEY, '
+    'delta_ts TEXT, '
+    'data TEXT'
+    ')',
+    'CREATE INDEX IF NOT EXISTS bugs_delta_ts ON bugs (delta_ts)',
+    'CREATE TABLE IF NOT EXISTS pending ('
+    'bug_id INTEGER PRIMARY KEY, '
+    'attempts INTEGER NOT NULL DEFAULT 0'
+    ')',
+    'CREATE TABLE IF NOT EXISTS meta ('
+    'name TEXT PRIMARY KEY, '
+    'value TEXT'
+    ')',
+)
+
+
+class BugzillaMirrorError(Exception):
+    '''
+    Mirror error class.
+    '''
+    pass
+
+
+def format_timestamp(value):
+    '''
+    Converts datetime to string stored in the database (in UTC).
+    '''
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = (value - value.utcoffset()).replace(tzinfo=None)
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+def encode_value(value):
+    '''
+    JSON encoder hook for datetime values.
+    '''
+    if isinstance(value, datetime):
+        return {'$datetime': value.isoformat()}
+    raise TypeError('Can not serialize {0!r}'.format(value))
+
+
+def decode_value(value):
+    '''
+    JSON decoder hook for datetime values.
+    '''
+    if list(value.keys()) == ['$datetime']:
+        return dateutil.parser.parse(value['$datetime'])
+    return value
+
+
+def dump_bug(bug):
+    '''
+    Serializes bug data to JSON.
+    '''
+    return json.dumps(bug.to_dict(), default=encode_value, sort_keys=True)
+
+
+def load_bug(data, bug_class):
+    '''
+    Creates bug from JSON data.
+    '''
+    return bug_class.from_dict(json.loads(data, object_hook=decode_value))
+
+
+class BugzillaMirror(object):
+    '''
+    Local copy of Bugzilla bugs, which is incrementally synchronized.
+    '''
+    def __init__(self, bugzilla, path, batch_size=BATCH_SIZE,
+                 workers=BATCH_WORKERS, max_attempts=PENDING_ATTEMPTS):
+        self.bugzilla = bugzilla
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.logger = logging.getLogger('suse.bugzilla.mirror')
+        self.connection = sqlite3.connect(path)
+        for statement in SCHEMA:
+            self.connection.execute(statement)
+        self.connection.commit()
+
+    def close(self):
+        '''
+        Closes the database.
+        '''
+        self.connection.close()
+
+    def get_meta(self, name):
+        '''
+        Reads metadata value.
+        '''
+        row = self.connection.execute(
+            'SELECT value FROM meta WHERE name = ?', (name,)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def set_meta(self, name, value):
+        '''
+        Stores metadata value.
+        '''
+        self.connection.execute(
+            'INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)',
+            (name, value)
+        )
+
+    def get_last_sync(self):
+        '''
+        Returns time of last synchronization (naive datetime in UTC).
+        '''
+        value = self.get_meta('last_sync')
+        if value is None:
+            return None
+        return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+    def store_bugs(self, bugs):
+        '''
+        Stores bugs in the database.
+        '''
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO bugs (bug_id, delta_ts, data) '
+            'VALUES (?, ?, ?)',
+            [
+                (
+                    int(bug.bug_id),
+                    format_timestamp(bug.delta_ts),
+                    dump_bug(bug),
+                )
+                for bug in bugs
+            ]
+        )
+        self.connection.commit()
+
+    def get_pending(self):
+        '''
+        Returns ids of bugs which failed to synchronize.
+        '''
+        return sorted(self.get_attempts())
+
+    def get_attempts(self):
+        '''
+        Returns dictionary with number of failed attempts for pending bugs.
+        '''
+        return dict(self.connection.execute(
+            'SELECT bug_id, attempts FROM pending'
+        ))
+
+    def set_pending(self, attempts):
+        '''
+        Stores bugs which failed to synchronize with number of attempts.
+        '''
+        self.connection.execute('DELETE FROM pending')
+        self.connection.executemany(
+            'INSERT INTO pending (bug_id, attempts) VALUES (?, ?)',
+            sorted(attempts.items())
+        )
+
+    def sync(self, startdate=None):
+        '''
+        Fetches bugs changed since last synchronization.
+
+        Bugs which failed to download are retried on next synchronization
+        until they fail max_attempts times. Returns list of updated bug ids.
+        '''
+        if startdate is None:
+            startdate = self.get_last_sync()
+        if startdate is None:
+            raise BugzillaMirrorError(
+                'Start date is needed for initial synchronization'
+            )
+        # Remember time before search, so that we don't miss changes
+        # done while synchronizing, the margin covers clock difference
+        started = format_timestamp(datetime.utcnow() - SYNC_MARGIN)
+        attempts = self.get_attempts()
+
+        self.logger.info('Synchronizing bugs changed since %s', startdate)
+        ids = [
+            int(bugid)
+            for bugid in self.bugzilla.get_recent_bugs(startdate, split=True)
+        ]
+        found = set(ids)
+        ids.extend(
+            [bugid for bugid in sorted(attempts) if bugid not in found]
+        )
+        bugs = self.bugzilla.get_bugs_batched(
+            ids, self.batch_size, self.workers, permissive=True
+        )
+        self.store_bugs(bugs)
+
+        fetched = set([int(bug.bug_id) for bug in bugs])
+        failed = {}
+        for bugid in ids:
+            if bugid in fetched:
+                continue
+            count = attempts.get(bugid, 0) + 1
+            if count >= self.max_attempts:
+                self.logger.error(
+                    'Giving up synchronizing bug %d after %d attempts',
+                    bugid, count
+                )
+            else:
+                failed[bugid] = count
+        if failed:
+            self.logger.warning(
+                'Failed to synchronize %d bugs, will retry', len(failed)
+            )
+        self.set_pending(failed)
+
+        # Advance only up to the latest change seen on the server
+        last_sync = format_timestamp(startdate)
+        changes = [
+            format_timestamp(bug.delta_ts)
+            for bug in bugs if bug.delta_ts is not None
+        ]
+        if changes:
+            last_sync = max(last_sync, min(max(changes), started))
+        self.set_meta('last_sync', last_sync)
+        self.connection.commit()
+        return [int(bug.bug_id) for bug in bugs]
+
+    def get_bug(self, bugid):
+        '''
+        Returns locally stored bug or None if it is not present.
+        '''
+        row = self.connection.execute(
+            'SELECT data FROM bugs WHERE bug_id = ?', (int(bugid),)
+        ).fetchone()
+        if row is None:
+            return None
+        return load_bug(row[0], self.bugzilla.bug_class)
+
+    def get_bugs(self, ids):
+        '''
+        Returns locally stored bugs, missing ones are skipped.
+        '''
+        result = []
+        for bugid in ids:
+            bug = self.get_bug(bugid)
+            if bug is not None:
+                result.append(bug)
+        return result
+
+    def get_changed(self, startdate):
+        '''
+        Returns list of locally stored bug ids changed since start date.
+        '''
+        return [
+            row[0] for row in self.connection.execute(
+                'SELECT bug_id FROM bugs WHERE delta_ts >= ? '
+                'ORDER BY delta_ts',
+                (format_timestamp(startdate),)
+            )
+        ]
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM bugs'
+        ).fetchone()[0]
+
+    def __contains__(self, bugid):
+        return self.connection.execute(
+            'SELECT 1 FROM bugs WHERE bug_id = ?', (int(bugid),)
+        ).fetchone() is not None
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Process wide pool of keep-alive connections shared by web scrapers.
+'''
+import threading
+import time
+
+# Default maximal number of kept connections per host
+DEFAULT_MAXSIZE = 10
+
+# Default time in seconds after which idle connections are dropped
+DEFAULT_IDLE_TIMEOUT = 60
+
+
+class ConnectionPool(object):
+    '''
+    Keep-alive connections shared by WebScraper instances.
+
+    For urllib3 transport single PoolManager is used, pycurl transport
+    shares connection cache, DNS cache and TLS sessions using CurlShare.
+    libcurl can not share connection cache between handles used from
+    different threads, so there is one CurlShare per thread and handles
+    are attached to the share of the thread doing the request.
+    '''
+    def __init__(self, maxsize=DEFAULT_MAXSIZE,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, ssl_session_reuse=True):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.ssl_session_reuse = ssl_session_reuse
+        self.lock = threading.Lock()
+        self._manager = None
+        self._local = threading.local()
+        self._last_used = None
+        self._requests = 0
+        self._connections = 0
+        self._idle_resets = 0
+
+    def get_manager(self):
+        '''
+        Returns urllib3 PoolManager, creating it on first use.
+        '''
+        with self.lock:
+            if self._manager is None:
+                import urllib3
+                import certifi
+                self._manager = urllib3.PoolManager(
+                    maxsize=self.maxsize,
+                    cert_reqs='CERT_REQUIRED',
+                    ca_certs=certifi.where()
+                )
+            return self._manager
+
+    def get_share(self):
+        '''
+        Returns pycurl CurlShare of current thread, creating it on first
+        use.
+        '''
+        share = getattr(self._local, 'share', None)
+        if share is None:
+            import pycurl
+            share = pycurl.CurlShare()
+            share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+            # Connection cache sharing needs libcurl 7.57
+            if hasattr(pycurl, 'LOCK_DATA_CONNECT'):
+                share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_CONNECT)
+            if self.ssl_session_reuse:
+                share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+            self._local.share = share
+        return share
+
+    def setup_curl(self, curl):
+        '''
+        Configures curl handle to use shared connections of current thread.
+        '''
+        import pycurl
+        share = self.get_share()
+        if getattr(curl, 'pool_share', None) is share:
+            return
+        # Handle might be already attached to another pool or thread
+        curl.unsetopt(pycurl.SHARE)
+        curl.setopt(pycurl.SHARE, share)
+        curl.pool_share = share
+        curl.setopt(pycurl.MAXCONNECTS, self.maxsize)
+        if hasattr(pycurl, 'MAXAGE_CONN'):
+            curl.setopt(pycurl.MAXAGE_CONN, int(self.idle_timeout))
+        if not self.ssl_session_reuse:
+            curl.setopt(pycurl.SSL_SESSIONID_CACHE, 0)
+
+    def setup(self, browser, transport):
+        '''
+        Configures Grab instance to use shared connections.
+        '''
+        if transport == 'urllib3':
+            browser.transport.pool = self.get_manager()
+        elif transport == 'pycurl':
+            self.setup_curl(browser.transport.curl)
+
+    def prepare(self, curl=None):
+        '''
+        Drops urllib3 connections which were idle for too long, called
+        before every request.
+
+        The curl handle is attached to the share of current thread, as
+        scrapers can be created in one thread and used in another one.
+        '''
+        if curl is not None:
+            self.setup_curl(curl)
+        with self.lock:
+            now = time.time()
+            if (self._manager is not None and
+                    self._last_used is not None and
+                    now - self._last_used > self.idle_timeout):
+                self._connections += self._manager_connections()
+                self._manager.clear()
+                self._idle_resets += 1
+            self._last_used = now
+
+    def record(self, curl=None):
+        '''
+        Records finished request, the curl handle is used to count newly
+        opened connections.
+        '''
+        connections = 0
+        if curl is not None:
+            import pycurl
+            connections = curl.getinfo(pycurl.NUM_CONNECTS)
+        with self.lock:
+            self._requests += 1
+            self._connections += connections
+
+    def _manager_connections(self):
+        '''
+        Returns number of connections opened by urllib3 pools.
+        '''
+        if self._manager is None:
+            return 0
+        pools = self._manager.pools
+        return sum(
+            pools[key].num_connections for key in pools.keys()
+        )
+
+    def stats(self):
+        '''
+        Returns dictionary with pool statistics.
+        '''
+        with self.lock:
+            connections = self._connections + self._manager_connections()
+            return {
+                'requests': self._requests,
+                'connections': connections,
+                'reused': max(0, self._requests - connections),
+                'hosts': (
+                    0 if self._manager is None else len(self._manager.pools)
+                ),
+                'idle_resets': self._idle_resets,
+            }
+
+    def clear(self):
+        '''
+        Closes kept urllib3 connections, pycurl connections are closed
+        once they reach idle timeout.
+        '''
+        with self.lock:
+            if self._manager is not None:
+                self._connections += self._manager_connections()
+                self._manager.clear()
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool():
+    '''
+    Returns process wide connection pool.
+    '''
+    global _POOL  # pylint: disable=global-statement
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ConnectionPool()
+        return _POOL
+
+
+def configure_pool(maxsize=DEFAULT_MAXSIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                   ssl_session_reuse=True):
+    '''
+    Replaces process wide connection pool with new configuration. Already
+    created scrapers keep using previous pool.
+    '''
+    global _POOL  # pylint: disable=global-statement
+    with _POOL_LOCK:
+        _POOL = ConnectionPool(maxsize, idle_timeout, ssl_session_reuse)
+        return _POOL
+
+
+def pool_stats():
+    '''
+    Returns statistics of process wide connection pool.
+    '''
+    return get_pool().stats()
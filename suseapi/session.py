@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Storage for authenticated sessions shared across processes.
+'''
+from contextlib import contextmanager
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+# pylint: disable=import-error
+from six.moves.http_cookiejar import Cookie
+
+# Cookie attributes stored in session, in order of Cookie arguments
+COOKIE_ATTRIBUTES = (
+    'version', 'name', 'value', 'port', 'port_specified', 'domain',
+    'domain_specified', 'domain_initial_dot', 'path', 'path_specified',
+    'secure', 'expires', 'discard', 'comment', 'comment_url', '_rest',
+    'rfc2109',
+)
+
+
+def dump_cookies(cookies):
+    '''
+    Converts cookies to JSON.
+    '''
+    return json.dumps([
+        dict([
+            (name, getattr(cookie, name)) for name in COOKIE_ATTRIBUTES
+        ])
+        for cookie in cookies
+    ])
+
+
+def load_cookies(data):
+    '''
+    Creates cookies from JSON as created by dump_cookies.
+    '''
+    return [
+        Cookie(*[item[name] for name in COOKIE_ATTRIBUTES])
+        for item in json.loads(data)
+    ]
+
+
+class SessionStore(object):
+    '''
+    Session store keeping cookies in memory, so it is shared only by
+    threads of single process. Subclasses implement other backends.
+    '''
+    def __init__(self):
+        self._sessions = {}
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def load(self, key):
+        '''
+        Returns stored cookies or None.
+        '''
+        data = self._sessions.get(key)
+        if data is None:
+            return None
+        return load_cookies(data)
+
+    def save(self, key, cookies):
+        '''
+        Stores cookies.
+        '''
+        self._sessions[key] = dump_cookies(cookies)
+
+    @contextmanager
+    def lock(self, key):
+        '''
+        Context manager to serialize logins for given key.
+        '''
+        with self._locks_lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            yield
+
+
+class FileSessionStore(SessionStore):
+    '''
+    Session store keeping cookies in files, using file locking to make
+    sure only one process is doing login at a time.
+    '''
+    def __init__(self, path=None):
+        if path is None:
+            from xdg.BaseDirectory import save_cache_path
+            path = save_cache_path('suseapi', 'sessions')
+        elif not os.path.exists(path):
+            os.makedirs(path)
+        self.path = path
+        super(FileSessionStore, self).__init__()
+
+    def get_filename(self, key, extension='cookies'):
+        '''
+        Returns filename for storing given key.
+        '''
+        return os.path.join(
+            self.path,
+            '{0}.{1}'.format(
+                hashlib.sha1(key.encode('utf-8')).hexdigest(),
+                extension
+            )
+        )
+
+    def load(self, key):
+        '''
+        Returns stored cookies or None.
+        '''
+        try:
+            with open(self.get_filename(key), 'rb') as handle:
+                return load_cookies(handle.read().decode('utf-8'))
+        except (IOError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, key, cookies):
+        '''
+        Stores cookies, the file is atomically replaced.
+        '''
+        handle, name = tempfile.mkstemp(dir=self.path)
+        try:
+            with os.fdopen(handle, 'wb') as output:
+                output.write(dump_cookies(cookies).encode('utf-8'))
+            os.rename(name, self.get_filename(key))
+        finally:
+            # Remove temporary file in case of failure
+            if os.path.exists(name):
+                os.unlink(name)
+
+    @contextmanager
+    def lock(self, key):
+        '''
+        Context manager to serialize logins for given key.
+        '''
+        with open(self.get_filename(key, 'lock'), 'a') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
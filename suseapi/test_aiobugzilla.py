@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Testing of asynchronous Bugzilla connector.
+'''
+
+import asyncio
+import os
+import time
+from unittest import TestCase
+
+# pylint: disable=import-error
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler
+# pylint: disable=import-error
+from six.moves.urllib.parse import parse_qs
+
+from suseapi.aiobugzilla import AsyncBugzilla
+from suseapi.bugzilla import Bugzilla, BugzillaNotFound
+from suseapi.testserver import local_server
+
+TEST_DATA = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'testdata'
+)
+
+SR_PAGE = (
+    '<html><body><a href="https://example.com/ReportView?'
+    'query%26lsMSRID%3D[10101][20202]">Report View</a></body></html>'
+)
+
+
+class BugzillaHTTPHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler serving test data as Bugzilla.
+    """
+    def log_message(self, *args):
+        pass
+
+    def send_data(self, content_type, data):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        params = parse_qs(self.rfile.read(length).decode('utf-8'))
+        if self.path == '/buglist.cgi':
+            name = 'bug-list.xml'
+        elif 'ctype' in params:
+            name = 'bug-{0}.xml'.format(params['id'][0])
+        else:
+            self.send_data('text/html', SR_PAGE.encode('utf-8'))
+            return
+        with open(os.path.join(TEST_DATA, name), 'rb') as handle:
+            self.send_data('application/xml', handle.read())
+
+
+class RestrictedHTTPHandler(BugzillaHTTPHandler):
+    """
+    HTTP handler refusing bugs until logged in.
+    """
+    logged_in = False
+
+    def do_POST(self):
+        if self.logged_in:
+            BugzillaHTTPHandler.do_POST(self)
+            return
+        length = int(self.headers['Content-Length'])
+        params = parse_qs(self.rfile.read(length).decode('utf-8'))
+        self.send_data(
+            'application/xml',
+            '<?xml version="1.0" encoding="UTF-8"?>\n<bugzilla>'
+            '<bug error="NotPermitted"><bug_id>{0}</bug_id></bug>'
+            '</bugzilla>'.format(params['id'][0]).encode('utf-8')
+        )
+
+
+class AsyncBugzillaTest(TestCase):
+    '''
+    Asynchronous Bugzilla connector tests.
+    '''
+    def setUp(self):
+        self.server = local_server(BugzillaHTTPHandler)
+        self.bugzilla = Bugzilla(
+            '', '', base=self.server.__enter__(), transport='urllib3'
+        )
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        self.server.__exit__(None, None, None)
+
+    def run_async(self, function):
+        async def wrapper():
+            async with AsyncBugzilla(self.bugzilla, limit=2) as bugzilla:
+                return await function(bugzilla)
+        return self.loop.run_until_complete(wrapper())
+
+    def test_get_bug(self):
+        bug = self.run_async(lambda bugzilla: bugzilla.get_bug(81873))
+        self.assertEqual(bug.bug_id, '81873')
+        self.assertEqual(len(bug.comments), 38)
+
+    def test_get_nonexisting_bug(self):
+        self.assertRaises(
+            BugzillaNotFound,
+            self.run_async, lambda bugzilla: bugzilla.get_bug(20000000)
+        )
+
+    def test_concurrent(self):
+        async def fetch(bugzilla):
+            return await asyncio.gather(*[
+                bugzilla.get_bug(bugid) for bugid in (81871, 81872, 81873)
+            ] + [bugzilla.do_search([]), bugzilla.get_sr(81873)])
+        result = self.run_async(fetch)
+        self.assertEqual(
+            [bug.bug_id for bug in result[:3]],
+            ['81871', '81872', '81873']
+        )
+        self.assertEqual(len(result[3]), 11)
+        self.assertEqual(result[4], [10101, 20202])
+
+    def test_concurrent_login(self):
+        logins = []
+
+        def login():
+            time.sleep(0.1)
+            logins.append(True)
+            RestrictedHTTPHandler.logged_in = True
+
+        async def fetch(bugzilla):
+            return await asyncio.gather(*[
+                bugzilla.get_bug(bugid) for bugid in (81871, 81872, 81873)
+            ])
+
+        with local_server(RestrictedHTTPHandler) as base:
+            self.bugzilla = Bugzilla(
+                'user', 'password', base=base, transport='urllib3'
+            )
+            self.bugzilla.login = login
+            try:
+                result = self.run_async(fetch)
+            finally:
+                RestrictedHTTPHandler.logged_in = False
+        self.assertEqual(
+            [bug.bug_id for bug in result], ['81871', '81872', '81873']
+        )
+        self.assertEqual(len(logins), 1)
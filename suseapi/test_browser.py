@@ -24,16 +24,18 @@ Testing of browser wrapper.
 
 from __future__ import print_function
 
-import threading
 import time
 from unittest import TestCase
+import zlib
 
 import httpretty
 
 # pylint: disable=import-error
-from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler
 import suseapi.browser
-from suseapi.browser import WebScraper, WebScraperError
+from suseapi.browser import (BodyStream, WebScraper, WebScraperError,
+                             WebResponse)
+from suseapi.testserver import local_server
 
 TEST_BASE = 'http://example.net'
 
@@ -67,6 +69,69 @@ class TimeoutHTTPHandler(BaseHTTPRequestHandler):
         self.do_GET()
 
 
+class ManyHTTPHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler for concurrent requests, echoing path and cookies.
+    """
+    def log_message(self, *args):
+        return
+
+    def do_GET(self):
+        if self.path.startswith('/missing'):
+            self.send_response(404)
+            self.end_headers()
+            return
+        if self.path.startswith('/sleep'):
+            time.sleep(0.3)
+        body = '{0} {1} {2}'.format(
+            self.command, self.path, self.headers.get('Cookie', '')
+        )
+        if self.command == 'POST':
+            length = int(self.headers.get('Content-Length', 0))
+            body += ' ' + self.rfile.read(length).decode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Set-Cookie', 'last={0}; Path=/'.format(
+            self.path.strip('/').split('?')[0]
+        ))
+        self.end_headers()
+        self.wfile.write(body.encode('utf-8'))
+
+    def do_POST(self):
+        self.do_GET()
+
+
+def compress(data, wbits=31):
+    '''
+    Compresses data using zlib with given window bits.
+    '''
+    compressor = zlib.compressobj(9, zlib.DEFLATED, wbits)
+    return compressor.compress(data) + compressor.flush()
+
+
+class CompressHTTPHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler compressing response as requested in path.
+    """
+    def log_message(self, *args):
+        return
+
+    def do_GET(self):
+        body = ('<page>{0}</page>'.format('text ' * 1000)).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        accept = self.headers.get('Accept-Encoding', '')
+        if self.path == '/gzip' and 'gzip' in accept:
+            body = compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        elif self.path == '/deflate' and 'deflate' in accept:
+            body = compress(body, 15)
+            self.send_header('Content-Encoding', 'deflate')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
 class WebScraperTest(TestCase):
     '''
     Tests web sraping.
@@ -119,19 +184,168 @@ class WebScraperTest(TestCase):
         '''
         original_timeout = suseapi.browser.DEFAULT_TIMEOUT
         suseapi.browser.DEFAULT_TIMEOUT = 0.1
-        server = HTTPServer(('localhost', 0), TimeoutHTTPHandler)
-        port = server.server_address[1]
-        server_thread = threading.Thread(target=server.serve_forever)
-        server_thread.daemon = False
-        server_thread.start()
         try:
-            scraper = WebScraper(None, None, 'http://localhost:%d' % port,
-                                 transport='urllib3')
-            scraper.request('foo')
-            scraper.browser.doc.choose_form(number=0)
-            self.assertRaises(WebScraperError, scraper.submit)
-            self.assertRaises(WebScraperError, scraper.request, 'bar?')
+            with local_server(TimeoutHTTPHandler) as base:
+                scraper = WebScraper(None, None, base, transport='urllib3')
+                scraper.request('foo')
+                scraper.browser.doc.choose_form(number=0)
+                self.assertRaises(WebScraperError, scraper.submit)
+                self.assertRaises(WebScraperError, scraper.request, 'bar?')
         finally:
             suseapi.browser.DEFAULT_TIMEOUT = original_timeout
-            server.shutdown()
-            server_thread.join()
+
+    def do_many(self, transport, requests, **kwargs):
+        '''
+        Performs request_many against local server.
+        '''
+        with local_server(ManyHTTPHandler) as base:
+            scraper = WebScraper(None, None, base, transport=transport)
+            scraper.browser.cookies.set('session', 'abc', 'localhost')
+            return scraper, scraper.request_many(requests, **kwargs)
+
+    def test_many(self):
+        '''
+        Test concurrent requests keep order and share cookies.
+        '''
+        start = time.time()
+        scraper, result = self.do_many('pycurl', [
+            ('sleep1', None),
+            ('sleep2', None),
+            ('post', {'foo': 'bar'}),
+            ('sleep3', None),
+        ])
+        # The slow requests are performed in parallel
+        self.assertLess(time.time() - start, 0.9)
+        self.assertEqual(
+            [item.unicode_body() for item in result],
+            [
+                'GET /sleep1 session=abc',
+                'GET /sleep2 session=abc',
+                'POST /post session=abc foo=bar',
+                'GET /sleep3 session=abc',
+            ]
+        )
+        self.assertTrue(isinstance(result[0], WebResponse))
+        self.assertEqual(result[0].code, 200)
+        self.assertEqual(
+            result[0].headers['Content-Type'], 'text/plain; charset=utf-8'
+        )
+        # Cookies set by responses are stored
+        self.assertTrue(
+            'last' in [cookie.name for cookie in scraper.get_cookies()]
+        )
+
+    def test_many_concurrency(self):
+        '''
+        Test limiting number of parallel transfers.
+        '''
+        dummy, result = self.do_many(
+            'pycurl',
+            [('foo{0}'.format(i), None) for i in range(5)],
+            concurrency=2
+        )
+        self.assertEqual(
+            [item.unicode_body().split()[1] for item in result],
+            ['/foo{0}'.format(i) for i in range(5)]
+        )
+
+    def test_many_errors(self):
+        '''
+        Test error handling in concurrent requests.
+        '''
+        self.assertRaises(
+            WebScraperError,
+            self.do_many, 'pycurl', [('foo', None), ('missing', None)]
+        )
+        dummy, result = self.do_many(
+            'pycurl', [('missing', None), ('foo', None)], raise_errors=False
+        )
+        self.assertTrue(isinstance(result[0], WebScraperError))
+        self.assertEqual(result[0].original.code, 404)
+        self.assertEqual(result[1].code, 200)
+
+    def test_many_config(self):
+        '''
+        Test concurrent requests use timeout and proxy of the browser.
+        '''
+        with local_server(ManyHTTPHandler) as base:
+            scraper = WebScraper(None, None, base, transport='pycurl')
+            scraper.browser.setup(timeout=0.1)
+            result = scraper.request_many(
+                [('sleep', None), ('foo', None)], raise_errors=False
+            )
+            self.assertTrue(isinstance(result[0], WebScraperError))
+            self.assertEqual(result[1].code, 200)
+            scraper.browser.setup(timeout=5, proxy='localhost:1')
+            result = scraper.request_many([('foo', None)], raise_errors=False)
+            self.assertTrue(isinstance(result[0], WebScraperError))
+
+    def test_many_sequential(self):
+        '''
+        Test fallback for transports without multi interface.
+        '''
+        dummy, result = self.do_many(
+            'urllib3', [('foo', None), ('post', {'foo': 'bar'})]
+        )
+        self.assertEqual(result[0].unicode_body(), 'GET /foo session=abc')
+        # Sequential requests see cookies set by previous ones
+        self.assertEqual(
+            result[1].unicode_body(),
+            'POST /post session=abc; last=foo foo=bar'
+        )
+        dummy, result = self.do_many(
+            'urllib3', [('missing', None)], raise_errors=False
+        )
+        self.assertTrue(isinstance(result[0], WebScraperError))
+
+
+class CompressionTest(TestCase):
+    '''
+    Tests compressed transfers.
+    '''
+    def test_body_stream(self):
+        data = b'text ' * 1000
+        for encoding, wbits in (('gzip', 31), ('deflate', 15),
+                                ('deflate', -15)):
+            sizes = []
+            stream = BodyStream(
+                compress(data, wbits), encoding, sizes.append, chunk_size=10
+            )
+            chunks = list(stream)
+            self.assertGreater(len(chunks), 1)
+            self.assertEqual(b''.join(chunks), data)
+            self.assertEqual(sizes, [len(data)])
+            self.assertEqual(stream.uncompressed_size, len(data))
+            self.assertLess(stream.compressed_size, len(data))
+        stream = BodyStream(data, chunk_size=1000)
+        self.assertEqual(len(list(stream)), 5)
+        self.assertEqual(stream.read(), data)
+
+    def check_transport(self, transport):
+        '''
+        Checks compressed transfers using given transport.
+        '''
+        with local_server(CompressHTTPHandler) as base:
+            scraper = WebScraper(None, None, base, transport=transport)
+            expected = '<page>{0}</page>'.format('text ' * 1000)
+            for action in ('gzip', 'deflate', 'plain'):
+                self.assertEqual(
+                    scraper.request(action).unicode_body(), expected
+                )
+            stream = scraper.request_stream('gzip')
+            self.assertEqual(stream.read().decode('utf-8'), expected)
+            result = scraper.request_many([('gzip', None)])
+            self.assertEqual(result[0].unicode_body(), expected)
+            if transport == 'pycurl':
+                # Decompressed by us, urllib3 does this on its own
+                self.assertEqual(stream.encoding, 'gzip')
+                self.assertFalse('Content-Encoding' in result[0].headers)
+        stats = scraper.transfer_stats()
+        self.assertEqual(stats['decoded'], len(expected) * 5)
+        self.assertLess(stats['received'], len(expected) * 2)
+
+    def test_pycurl(self):
+        self.check_transport('pycurl')
+
+    def test_urllib3(self):
+        self.check_transport('urllib3')
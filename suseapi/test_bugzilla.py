@@ -24,14 +24,40 @@ Testing of Bugzilla connector
 
 import datetime
 import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
 from unittest import TestCase
+import zlib
 
+import dateutil.parser
 import httpretty
+from lxml import etree as ElementTree
+from weblib.error import DataNotFound
+# pylint: disable=import-error
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler
+# pylint: disable=import-error
+from six.moves.urllib.parse import parse_qs
+from six import StringIO
 
+import suseapi.bugzilla
 from suseapi.bugzilla import (APIBugzilla, Bugzilla, BugzillaInvalidBugId,
-                              BugzillaLoginFailed, BugzillaNotFound,
-                              BugzillaNotPermitted, WebScraperError,
-                              escape_xml_text, get_django_bugzilla)
+                              BuglistTooLarge, BugzillaLoginFailed,
+                              BugzillaMidAirCollision, BugzillaNotFound,
+                              BugzillaNotPermitted, BugzillaUpdateError,
+                              CompactBug,
+                              WebScraperError, escape_xml_bytes,
+                              escape_xml_text, export_csv, export_numpy,
+                              get_django_bugzilla, iter_bug_rows,
+                              parse_attachment, parse_comment,
+                              parse_mass_update, parse_timestamp,
+                              update_whiteboard)
+from suseapi.export import iter_csv_rows
+from suseapi.instrument import HistogramListener
+from suseapi.session import FileSessionStore
+from suseapi.testserver import local_server
 
 
 TEST_DATA = os.path.join(
@@ -40,6 +66,114 @@ TEST_DATA = os.path.join(
 )
 
 
+class SRHTTPHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler serving bug pages with SR links.
+    """
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        params = parse_qs(self.rfile.read(length).decode('utf-8'))
+        if params['id'] == ['1']:
+            link = 'query%26lsMSRID%3D[10101][20202]'
+        elif params['id'] == ['4']:
+            link = 'query%26lsMSRID%3D[40404]'
+        elif params['id'] == ['2']:
+            link = 'query'
+        else:
+            link = None
+        if link is None:
+            body = '<html><body></body></html>'
+        else:
+            body = (
+                '<html><body><a href="https://example.com/ReportView?{0}">'
+                'Report View</a></body></html>'.format(link)
+            )
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class SearchHTTPHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler serving slow search results and counting requests.
+    """
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.requests.append(self.path)
+        time.sleep(0.2)
+        with open(os.path.join(TEST_DATA, 'bug-list.xml'), 'rb') as handle:
+            body = handle.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/atom+xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class RangeSearchHTTPHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler failing searches for intervals longer than maximal.
+    """
+    maximal = datetime.timedelta(0)
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        params = parse_qs(self.rfile.read(length).decode('utf-8'))
+        if params['chfieldto'][0] == 'Now':
+            length = self.maximal + datetime.timedelta(seconds=1)
+        else:
+            length = (
+                dateutil.parser.parse(params['chfieldto'][0]) -
+                dateutil.parser.parse(params['chfieldfrom'][0])
+            )
+        if length > self.maximal:
+            content_type = 'text/html'
+            body = b'<html><body>Buglist Too Large</body></html>'
+        else:
+            content_type = 'application/atom+xml'
+            with open(os.path.join(TEST_DATA, 'bug-list.xml'), 'rb') as handle:
+                body = handle.read()
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class GzipHTTPHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler serving compressed bug XML.
+    """
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        with open(os.path.join(TEST_DATA, 'bug-81873.xml'), 'rb') as handle:
+            body = handle.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+            body = compressor.compress(body) + compressor.flush()
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
 class BugzillaTest(TestCase):
     '''
     Bugzilla connector tests.
@@ -76,6 +210,189 @@ class BugzillaTest(TestCase):
         self.assertEqual(bug.bug_id, '81873')
         self.assertTrue(bug.has_nonempty('classification'))
 
+    @httpretty.activate
+    def test_iter_bugs(self):
+        '''
+        Test streaming parsing of multiple bugs.
+        '''
+        bugs = []
+        for name in ('bug-81871.xml', 'bug-81873.xml'):
+            data = open(os.path.join(TEST_DATA, name)).read()
+            bugs.append(data[data.find('<bug>'):data.rfind('</bugzilla>')])
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/show_bug.cgi',
+            body='<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<bugzilla version="3.4.3">{0}</bugzilla>'.format(''.join(bugs)),
+        )
+        bugzilla = Bugzilla('', '', transport='urllib3')
+        original_size = suseapi.bugzilla.STREAM_CHUNK_SIZE
+        suseapi.bugzilla.STREAM_CHUNK_SIZE = 100
+        try:
+            result = bugzilla.iter_bugs([81871, 81873])
+            self.assertEqual(next(result).bug_id, '81871')
+            bug = next(result)
+            self.assertEqual(bug.bug_id, '81873')
+            self.assertEqual(len(bug.comments), 38)
+            self.assertRaises(StopIteration, next, result)
+        finally:
+            suseapi.bugzilla.STREAM_CHUNK_SIZE = original_size
+
+    @httpretty.activate
+    def test_get_bugs_batched(self):
+        '''
+        Test fetching bugs in parallel batches.
+        '''
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/show_bug.cgi',
+            body=open(os.path.join(TEST_DATA, 'bug-81873.xml')).read(),
+        )
+        bugzilla = Bugzilla('', '', transport='urllib3')
+        bugs = bugzilla.get_bugs_batched(
+            [81873, None, 81873, 81873], batch_size=1, workers=2
+        )
+        self.assertEqual(len(bugs), 3)
+        self.assertEqual(bugs[2].bug_id, '81873')
+
+    def test_clone(self):
+        '''
+        Test cloning of Bugzilla instance.
+        '''
+        bugzilla = APIBugzilla('test', 'test', transport='urllib3')
+        bugzilla.browser.cookies.set('test', 'value', 'apibugzilla.suse.com')
+        bugzilla.cookie_set = True
+        clone = bugzilla.clone()
+        self.assertIsInstance(clone, APIBugzilla)
+        self.assertIsNot(clone.browser, bugzilla.browser)
+        self.assertEqual(clone.base, bugzilla.base)
+        self.assertTrue(clone.cookie_set)
+        self.assertEqual(len(clone.get_cookies()), 1)
+
+    @httpretty.activate
+    def test_instrumentation(self):
+        '''
+        Test instrumentation of requests and parsing.
+        '''
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/show_bug.cgi',
+            body=open(os.path.join(TEST_DATA, 'bug-81873.xml')).read(),
+        )
+        bugzilla = Bugzilla('', '', transport='urllib3')
+        listener = HistogramListener()
+        bugzilla.add_listener(listener)
+        self.assertEqual(bugzilla.get_bug(81873).bug_id, '81873')
+        summary = listener.summary()
+        self.assertEqual(
+            sorted(summary), ['parse', 'request', 'sanitize']
+        )
+        self.assertEqual(summary['request']['count'], 1)
+        self.assertTrue(summary['request']['size'] > 0)
+        self.assertEqual(bugzilla.clone().listeners, [listener])
+
+    @httpretty.activate
+    def test_get_compact_bug(self):
+        '''
+        Test getting bug using compact representation.
+        '''
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/show_bug.cgi',
+            body=open(os.path.join(TEST_DATA, 'bug-81871.xml')).read(),
+        )
+        bugzilla = Bugzilla('', '', transport='urllib3')
+        bug = bugzilla.get_bug(81871)
+        bugzilla.bug_class = CompactBug
+        compact = bugzilla.get_bug(81871)
+        self.assertIsInstance(compact, CompactBug)
+        self.assertFalse(hasattr(compact, '__dict__'))
+        for name in ('bug_id', 'bug_status', 'status_whiteboard', 'delta_ts',
+                     'cf_foundby', 'flags', 'cc_list', 'comments',
+                     'attachments'):
+            self.assertEqual(getattr(compact, name), getattr(bug, name))
+        self.assertTrue(compact.has_nonempty('classification'))
+        self.assertFalse(compact.has_nonempty('nonexisting'))
+        self.assertRaises(AttributeError, getattr, compact, 'nonexisting')
+
+    @httpretty.activate
+    def test_export(self):
+        """
+        Test columnar export of bugs.
+        """
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/show_bug.cgi',
+            body=open(os.path.join(TEST_DATA, 'bug-81871.xml')).read(),
+        )
+        bugzilla = Bugzilla('', '', transport='urllib3')
+        bug = bugzilla.get_bug(81871)
+        bugzilla.bug_class = CompactBug
+        compact = bugzilla.get_bug(81871)
+        for name in ('comment_count', 'attachment_count', 'flag_count',
+                     'cc_count'):
+            self.assertEqual(getattr(compact, name), getattr(bug, name))
+        self.assertEqual(bug.comment_count, len(bug.comments))
+
+        rows = list(iter_bug_rows([bug, compact]))
+        self.assertEqual(rows[0], rows[1])
+        self.assertEqual(rows[0][0], 81871)
+        self.assertIsNone(rows[0][1].tzinfo)
+
+        handle = StringIO()
+        self.assertEqual(export_csv(iter([bug, compact]), handle), 2)
+        lines = handle.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith('bug_id,creation_ts,'))
+        self.assertTrue(lines[1].startswith('81871,'))
+
+        try:
+            import numpy
+        except ImportError:
+            return
+        data = export_numpy([bug, compact])
+        self.assertEqual(len(data), 2)
+        self.assertEqual(data['bug_id'][0], 81871)
+        self.assertEqual(data['creation_ts'].dtype, numpy.dtype('M8[s]'))
+        self.assertEqual(
+            data['comment_count'].sum(), 2 * bug.comment_count
+        )
+
+    @httpretty.activate
+    def test_get_bug_fields(self):
+        '''
+        Test getting bug with limited fields.
+        '''
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/show_bug.cgi',
+            body='<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<bugzilla version="3.4.3"><bug>'
+            '<bug_id>81873</bug_id><bug_status>NEW</bug_status>'
+            '<attachment><attachid>1</attachid></attachment>'
+            '<long_desc><who>user</who><bug_when>2009-09-22 14:17:15 +0200'
+            '</bug_when></long_desc>'
+            '</bug></bugzilla>',
+        )
+        bugzilla = Bugzilla('', '', transport='urllib3')
+        bug = bugzilla.get_bugs(
+            [81873],
+            include_fields=['bug_status', 'long_desc', 'attachment'],
+            exclude_fields=['cc'],
+        )[0]
+        params = parse_qs(httpretty.last_request().body.decode('utf-8'))
+        self.assertEqual(
+            params['field'],
+            ['bug_id', 'bug_status', 'long_desc', 'attachment']
+        )
+        self.assertEqual(params['excludefield'], ['attachmentdata', 'cc'])
+        self.assertEqual(bug.bug_status, 'NEW')
+        self.assertEqual(bug.cc_list, [])
+        self.assertIsNone(bug.delta_ts)
+        self.assertIsNone(bug.comments[0]['thetext'])
+        self.assertIsNone(bug.attachments[0]['date'])
+        self.assertFalse(bug.has_nonempty('status_whiteboard'))
+
     @httpretty.activate
     def test_get_private_bug(self):
         '''
@@ -252,6 +569,82 @@ class BugzillaTest(TestCase):
         bugzilla = APIBugzilla('test', 'test', transport='urllib3')
         bugzilla.login()
 
+    @httpretty.activate
+    def test_session_store(self):
+        '''
+        Test sharing login using session store.
+        '''
+        self.httpretty_login()
+        path = tempfile.mkdtemp()
+        try:
+            store = FileSessionStore(path)
+            bugzilla = APIBugzilla(
+                'test', 'test', transport='urllib3', session_store=store
+            )
+            bugzilla.browser.cookies.set(
+                'session', 'value', 'apibugzilla.suse.com'
+            )
+            bugzilla.login()
+            self.assertEqual(len(store.load('test@' + bugzilla.base)), 1)
+
+            # Cookies are picked up from the store
+            httpretty.reset()
+            other = APIBugzilla(
+                'test', 'test', transport='urllib3', session_store=store
+            )
+            other.login()
+            self.assertTrue(other.cookie_set)
+            self.assertEqual(other.get_cookies()[0].value, 'value')
+
+            # Stored cookies already in use trigger real login
+            self.httpretty_login()
+            other.login(force=True)
+            self.assertTrue(httpretty.has_request())
+        finally:
+            shutil.rmtree(path)
+
+    @httpretty.activate
+    def test_session_store_relogin(self):
+        '''
+        Test that relogin on 502 does not reuse discarded stored cookies.
+        '''
+        path = tempfile.mkdtemp()
+        try:
+            store = FileSessionStore(path)
+            bugzilla = APIBugzilla(
+                'test', 'test', transport='urllib3', session_store=store
+            )
+            key = 'test@' + bugzilla.base
+            bugzilla.browser.cookies.set(
+                'session', 'stale', 'apibugzilla.suse.com'
+            )
+            store.save(key, bugzilla.get_cookies())
+            bugzilla.browser.cookies.clear()
+            bugzilla.login()
+            self.assertFalse(httpretty.has_request())
+            self.assertEqual(bugzilla.get_cookies()[0].value, 'stale')
+
+            httpretty.register_uri(
+                httpretty.POST,
+                'https://apibugzilla.suse.com/show_bug.cgi',
+                status=502,
+            )
+            httpretty.register_uri(
+                httpretty.POST,
+                'https://apibugzilla.suse.com/index.cgi',
+                body='<html><body><a href="#">Log out</a></body></html>',
+                content_type='text/html',
+                set_cookie='session=fresh; Domain=apibugzilla.suse.com',
+            )
+            self.assertRaises(WebScraperError, bugzilla.get_bug, 81873)
+            paths = [request.path for request in httpretty.latest_requests()]
+            self.assertIn('/index.cgi', paths)
+            self.assertNotIn(
+                'stale', [cookie.value for cookie in store.load(key)]
+            )
+        finally:
+            shutil.rmtree(path)
+
     @httpretty.activate
     def test_recent(self):
         '''
@@ -281,6 +674,127 @@ class BugzillaTest(TestCase):
             ]
         )
 
+    @httpretty.activate
+    def test_iter_search(self):
+        """
+        Test streaming search results into batched bug fetching.
+        """
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/buglist.cgi',
+            body=open(os.path.join(TEST_DATA, 'bug-list.xml')).read(),
+        )
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/show_bug.cgi',
+            body=open(os.path.join(TEST_DATA, 'bug-81873.xml')).read(),
+        )
+        bugzilla = Bugzilla('', '', transport='urllib3')
+        search = bugzilla.iter_search([])
+        self.assertEqual(next(search), 847050)
+        self.assertEqual(len(list(search)), 10)
+        bugs = list(bugzilla.iter_bugs_batched(
+            bugzilla.iter_search([]), batch_size=1, workers=1
+        ))
+        self.assertEqual(len(bugs), 11)
+        self.assertEqual(bugs[0].bug_id, '81873')
+
+    @httpretty.activate
+    def test_search_rows(self):
+        """
+        Test fetching columns using CSV search.
+        """
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/buglist.cgi',
+            body=open(os.path.join(TEST_DATA, 'bug-list.csv')).read(),
+            content_type='text/csv',
+        )
+        bugzilla = Bugzilla('', '', transport='urllib3')
+        columns = ['bug_status', 'assigned_to', 'status_whiteboard',
+                   'changeddate']
+        rows = bugzilla.do_search([], columns)
+        self.assertEqual(
+            parse_qs(httpretty.last_request().body.decode())['columnlist'],
+            [','.join(columns)]
+        )
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0].bug_id, 847050)
+        self.assertEqual(rows[0].status_whiteboard, 'CVSS:v2:4.3 openL3:42')
+        self.assertEqual(rows[1].status_whiteboard, '')
+        self.assertEqual(rows[2].status_whiteboard, 'multi\nline')
+        self.assertEqual(rows[2].bug_status, 'NEEDINFO')
+        self.assertEqual(
+            rows[0].changeddate, datetime.datetime(2013, 10, 2, 12, 1, 37)
+        )
+        self.assertRaises(AttributeError, getattr, rows[0], 'product')
+        row = pickle.loads(pickle.dumps(rows[0], 2))
+        self.assertEqual(row.bug_id, 847050)
+        self.assertEqual(row.bug_status, 'NEW')
+
+    @httpretty.activate
+    def test_search_rows_unicode(self):
+        """
+        Test CSV search and export with non-ASCII data.
+        """
+        summary = u'Chyba v kódování – Čihař'
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/buglist.cgi',
+            body=u'bug_id,short_desc\n847050,"{0}"\n'.format(
+                summary
+            ).encode('utf-8'),
+            content_type='text/csv; charset=utf-8',
+        )
+        bugzilla = Bugzilla('', '', transport='urllib3')
+        rows = bugzilla.do_search([], ['short_desc'])
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0].short_desc, summary)
+
+        handle = StringIO()
+        columns = (('bug_id', 'i8'), ('short_desc', 'O'))
+        self.assertEqual(export_csv(rows, handle, columns), 1)
+        data = handle.getvalue()
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        self.assertEqual(
+            list(iter_csv_rows(data)),
+            [['bug_id', 'short_desc'], ['847050', summary]]
+        )
+
+    def test_too_large(self):
+        '''
+        Test handling of too large search result.
+        '''
+        RangeSearchHTTPHandler.maximal = datetime.timedelta(0)
+        with local_server(RangeSearchHTTPHandler) as base:
+            bugzilla = Bugzilla('', '', base=base, transport='urllib3')
+            self.assertRaises(
+                BuglistTooLarge,
+                bugzilla.get_recent_bugs, datetime.datetime(2014, 1, 1)
+            )
+            self.assertRaises(
+                BuglistTooLarge,
+                bugzilla.do_range_search, [],
+                datetime.datetime(2014, 1, 1),
+                datetime.datetime(2014, 1, 1, 0, 0, 2),
+            )
+
+    def test_range_search(self):
+        '''
+        Test splitting of search interval.
+        '''
+        RangeSearchHTTPHandler.maximal = datetime.timedelta(hours=1)
+        with local_server(RangeSearchHTTPHandler) as base:
+            bugzilla = Bugzilla('', '', base=base, transport='urllib3')
+            recent = bugzilla.do_range_search(
+                [],
+                datetime.datetime(2014, 1, 1),
+                datetime.datetime(2014, 1, 1, 4),
+            )
+        self.assertEqual(len(recent), 11)
+        self.assertEqual(recent[0], 847050)
+
     def test_escape(self):
         self.assertEqual(
             escape_xml_text('ahoj'),
@@ -294,6 +808,43 @@ class BugzillaTest(TestCase):
             '\\x31 !"#$%&\''
         )
 
+    def test_escape_bytes(self):
+        '''
+        Test escaping of encoded data matches escaping of text.
+        '''
+        self.assertEqual(
+            escape_xml_bytes(b'ahoj'),
+            b'ahoj'
+        )
+        self.assertEqual(
+            escape_xml_bytes(
+                u''.join([chr(x) for x in range(40)]).encode('utf-8')
+            ),
+            escape_xml_text(
+                ''.join([chr(x) for x in range(40)])
+            ).encode('utf-8')
+        )
+        self.assertEqual(
+            escape_xml_bytes(u'\u010d\x02'.encode('utf-8')),
+            u'\u010d\\x02'.encode('utf-8')
+        )
+
+    def test_parse_timestamp(self):
+        '''
+        Test parsing of Bugzilla and other timestamp formats.
+        '''
+        for value in ('2005-05-04 18:21:00 +0200', '2005-05-04 18:21 -0530',
+                      '2014-07-17 11:38:53 +0000', '2014-07-17T11:38:53Z',
+                      '2014-07-17 11:38:53 CEST'):
+            self.assertEqual(
+                parse_timestamp(value),
+                dateutil.parser.parse(value)
+            )
+        self.assertEqual(
+            parse_timestamp('2005-05-04 18:21:00 -0130').utcoffset(),
+            datetime.timedelta(hours=-1, minutes=-30)
+        )
+
     def _load_update_form(self):
         self.httpretty_login()
         httpretty.register_uri(
@@ -318,3 +869,422 @@ class BugzillaTest(TestCase):
         bugzilla = self._load_update_form()
         self.assertEqual('2014-07-17 11:38:53',
                          bugzilla.browser.doc.form_fields()['delta_ts'])
+
+    @httpretty.activate
+    def test_bulk_update(self):
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/show_bug.cgi',
+            body=open(os.path.join(TEST_DATA, 'bug-872984.html')).read(),
+            content_type="text/html",
+        )
+        bugzilla = Bugzilla('test', 'test', force_readonly=True,
+                            transport='urllib3')
+        collisions = []
+
+        def callback(browser, param):
+            if not collisions:
+                collisions.append(param)
+                raise BugzillaMidAirCollision('Mid-air collision!', param)
+            return True
+
+        def failing_callback(browser, param):
+            raise BugzillaUpdateError('Failed', param)
+
+        result = bugzilla.bulk_update([
+            (872984, {'longdesclength': '4'}),
+            (872985, {'callback': callback, 'callback_param': 872985}),
+            (872986, {'callback': failing_callback, 'callback_param': 872986}),
+        ], workers=2)
+        self.assertEqual(result[0], (872984, None))
+        self.assertEqual(result[1], (872985, None))
+        self.assertEqual(collisions, [872985])
+        self.assertEqual(result[2][0], 872986)
+        self.assertIsInstance(result[2][1], BugzillaUpdateError)
+
+    @httpretty.activate
+    def test_bulk_update_submit(self):
+        submitted = []
+
+        def process_bug(request, uri, headers):
+            params = parse_qs(request.body.decode('utf-8'))
+            submitted.append(params)
+            headers['content-type'] = 'text/html'
+            if params['longdesclength'] == ['5']:
+                body = '<html><title>Mid-air collision!</title></html>'
+            else:
+                body = (
+                    '<html><body><dl><dt>Changes submitted for '
+                    '<a href="show_bug.cgi?id=872984">bug 872984</a>'
+                    '</dt></dl></body></html>'
+                )
+            return (200, headers, body)
+
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/show_bug.cgi',
+            body=open(os.path.join(TEST_DATA, 'bug-872984.html')).read(),
+            content_type="text/html",
+        )
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/process_bug.cgi',
+            body=process_bug,
+        )
+        bugzilla = Bugzilla('test', 'test', transport='urllib3')
+        result = bugzilla.bulk_update([
+            (872984, {'longdesclength': '4'}),
+            (872985, {'longdesclength': '5'}),
+            (872986, {'missing_field': 'value'}),
+        ], workers=1, retries=1)
+        self.assertEqual(result[0], (872984, None))
+        self.assertIsInstance(result[1][1], BugzillaMidAirCollision)
+        # Missing field in the form is reported as well, older grab
+        # raises DataNotFound, newer KeyError
+        self.assertEqual(result[2][0], 872986)
+        self.assertIsInstance(result[2][1], (KeyError, DataNotFound))
+        self.assertEqual(
+            [params['longdesclength'] for params in submitted],
+            [['4'], ['5'], ['5']]
+        )
+
+    @httpretty.activate
+    def test_mass_update(self):
+        requests = []
+
+        def buglist(request, uri, headers):
+            params = parse_qs(request.body.decode('utf-8'))
+            requests.append(params)
+            if 'ctype' in params:
+                headers['content-type'] = 'text/csv'
+                body = (
+                    'bug_id,status_whiteboard,changeddate\n'
+                    '1,openL3,2014-01-01 10:00\n2,,2014-01-01 10:00\n'
+                    '3,,2014-01-01 10:00\n'
+                )
+            else:
+                headers['content-type'] = 'text/html'
+                filename = os.path.join(TEST_DATA, 'buglist-tweak.html')
+                with open(filename) as handle:
+                    body = handle.read()
+            return (200, headers, body)
+
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/buglist.cgi',
+            body=buglist,
+        )
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/show_bug.cgi',
+            body=open(os.path.join(TEST_DATA, 'bug-872984.html')).read(),
+            content_type="text/html",
+        )
+        bugzilla = Bugzilla('test', 'test', force_readonly=True,
+                            transport='urllib3')
+        result = bugzilla.mass_update([1, 2, 3], whiteboard_add='openL3')
+        self.assertEqual(result, [(1, None), (2, None), (3, None)])
+        self.assertEqual(len(requests), 2)
+        self.assertEqual(requests[0]['bug_id'], ['1,2,3'])
+        self.assertEqual(
+            requests[0]['columnlist'], ['status_whiteboard,changeddate']
+        )
+        # Bug 1 already has the whiteboard
+        self.assertEqual(requests[1]['bug_id'], ['2,3'])
+        self.assertEqual(requests[1]['tweak'], ['1'])
+
+        # Field is not in mass edit form, bugs are updated one by one
+        result = bugzilla.mass_update([872984], longdesclength='4')
+        self.assertEqual(result, [(872984, None)])
+        self.assertEqual(requests[2]['bug_id'], ['872984'])
+        self.assertIn(
+            'id=872984', httpretty.last_request().body.decode('utf-8')
+        )
+
+    @httpretty.activate
+    def test_mass_update_submit(self):
+        searches = []
+        submitted = []
+
+        def buglist(request, uri, headers):
+            params = parse_qs(request.body.decode('utf-8'))
+            if 'ctype' in params:
+                searches.append(params)
+                headers['content-type'] = 'text/csv'
+                body = (
+                    'bug_id,status_whiteboard,changeddate\n'
+                    '1,openL3,2014-01-01 10:00\n2,,2014-01-01 10:00\n'
+                    '3,,2014-01-01 10:00\n'
+                )
+            else:
+                headers['content-type'] = 'text/html'
+                filename = os.path.join(TEST_DATA, 'buglist-tweak.html')
+                with open(filename) as handle:
+                    body = handle.read()
+            return (200, headers, body)
+
+        def process_bug(request, uri, headers):
+            params = parse_qs(request.body.decode('utf-8'))
+            submitted.append(params)
+            headers['content-type'] = 'text/html'
+            return (200, headers, (
+                '<html><body><dl><dt>Changes submitted for '
+                '<a href="show_bug.cgi?id=2">bug 2</a></dt><dt>Changes '
+                'submitted for <a href="show_bug.cgi?id=3">bug 3</a></dt>'
+                '</dl></body></html>'
+            ))
+
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/buglist.cgi',
+            body=buglist,
+        )
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/show_bug.cgi',
+            body=open(os.path.join(TEST_DATA, 'bug-872984.html')).read(),
+            content_type="text/html",
+        )
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/process_bug.cgi',
+            body=process_bug,
+        )
+        bugzilla = Bugzilla('test', 'test', transport='urllib3')
+        bugzilla.search_cache_ttl = 60
+        result = bugzilla.mass_update([1, 2, 3], whiteboard_add='openL3')
+        self.assertEqual(result, [(1, None), (2, None), (3, None)])
+        # Both bugs are confirmed by single mass edit
+        self.assertEqual(len(submitted), 1)
+        self.assertEqual(submitted[0]['id_2'], ['on'])
+        self.assertEqual(submitted[0]['id_3'], ['on'])
+        self.assertEqual(submitted[0]['status_whiteboard'], [' openL3'])
+
+        # Changed times are checked before submitting
+        self.assertEqual(searches[1]['columnlist'], ['changeddate'])
+
+        # Whiteboards are not taken from search cache
+        bugzilla.mass_update([1, 2, 3], whiteboard_add='openL3')
+        self.assertEqual(len(searches), 4)
+
+    @httpretty.activate
+    def test_mass_update_collision(self):
+        searches = []
+        submitted = []
+
+        def buglist(request, uri, headers):
+            params = parse_qs(request.body.decode('utf-8'))
+            if 'ctype' not in params:
+                headers['content-type'] = 'text/html'
+                filename = os.path.join(TEST_DATA, 'buglist-tweak.html')
+                with open(filename) as handle:
+                    return (200, headers, handle.read())
+            searches.append(params)
+            headers['content-type'] = 'text/csv'
+            # Bug 3 is changed after the first search
+            bugs = {
+                2: ('', '2014-01-01 10:00'),
+                3: ('foo', '2014-01-01 10:05'),
+            }
+            if len(searches) == 1:
+                bugs[3] = ('', '2014-01-01 10:00')
+            columns = params['columnlist'][0].split(',')
+            body = ['bug_id,{0}'.format(','.join(columns))]
+            for bugid in params['bug_id'][0].split(','):
+                whiteboard, changed = bugs[int(bugid)]
+                values = {'status_whiteboard': whiteboard,
+                          'changeddate': changed}
+                body.append(','.join(
+                    [bugid] + [values[column] for column in columns]
+                ))
+            return (200, headers, '\n'.join(body))
+
+        def process_bug(request, uri, headers):
+            params = parse_qs(request.body.decode('utf-8'))
+            submitted.append(params)
+            headers['content-type'] = 'text/html'
+            return (200, headers, ''.join([
+                '<dt>Changes submitted for '
+                '<a href="show_bug.cgi?id={0}">bug</a></dt>'.format(bugid)
+                for bugid in (2, 3) if 'id_{0}'.format(bugid) in params
+            ]))
+
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/buglist.cgi',
+            body=buglist,
+        )
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/process_bug.cgi',
+            body=process_bug,
+        )
+        bugzilla = Bugzilla('test', 'test', transport='urllib3')
+        result = bugzilla.mass_update([2, 3], whiteboard_add='openL3')
+        self.assertEqual(result, [(2, None), (3, None)])
+        self.assertEqual(len(submitted), 2)
+        # Bug 3 is submitted again with current whiteboard
+        self.assertNotIn('id_3', submitted[0])
+        self.assertEqual(submitted[1]['id_3'], ['on'])
+        self.assertEqual(submitted[1]['status_whiteboard'], ['foo openL3'])
+
+    def test_parse_mass_update(self):
+        self.assertEqual(
+            parse_mass_update(
+                '<dt>Changes submitted for <a href="show_bug.cgi?id=2" '
+                'title="NEW - test">bug 2</a></dt>'
+                '<dt>Changes submitted for\n<a href="show_bug.cgi?id=3">'
+                'bug 3</a></dt>'
+            ),
+            set([2, 3])
+        )
+        self.assertEqual(update_whiteboard('wasL3 x', 'wasL3', 'openL3'),
+                         ' x openL3')
+
+    def test_get_srs(self):
+        with local_server(SRHTTPHandler) as base:
+            bugzilla = Bugzilla('', '', base=base, transport='urllib3')
+            self.assertEqual(bugzilla.get_sr(1), [10101, 20202])
+            self.assertEqual(
+                bugzilla.get_srs([1, 2, 3, 4], workers=2),
+                {1: [10101, 20202], 2: [], 3: [], 4: [40404]}
+            )
+
+    def test_get_srs_pycurl(self):
+        '''
+        Test parallel clones using pycurl transport.
+        '''
+        with local_server(SRHTTPHandler) as base:
+            bugzilla = Bugzilla('', '', base=base, transport='pycurl')
+            result = bugzilla.get_srs(range(1, 21), workers=4)
+        self.assertEqual(result[1], [10101, 20202])
+        self.assertEqual(result[4], [40404])
+        self.assertEqual(len(result), 20)
+
+    def register_search(self):
+        self.searches = []
+
+        def callback(request, uri, headers):
+            self.searches.append(uri)
+            with open(os.path.join(TEST_DATA, 'bug-list.xml')) as handle:
+                return (200, headers, handle.read())
+
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/buglist.cgi',
+            body=callback,
+        )
+
+    @httpretty.activate
+    def test_search_cache(self):
+        Bugzilla._cache.clear()
+        self.register_search()
+        bugzilla = Bugzilla('', '', transport='urllib3')
+        bugzilla.search_cache_ttl = 60
+        first = bugzilla.get_openl3_bugs()
+        self.assertEqual(len(first), 11)
+        # Modifying result must not affect the cache
+        first.pop()
+        self.assertEqual(bugzilla.get_openl3_bugs(), first + [844953])
+        self.assertEqual(len(self.searches), 1)
+        # Different search is not cached
+        bugzilla.get_opensec_bugs()
+        self.assertEqual(len(self.searches), 2)
+        # Disabled cache
+        bugzilla.search_cache_ttl = None
+        bugzilla.get_openl3_bugs()
+        self.assertEqual(len(self.searches), 3)
+
+    @httpretty.activate
+    def test_search_cache_stale(self):
+        Bugzilla._cache.clear()
+        self.register_search()
+        bugzilla = Bugzilla('', '', transport='urllib3')
+        bugzilla.search_cache_ttl = 60
+        bugzilla.search_cache_stale = 60
+        params = [('status_whiteboard', 'openL3')]
+        key = bugzilla._search_cache_key(params)
+        bugzilla.cache_set(key, (time.time() - 90, [1]))
+        # Stale result is returned and refreshed in background
+        self.assertEqual(bugzilla.do_search(params), [1])
+        for dummy in range(100):
+            if key not in Bugzilla._search_pending:
+                break
+            time.sleep(0.05)
+        self.assertEqual(len(self.searches), 1)
+        self.assertEqual(len(bugzilla.do_search(params)), 11)
+        # Expired result is not used
+        bugzilla.cache_set(key, (time.time() - 150, [1]))
+        self.assertEqual(len(bugzilla.do_search(params)), 11)
+        self.assertEqual(len(self.searches), 2)
+
+    def test_search_cache_concurrent(self):
+        Bugzilla._cache.clear()
+        SearchHTTPHandler.requests = []
+        with local_server(SearchHTTPHandler) as base:
+            bugzilla = Bugzilla('', '', base=base, transport='urllib3')
+            bugzilla.search_cache_ttl = 60
+            results = []
+
+            def search():
+                results.append(bugzilla.clone().get_openl3_bugs())
+
+            threads = [threading.Thread(target=search) for dummy in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(results), 4)
+            for result in results:
+                self.assertEqual(len(result), 11)
+            self.assertEqual(len(SearchHTTPHandler.requests), 1)
+
+    @httpretty.activate
+    def test_search_cache_timeout(self):
+        Bugzilla._cache.clear()
+        self.register_search()
+        bugzilla = Bugzilla('', '', transport='urllib3')
+        bugzilla.search_cache_ttl = 60
+        bugzilla.browser.setup(timeout=0.1)
+        params = [('status_whiteboard', 'openL3')]
+        key = bugzilla._search_cache_key(params)
+        # Search which never finishes
+        Bugzilla._search_pending[key] = threading.Event()
+        try:
+            self.assertEqual(len(bugzilla.do_search(params)), 11)
+        finally:
+            Bugzilla._search_pending.pop(key)
+        self.assertEqual(len(self.searches), 1)
+
+    def test_iter_bugs_compressed(self):
+        '''
+        Test parsing of compressed response while decompressing it.
+        '''
+        with local_server(GzipHTTPHandler) as base:
+            bugzilla = Bugzilla('', '', base=base)
+            listener = HistogramListener()
+            bugzilla.add_listener(listener)
+            bug = bugzilla.get_bug(81873)
+            self.assertEqual(len(bug.comments), 38)
+        stats = bugzilla.transfer_stats()
+        self.assertLess(stats['received'], stats['decoded'])
+        self.assertGreater(stats['ratio'], 3)
+        self.assertEqual(
+            listener.counters['decoded_bytes'], stats['decoded']
+        )
+
+    def test_parse_empty_elements(self):
+        '''
+        Test that empty elements are parsed as None.
+        '''
+        comment = parse_comment(ElementTree.fromstring(
+            '<long_desc><who>foo</who><thetext/></long_desc>'
+        ), anonymous=True)
+        self.assertEqual(comment['thetext'], None)
+        attachment = parse_attachment(ElementTree.fromstring(
+            '<attachment><attachid>1</attachid><desc/>'
+            '<date>2014-01-01 10:00:00 +0000</date></attachment>'
+        ))
+        self.assertEqual(attachment['desc'], None)
+        self.assertEqual(attachment['attachid'], '1')
+        self.assertEqual(attachment['filename'], None)
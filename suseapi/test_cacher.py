@@ -41,6 +41,55 @@ class CacherTest(TestCase):
         self.cache.cache_set('value', 42)
         self.assertEqual(self.cache.cache_get('value'), 42)
 
+    def test_timeout(self):
+        self.cache.cache_set('timeout', 42, -1)
+        self.assertTrue(self.cache.cache_get('timeout') is None)
+
+    def test_invalid_key(self):
+        self.cache.cache_set('invalid key', 42)
+        self.assertEqual(self.cache.cache_get('invalid key'), 42)
+
+    def test_delete(self):
+        self.cache.cache_set('delete', 42)
+        self.cache.cache_delete('delete')
+        self.assertTrue(self.cache.cache_get('delete', True) is None)
+
+
+class BoundedCacher(CacherMixin):
+    _cache = {}
+    cache_maxsize = 3
+
+
+class OtherBoundedCacher(BoundedCacher):
+    cache_key_template = 'other-%s'
+
+
+class BoundedCacherTest(TestCase):
+    def test_maxsize(self):
+        cache = BoundedCacher()
+        cache.cache_set('expired', 1, -1)
+        cache.cache_set('short', 2, 10)
+        cache.cache_set('long', 3, 100)
+        # Expired entry is purged first
+        cache.cache_set('new', 4, 50)
+        self.assertTrue(cache.cache_get('expired', True) is None)
+        self.assertEqual(cache.cache_get('short'), 2)
+        # Then the one closest to expiry
+        cache.cache_set('other', 5, 50)
+        self.assertTrue(cache.cache_get('short', True) is None)
+        self.assertEqual(len(cache.cache_entries()), 3)
+        self.assertEqual(cache.cache_get('long'), 3)
+
+    def test_namespace(self):
+        cache = BoundedCacher()
+        cache.cache_set('value', 1)
+        other = OtherBoundedCacher()
+        for value in range(5):
+            other.cache_set(str(value), value)
+        # Other namespace does not evict entries
+        self.assertEqual(cache.cache_get('value'), 1)
+        self.assertEqual(len(other.cache_entries()), 3)
+
 
 class DjangoCacherTest(CacherTest):
     def setUp(self):
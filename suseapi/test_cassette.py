@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Testing of traffic recording and replaying.
+'''
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import httpretty
+
+from suseapi.bugzilla import Bugzilla, BugzillaNotFound
+from suseapi.cassette import (MODE_RECORD, Cassette, CassetteError,
+                              generate_bugzilla_cassette, synthetic_bugs)
+
+TEST_DATA = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'testdata'
+)
+
+
+class CassetteTest(TestCase):
+    '''
+    Cassette tests.
+    '''
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'cassette.json.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    @httpretty.activate
+    def record(self):
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/show_bug.cgi',
+            body=open(os.path.join(TEST_DATA, 'bug-872984.html')).read(),
+            content_type='text/html',
+        )
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/process_bug.cgi',
+            body='<html><body>Changes submitted for bug</body></html>',
+            content_type='text/html',
+        )
+        bugzilla = Bugzilla('test', 'test', transport='urllib3')
+        bugzilla.cassette = Cassette(self.path, MODE_RECORD)
+        bugzilla.load_update_form(872984)
+        bugzilla.submit()
+        bugzilla.cassette.save()
+        return bugzilla.cassette
+
+    def test_replay(self):
+        self.assertEqual(len(self.record()), 2)
+        bugzilla = Bugzilla('test', 'test', transport='urllib3')
+        bugzilla.cassette = Cassette(self.path)
+        self.assertEqual(len(bugzilla.cassette), 2)
+        bugzilla.load_update_form(872984)
+        self.assertTrue(bugzilla.viewing_html())
+        response = bugzilla.submit()
+        self.assertIn(b'Changes submitted', response.body)
+        # Unknown request
+        self.assertRaises(CassetteError, bugzilla.get_bug, 1)
+
+    def test_repeat(self):
+        cassette = Cassette()
+        cassette.add(
+            'https://bugzilla.novell.com/show_bug.cgi',
+            'id=20000000&ctype=xml&excludefield=attachmentdata',
+            open(os.path.join(TEST_DATA, 'bug-20000000.xml'), 'rb').read(),
+            headers=[['Content-Type', 'text/xml']],
+        )
+        bugzilla = Bugzilla('', '', transport='urllib3')
+        bugzilla.cassette = cassette
+        # Responses are repeated
+        for dummy in range(2):
+            self.assertRaises(
+                BugzillaNotFound, bugzilla.get_bug, 20000000
+            )
+
+    def test_synthetic(self):
+        ids = list(range(1, 26))
+        cassette = generate_bugzilla_cassette(
+            ids, search=[('product', 'Test')], batch_size=10
+        )
+        self.assertEqual(len(cassette), 4)
+        bugzilla = Bugzilla('', '', transport='urllib3')
+        bugzilla.cassette = cassette
+        self.assertEqual(bugzilla.do_search([('product', 'Test')]), ids)
+        bugs = bugzilla.get_bugs_batched(ids, batch_size=10, workers=2)
+        self.assertEqual([int(bug.bug_id) for bug in bugs], ids)
+        self.assertEqual(len(bugs[0].comments), 5)
+
+    def test_control_chars(self):
+        data = synthetic_bugs([1, 2], control_chars=True)
+        self.assertIn(b'\x02', data)
+        bugzilla = Bugzilla('', '', transport='urllib3')
+        bugs = list(bugzilla.parse_bugs(data, [1, 2]))
+        self.assertEqual(len(bugs), 2)
+        self.assertIn('\\x02', ''.join([
+            comment['thetext'] for comment in bugs[0].comments
+        ]))
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Testing of conditional HTTP cache.
+'''
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import httpretty
+
+from suseapi.browser import WebScraper
+from suseapi.bugzilla import Bugzilla
+from suseapi.httpcache import DiskHTTPCache, MemoryHTTPCache
+from suseapi.instrument import HistogramListener
+
+TEST_BASE = 'http://example.net'
+
+TEST_DATA = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'testdata'
+)
+
+
+class HTTPCacheTest(TestCase):
+    '''
+    Tests revalidation of cached responses.
+    '''
+    def setUp(self):
+        self.body = 'First'
+        self.etag = '"1"'
+        self.last_modified = None
+        self.headers = {}
+        self.requests = []
+
+    def callback(self, request, uri, headers):
+        '''
+        Emulates server supporting conditional requests.
+        '''
+        self.requests.append(request)
+        headers.update(self.headers)
+        if self.etag:
+            headers['ETag'] = self.etag
+        if self.last_modified:
+            headers['Last-Modified'] = self.last_modified
+        if self.etag and request.headers.get('If-None-Match') == self.etag:
+            return (304, headers, '')
+        if (self.last_modified and
+                request.headers.get('If-Modified-Since') ==
+                self.last_modified):
+            return (304, headers, '')
+        return (200, headers, self.body)
+
+    def get_scraper(self, cache, user=None):
+        '''
+        Returns scraper using cache and fake server.
+        '''
+        for method in (httpretty.GET, httpretty.POST):
+            httpretty.register_uri(
+                method, '{0}/page'.format(TEST_BASE), body=self.callback
+            )
+        scraper = WebScraper(user, None, TEST_BASE, transport='urllib3')
+        scraper.http_cache = cache
+        return scraper
+
+    @httpretty.activate
+    def test_etag(self):
+        cache = MemoryHTTPCache()
+        scraper = self.get_scraper(cache)
+        listener = HistogramListener()
+        scraper.add_listener(listener)
+        self.assertEqual(scraper.request('page').unicode_body(), 'First')
+        self.assertFalse('If-None-Match' in self.requests[0].headers)
+        self.assertEqual(scraper.request('page').unicode_body(), 'First')
+        self.assertEqual(self.requests[1].headers['If-None-Match'], '"1"')
+        self.assertEqual(scraper.browser.doc.code, 200)
+        self.assertEqual(
+            cache.stats(),
+            {'hits': 1, 'misses': 1, 'stores': 1, 'entries': 1}
+        )
+        self.assertEqual(listener.counters['cache_hit'], 1)
+        # Validators are not kept in browser configuration
+        self.assertFalse(
+            'If-None-Match' in scraper.browser.config['headers']
+        )
+
+        # Changed resource
+        self.body = 'Second'
+        self.etag = '"2"'
+        self.assertEqual(scraper.request('page').unicode_body(), 'Second')
+        self.assertEqual(scraper.request('page').unicode_body(), 'Second')
+        self.assertEqual(cache.stats()['hits'], 2)
+
+    @httpretty.activate
+    def test_last_modified(self):
+        self.etag = None
+        self.last_modified = 'Wed, 21 Oct 2015 07:28:00 GMT'
+        cache = MemoryHTTPCache()
+        scraper = self.get_scraper(cache)
+        scraper.request('page')
+        self.assertEqual(scraper.request('page').unicode_body(), 'First')
+        self.assertEqual(
+            self.requests[1].headers['If-Modified-Since'],
+            self.last_modified
+        )
+        self.assertEqual(cache.hits, 1)
+
+    @httpretty.activate
+    def test_not_cached(self):
+        self.etag = None
+        cache = MemoryHTTPCache()
+        scraper = self.get_scraper(cache)
+        scraper.request('page')
+        self.assertEqual(len(cache), 0)
+        self.etag = '"1"'
+        scraper.request('page', {'foo': 'bar'})
+        self.assertEqual(len(cache), 0)
+
+    @httpretty.activate
+    def test_not_storable(self):
+        cache = MemoryHTTPCache()
+        scraper = self.get_scraper(cache)
+        for headers in ({'Cache-Control': 'private, max-age=60'},
+                        {'Cache-Control': 'no-store'},
+                        {'Vary': 'Cookie'},
+                        {'Vary': '*'}):
+            self.headers = headers
+            scraper.request('page')
+            self.assertEqual(len(cache), 0)
+        # We always send same Accept-Encoding
+        self.headers = {'Vary': 'Accept-Encoding'}
+        scraper.request('page')
+        self.assertEqual(len(cache), 1)
+
+    @httpretty.activate
+    def test_users(self):
+        path = tempfile.mkdtemp()
+        try:
+            first = self.get_scraper(DiskHTTPCache(path), 'first')
+            second = self.get_scraper(DiskHTTPCache(path), 'second')
+            first.request('page')
+            # Response fetched for other user is not revalidated
+            second.request('page')
+            self.assertFalse('If-None-Match' in self.requests[1].headers)
+            self.assertEqual(len(first.http_cache), 2)
+            first.request('page')
+            self.assertEqual(self.requests[2].headers['If-None-Match'], '"1"')
+        finally:
+            shutil.rmtree(path)
+
+    def test_maxsize(self):
+        cache = MemoryHTTPCache(maxsize=2)
+        for url in ('a', 'b', 'c'):
+            cache.set(url, {'url': url})
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('c'), {'url': 'c'})
+
+    @httpretty.activate
+    def test_disk(self):
+        path = tempfile.mkdtemp()
+        try:
+            scraper = self.get_scraper(DiskHTTPCache(path))
+            scraper.request('page')
+            # New cache instance uses stored responses
+            cache = DiskHTTPCache(path)
+            self.assertEqual(len(cache), 1)
+            scraper.http_cache = cache
+            self.assertEqual(scraper.request('page').unicode_body(), 'First')
+            self.assertEqual(cache.hits, 1)
+            self.assertEqual(
+                self.requests[1].headers['If-None-Match'], '"1"'
+            )
+            cache.delete(
+                scraper._get_cache_key('{0}/page'.format(TEST_BASE))
+            )
+            self.assertEqual(len(cache), 0)
+        finally:
+            shutil.rmtree(path)
+
+    @httpretty.activate
+    def test_bugzilla(self):
+        for action, content_type in (('index', 'text/html'),
+                                     ('show_bug', 'application/xml')):
+            for method in (httpretty.GET, httpretty.POST):
+                httpretty.register_uri(
+                    method,
+                    'https://bugzilla.novell.com/{0}.cgi'.format(action),
+                    body=self.callback,
+                    content_type=content_type,
+                )
+        bugzilla = Bugzilla('test', 'test', transport='urllib3')
+        bugzilla.http_cache = MemoryHTTPCache()
+
+        # Login check is sent as GET and revalidated
+        self.body = '<html><body><a href="#">Log out</a></body></html>'
+        self.assertTrue(bugzilla.check_login())
+        self.assertTrue(bugzilla.check_login())
+        self.assertEqual(
+            [request.method for request in self.requests], ['GET', 'GET']
+        )
+        self.assertIn('GoAheadAndLogIn=1', self.requests[1].path)
+        self.assertEqual(self.requests[1].headers['If-None-Match'], '"1"')
+        self.assertEqual(bugzilla.http_cache.hits, 1)
+
+        # Same for bug XML
+        with open(os.path.join(TEST_DATA, 'bug-81873.xml')) as handle:
+            self.body = handle.read()
+        self.etag = '"2"'
+        self.assertEqual(bugzilla.get_bug(81873).bug_id, '81873')
+        self.assertEqual(bugzilla.get_bug(81873).bug_id, '81873')
+        self.assertEqual(self.requests[3].method, 'GET')
+        self.assertIn('ctype=xml', self.requests[3].path)
+        self.assertEqual(self.requests[3].headers['If-None-Match'], '"2"')
+        self.assertEqual(bugzilla.http_cache.hits, 2)
+
+        # Too long URLs are still POSTed
+        bugzilla.get_bugs(range(1, 500))
+        self.assertEqual(self.requests[4].method, 'POST')
+        self.assertIn('ctype=xml', self.requests[4].body.decode('utf-8'))
+
+        # Without cache the requests are POSTed as before
+        bugzilla.http_cache = None
+        bugzilla.get_bug(81873)
+        self.assertEqual(self.requests[5].method, 'POST')
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Testing of instrumentation listeners.
+'''
+
+import logging
+import socket
+from unittest import TestCase
+
+from suseapi.instrument import (HistogramListener, LoggingListener,
+                                PhaseTimer, StatsdListener)
+
+
+class InstrumentTest(TestCase):
+    '''
+    Instrumentation listeners tests.
+    '''
+    def test_histogram(self):
+        listener = HistogramListener()
+        for duration in (0.3, 0.1, 0.2):
+            listener.timing('request', duration, status=200, size=100)
+        listener.count('retry')
+        listener.count('retry', 2)
+        summary = listener.summary()
+        self.assertEqual(summary['request']['count'], 3)
+        self.assertEqual(summary['request']['min'], 0.1)
+        self.assertEqual(summary['request']['median'], 0.2)
+        self.assertEqual(summary['request']['max'], 0.3)
+        self.assertEqual(summary['request']['size'], 300)
+        self.assertEqual(listener.counters, {'retry': 3})
+        listener.reset()
+        self.assertEqual(listener.summary(), {})
+
+    def test_logging(self):
+        messages = []
+
+        class Handler(logging.Handler):
+            def emit(self, record):
+                messages.append(record.getMessage())
+
+        logger = logging.getLogger('suse.instrument.test')
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(Handler())
+        listener = LoggingListener(logger)
+        listener.timing('request', 0.5, action='show_bug', status=200)
+        listener.count('relogin')
+        self.assertEqual(messages, [
+            'request took 0.500s action=show_bug status=200',
+            'relogin +1 ',
+        ])
+
+    def test_statsd(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(('127.0.0.1', 0))
+        server.settimeout(5)
+        try:
+            listener = StatsdListener(
+                '127.0.0.1', server.getsockname()[1], 'test'
+            )
+            listener.timing('request', 0.25, status=200, size=10)
+            listener.count('retry')
+            received = [
+                server.recv(1024).decode('utf-8') for dummy in range(4)
+            ]
+        finally:
+            server.close()
+        self.assertEqual(received, [
+            'test.request:250|ms',
+            'test.request.status.200:1|c',
+            'test.request.bytes:10|c',
+            'test.retry:1|c',
+        ])
+
+    def test_timer(self):
+        timer = PhaseTimer()
+        with timer('parse'):
+            pass
+        with timer('parse'):
+            pass
+        self.assertEqual(list(timer.durations), ['parse'])
+        self.assertTrue(timer.durations['parse'] >= 0)
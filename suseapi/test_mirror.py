@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Testing of local Bugzilla mirror.
+'''
+
+import datetime
+import os
+from unittest import TestCase
+
+import dateutil.tz
+import httpretty
+# pylint: disable=import-error
+from six.moves.urllib.parse import parse_qs
+
+from suseapi.bugzilla import Bugzilla, CompactBug
+from suseapi.mirror import BugzillaMirror, BugzillaMirrorError
+
+TEST_DATA = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'testdata'
+)
+
+
+class BugzillaMirrorTest(TestCase):
+    '''
+    Bugzilla mirror tests.
+    '''
+    def setUp(self):
+        self.mirror = BugzillaMirror(
+            Bugzilla('', '', transport='urllib3'), ':memory:'
+        )
+
+    def tearDown(self):
+        self.mirror.close()
+
+    @staticmethod
+    def register_uris():
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/buglist.cgi',
+            body=open(os.path.join(TEST_DATA, 'bug-list.xml')).read(),
+        )
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/show_bug.cgi',
+            body=open(os.path.join(TEST_DATA, 'bug-81873.xml')).read(),
+        )
+
+    def test_initial(self):
+        '''
+        Test initial synchronization needs start date.
+        '''
+        self.assertRaises(BugzillaMirrorError, self.mirror.sync)
+
+    @httpretty.activate
+    def test_sync(self):
+        '''
+        Test initial and incremental synchronization.
+        '''
+        self.register_uris()
+        startdate = datetime.datetime(2014, 1, 1)
+        self.assertEqual(self.mirror.sync(startdate), [81873])
+        self.assertEqual(len(self.mirror), 1)
+        self.assertIn(81873, self.mirror)
+        self.assertNotIn(81874, self.mirror)
+        # The only bug changed before start date, mark is not moved
+        self.assertEqual(self.mirror.get_last_sync(), startdate)
+
+        bug = self.mirror.get_bug(81873)
+        self.assertEqual(bug.bug_id, '81873')
+        self.assertEqual(bug.status_whiteboard, 'wasL3:1')
+        self.assertEqual(len(self.mirror.get_bugs([81873, 81874])), 1)
+        self.assertIsNone(self.mirror.get_bug(81874))
+
+        self.assertEqual(
+            self.mirror.get_changed(datetime.datetime(2009, 9, 22, 12)),
+            [81873]
+        )
+        self.assertEqual(
+            self.mirror.get_changed(datetime.datetime(2009, 9, 22, 13)),
+            []
+        )
+
+        # Incremental sync
+        self.assertEqual(self.mirror.sync(), [81873])
+        self.assertEqual(len(self.mirror), 1)
+
+    @httpretty.activate
+    def test_pending(self):
+        '''
+        Test bugs failing to download are retried.
+        '''
+        self.register_uris()
+        self.mirror.sync(datetime.datetime(2014, 1, 1))
+        # Bugs missing in the response are retried
+        pending = self.mirror.get_pending()
+        self.assertEqual(len(pending), 11)
+        self.assertNotIn(81873, pending)
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://bugzilla.novell.com/buglist.cgi',
+            body='<?xml version="1.0" encoding="UTF-8"?>'
+            '<feed xmlns="http://www.w3.org/2005/Atom"></feed>',
+        )
+        self.mirror.sync()
+        requested = parse_qs(httpretty.last_request().body.decode('utf-8'))
+        self.assertEqual(
+            sorted([int(bugid) for bugid in requested['id']]), pending
+        )
+        self.assertEqual(self.mirror.get_pending(), pending)
+
+    @httpretty.activate
+    def test_pending_limit(self):
+        '''
+        Test failing bugs are dropped after max attempts.
+        '''
+        self.register_uris()
+        self.mirror.max_attempts = 2
+        self.mirror.sync(datetime.datetime(2014, 1, 1))
+        self.assertEqual(len(self.mirror.get_pending()), 11)
+        self.assertEqual(set(self.mirror.get_attempts().values()), set([1]))
+        self.mirror.sync()
+        self.assertEqual(self.mirror.get_pending(), [])
+
+    @httpretty.activate
+    def test_last_sync(self):
+        '''
+        Test last synchronization uses server time.
+        '''
+        self.register_uris()
+        self.mirror.sync(datetime.datetime(2009, 1, 1))
+        # Server time of latest change is used
+        self.assertEqual(
+            self.mirror.get_last_sync(),
+            self.mirror.get_bug(81873).delta_ts.astimezone(
+                dateutil.tz.tzutc()
+            ).replace(tzinfo=None)
+        )
+
+    @httpretty.activate
+    def test_split(self):
+        '''
+        Test synchronization splits large searches.
+        '''
+        self.register_uris()
+        calls = []
+        bugzilla = self.mirror.bugzilla
+        original = bugzilla.get_recent_bugs
+
+        def get_recent_bugs(startdate, split=False):
+            calls.append(split)
+            return original(startdate, split)
+
+        bugzilla.get_recent_bugs = get_recent_bugs
+        self.mirror.sync(datetime.datetime(2014, 1, 1))
+        self.assertEqual(calls, [True])
+
+    @httpretty.activate
+    def test_storage(self):
+        '''
+        Test bugs are stored as JSON and loaded back.
+        '''
+        self.register_uris()
+        self.mirror.sync(datetime.datetime(2014, 1, 1))
+        # Data are stored as JSON, not pickled objects
+        data = self.mirror.connection.execute(
+            'SELECT data FROM bugs WHERE bug_id = 81873'
+        ).fetchone()[0]
+        self.assertIn('"short_desc"', data)
+        original = self.mirror.bugzilla.get_bug(81873)
+        bug = self.mirror.get_bug(81873)
+        self.assertEqual(bug.comments, original.comments)
+        self.assertEqual(bug.attachments, original.attachments)
+        self.assertEqual(bug.delta_ts, original.delta_ts)
+        self.assertEqual(bug.cc_list, original.cc_list)
+
+        # Compact bugs
+        self.mirror.bugzilla.bug_class = CompactBug
+        bug = self.mirror.get_bug(81873)
+        self.assertTrue(isinstance(bug, CompactBug))
+        self.assertEqual(bug.comments, original.comments)
+        self.assertEqual(bug.status_whiteboard, 'wasL3:1')
+        self.mirror.store_bugs([bug])
+        self.assertEqual(
+            self.mirror.get_bug(81873).short_desc, original.short_desc
+        )
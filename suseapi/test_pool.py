@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Testing of shared connection pool.
+'''
+
+import threading
+import time
+from unittest import TestCase
+
+# pylint: disable=import-error
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler
+
+import suseapi.pool
+from suseapi.browser import WebScraper
+from suseapi.pool import ConnectionPool, configure_pool, get_pool, pool_stats
+from suseapi.testserver import local_server
+
+
+class KeepAliveHTTPHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler keeping connections alive and counting them.
+    """
+    protocol_version = 'HTTP/1.1'
+    connections = 0
+
+    def log_message(self, *args):
+        return
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        KeepAliveHTTPHandler.connections += 1
+
+    def do_GET(self):
+        body = self.path.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ConnectionPoolTest(TestCase):
+    '''
+    Tests connection sharing between scrapers.
+    '''
+    def setUp(self):
+        KeepAliveHTTPHandler.connections = 0
+        self.server = local_server(KeepAliveHTTPHandler)
+        self.base = self.server.__enter__()
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+
+    def do_requests(self, transport, pool, count=2):
+        '''
+        Performs requests using several scrapers sharing pool.
+        '''
+        for i in range(count):
+            scraper = WebScraper(None, None, self.base, transport=transport)
+            scraper.set_pool(pool)
+            self.assertEqual(
+                scraper.request('page{0}'.format(i)).unicode_body(),
+                '/page{0}'.format(i)
+            )
+            self.assertEqual(
+                scraper.request('other').unicode_body(), '/other'
+            )
+
+    def check_reuse(self, transport):
+        '''
+        Checks that connections are reused across scrapers.
+        '''
+        pool = ConnectionPool()
+        self.do_requests(transport, pool)
+        self.assertEqual(KeepAliveHTTPHandler.connections, 1)
+        stats = pool.stats()
+        self.assertEqual(stats['requests'], 4)
+        self.assertEqual(stats['connections'], 1)
+        self.assertEqual(stats['reused'], 3)
+
+    def test_reuse_urllib3(self):
+        self.check_reuse('urllib3')
+        self.assertEqual(
+            get_pool().stats()['requests'], pool_stats()['requests']
+        )
+
+    def test_reuse_pycurl(self):
+        self.check_reuse('pycurl')
+
+    def test_threads_pycurl(self):
+        pool = ConnectionPool()
+        scrapers = []
+        for dummy in range(4):
+            scraper = WebScraper(None, None, self.base)
+            scraper.set_pool(pool)
+            scrapers.append(scraper)
+        results = []
+        shares = []
+
+        def worker(scraper):
+            for i in range(10):
+                results.append(
+                    scraper.request('page{0}'.format(i)).unicode_body()
+                )
+            shares.append(scraper.browser.transport.curl.pool_share)
+
+        # Scrapers created in main thread are used in parallel workers
+        threads = [
+            threading.Thread(target=worker, args=(scraper,))
+            for scraper in scrapers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 40)
+        self.assertEqual(
+            sorted(set(results)), ['/page{0}'.format(i) for i in range(10)]
+        )
+        # Every thread uses own share
+        self.assertEqual(len(set([id(share) for share in shares])), 4)
+        self.assertIsNot(shares[0], pool.get_share())
+        self.assertEqual(pool.stats()['requests'], 40)
+
+    def test_request_many(self):
+        pool = ConnectionPool()
+        scraper = WebScraper(None, None, self.base)
+        scraper.set_pool(pool)
+        scraper.request_many([('first', None)], concurrency=1)
+        scraper.request_many([('second', None)], concurrency=1)
+        self.assertEqual(KeepAliveHTTPHandler.connections, 1)
+        self.assertEqual(pool.stats()['requests'], 2)
+
+    def test_idle_timeout(self):
+        pool = ConnectionPool(idle_timeout=0.1)
+        scraper = WebScraper(None, None, self.base, transport='urllib3')
+        scraper.set_pool(pool)
+        scraper.request('first')
+        time.sleep(0.2)
+        scraper.request('second')
+        stats = pool.stats()
+        self.assertEqual(stats['idle_resets'], 1)
+        self.assertEqual(stats['connections'], 2)
+
+    def test_configure(self):
+        original = get_pool()
+        try:
+            pool = configure_pool(maxsize=2, idle_timeout=5)
+            self.assertIs(get_pool(), pool)
+            self.assertEqual(pool.maxsize, 2)
+            scraper = WebScraper(None, None, self.base)
+            self.assertIs(scraper.pool, pool)
+        finally:
+            suseapi.pool._POOL = original
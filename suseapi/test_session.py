@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Testing of session store.
+'''
+
+import json
+import shutil
+import tempfile
+from unittest import TestCase
+
+# pylint: disable=import-error
+from six.moves.http_cookiejar import Cookie
+
+from suseapi.session import FileSessionStore, SessionStore
+
+
+def make_cookie(name, value):
+    '''
+    Creates cookie object.
+    '''
+    return Cookie(
+        0, name, value, None, False, 'example.net', False, False, '/',
+        False, False, None, False, None, None, {}
+    )
+
+
+class SessionStoreTest(TestCase):
+    '''
+    Session store tests.
+    '''
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_memory(self):
+        store = SessionStore()
+        self.assertIsNone(store.load('key'))
+        with store.lock('key'):
+            store.save('key', [make_cookie('name', 'value')])
+        cookies = store.load('key')
+        self.assertEqual(cookies[0].name, 'name')
+        self.assertEqual(cookies[0].value, 'value')
+        self.assertIsNone(store.load('other'))
+
+    def test_file(self):
+        store = FileSessionStore(self.path)
+        self.assertIsNone(store.load('key'))
+        with store.lock('key'):
+            store.save('key', [make_cookie('name', 'value')])
+        cookies = FileSessionStore(self.path).load('key')
+        self.assertEqual(len(cookies), 1)
+        self.assertEqual(cookies[0].name, 'name')
+        self.assertEqual(cookies[0].value, 'value')
+        self.assertEqual(cookies[0].domain, 'example.net')
+        self.assertIsNone(store.load('other'))
+
+    def test_file_format(self):
+        store = FileSessionStore(self.path)
+        cookie = make_cookie('name', 'value')
+        cookie.expires = 1500000000
+        store.save('key', [cookie])
+        # Stored as JSON, not pickle
+        with open(store.get_filename('key')) as handle:
+            data = json.load(handle)
+        self.assertEqual(data[0]['value'], 'value')
+        loaded = store.load('key')[0]
+        self.assertEqual(loaded.expires, 1500000000)
+        self.assertEqual(loaded.path, '/')
+        self.assertFalse(loaded.secure)
+        # Invalid data is ignored
+        with open(store.get_filename('key'), 'wb') as handle:
+            handle.write(b'\x80\x02]q\x00.')
+        self.assertIsNone(store.load('key'))
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Testing of full text index.
+'''
+
+import datetime
+import os
+from unittest import TestCase
+
+# pylint: disable=import-error
+from lxml import etree as ElementTree
+
+from suseapi.bugzilla import Bug
+import suseapi.textindex
+from suseapi.textindex import BugIndex, parse_query, tokenize
+
+TEST_DATA = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'testdata'
+)
+
+
+class FakeBug(object):
+    '''
+    Minimal bug object for indexing.
+    '''
+    def __init__(self, bug_id, short_desc, comments, delta_ts=None):
+        self.bug_id = str(bug_id)
+        self.short_desc = short_desc
+        self.status_whiteboard = ''
+        self.comments = [{'thetext': comment} for comment in comments]
+        self.delta_ts = delta_ts
+
+
+class BugIndexTest(TestCase):
+    '''
+    Full text index tests.
+    '''
+    def setUp(self):
+        self.index = BugIndex(':memory:')
+        self.index.index_bugs([
+            FakeBug(1, 'Kernel crash', ['BUG at mm/slab.c:123', 'Thanks']),
+            FakeBug(2, 'Crash in kernel', ['Duplicate of slab issue']),
+            FakeBug(3, 'Typo', ['kernel']),
+        ])
+
+    def tearDown(self):
+        self.index.close()
+
+    def test_tokenize(self):
+        self.assertEqual(
+            tokenize('BUG at mm/slab.c:123'),
+            ['bug', 'at', 'mm', 'slab', 'c', '123']
+        )
+        self.assertEqual(tokenize(None), [])
+        self.assertEqual(
+            parse_query('kernel "Slab.c" ""'),
+            [['kernel'], ['slab', 'c']]
+        )
+
+    def test_term(self):
+        self.assertEqual(len(self.index), 3)
+        self.assertIn(1, self.index)
+        self.assertEqual(self.index.search_term('kernel'), [1, 2, 3])
+        self.assertEqual(self.index.search_term('SLAB'), [1, 2])
+        self.assertEqual(self.index.search_term('missing'), [])
+
+    def test_phrase(self):
+        self.assertEqual(self.index.search_phrase(['kernel', 'crash']), [1])
+        self.assertEqual(self.index.search_phrase(['crash', 'kernel']), [])
+        self.assertEqual(self.index.search('"slab.c:123"'), [1])
+        # Phrases do not match across texts
+        self.assertEqual(self.index.search('"crash bug"'), [])
+        self.assertEqual(self.index.search('kernel "in kernel"'), [2])
+        self.assertEqual(self.index.search('kernel slab'), [1, 2])
+        self.assertEqual(self.index.search(''), [])
+
+    def test_candidates(self):
+        kernel = self.index._get_term_id('kernel')
+        self.assertEqual(
+            sorted(self.index._get_postings(kernel, set([2, 3, 4]))),
+            [2, 3]
+        )
+        self.assertEqual(self.index._get_postings(kernel, set()), {})
+        # Candidates are split into several queries
+        original = suseapi.textindex.CANDIDATES_CHUNK
+        suseapi.textindex.CANDIDATES_CHUNK = 1
+        try:
+            self.assertEqual(self.index.search('kernel slab'), [1, 2])
+            self.assertEqual(
+                self.index.search_phrase(['kernel'], set([1, 3, 5])), [1, 3]
+            )
+        finally:
+            suseapi.textindex.CANDIDATES_CHUNK = original
+
+    def test_update(self):
+        changed = datetime.datetime(2014, 1, 1)
+        self.assertEqual(
+            self.index.index_bugs([FakeBug(3, 'Typo', ['fixed'], changed)]),
+            [3]
+        )
+        self.assertEqual(self.index.search_term('kernel'), [1, 2])
+        self.assertEqual(self.index.search_term('fixed'), [3])
+        # Unchanged bug is skipped
+        self.assertEqual(
+            self.index.index_bugs([FakeBug(3, 'Typo', ['new'], changed)]),
+            []
+        )
+        self.index.remove_bug(3)
+        self.assertEqual(self.index.search_term('fixed'), [])
+        self.assertNotIn(3, self.index)
+
+    def test_bug(self):
+        tree = ElementTree.parse(os.path.join(TEST_DATA, 'bug-81871.xml'))
+        bug = Bug(tree.find('bug'))
+        self.assertEqual(self.index.index_bugs([bug]), [81871])
+        self.assertEqual(self.index.search('"automatic test-post"'), [81871])
+        self.assertEqual(self.index.search('wasl3'), [81871])
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Local HTTP server shared by the testsuite.
+'''
+
+from contextlib import contextmanager
+import threading
+
+# pylint: disable=import-error
+from six.moves.BaseHTTPServer import HTTPServer
+# pylint: disable=import-error
+from six.moves.socketserver import ThreadingMixIn
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    '''
+    Threaded HTTP server.
+    '''
+    daemon_threads = True
+
+
+@contextmanager
+def local_server(handler):
+    '''
+    Runs threaded HTTP server with given handler on a free local port
+    and yields its base URL.
+    '''
+    server = ThreadingHTTPServer(('localhost', 0), handler)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.start()
+    try:
+        yield 'http://localhost:{0}'.format(server.server_address[1])
+    finally:
+        server.shutdown()
+        server_thread.join()
+        server.server_close()
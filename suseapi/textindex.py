@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2015 Michal Čihař <mcihar@suse.cz>
+#
+# This file is part of python-suseapi
+# <https://github.com/openSUSE/python-suseapi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+'''
+Full text index of Bugzilla bugs stored in SQLite database.
+'''
+import logging
+import re
+import sqlite3
+
+from suseapi.mirror import format_timestamp
+
+TOKEN_MATCH = re.compile(r'\w+', re.UNICODE)
+
+QUERY_MATCH = re.compile(r'"([^"]*)"|(\S+)', re.UNICODE)
+
+# Number of candidate bug ids passed to single SQL query, SQLite limits
+# number of query parameters to 999 by default
+CANDIDATES_CHUNK = 500
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS documents ('
+    'bug_id INTEGER PRIMARY KEY, '
+    'delta_ts TEXT'
+    ')',
+    'CREATE TABLE IF NOT EXISTS terms ('
+    'term_id INTEGER PRIMARY KEY, '
+    'term TEXT UNIQUE'
+    ')',
+    'CREATE TABLE IF NOT EXISTS postings ('
+    'term_id INTEGER, '
+    'bug_id INTEGER, '
+    'positions TEXT, '
+    'PRIMARY KEY (term_id, bug_id)'
+    ')',
+    'CREATE INDEX IF NOT EXISTS postings_bug_id ON postings (bug_id)',
+)
+
+
+def tokenize(text):
+    '''
+    Splits text into lowercase terms.
+    '''
+    if not text:
+        return []
+    return [token.lower() for token in TOKEN_MATCH.findall(text)]
+
+
+def parse_query(query):
+    '''
+    Parses query into list of phrases, each being list of terms.
+
+    Words in double quotes form phrase, other words are single term
+    phrases.
+    '''
+    result = []
+    for match in QUERY_MATCH.finditer(query):
+        if match.group(1) is not None:
+            terms = tokenize(match.group(1))
+            if terms:
+                result.append(terms)
+        else:
+            result.extend([[term] for term in tokenize(match.group(2))])
+    return result
+
+
+def get_bug_texts(bug):
+    '''
+    Returns list of indexed texts for bug.
+    '''
+    texts = [
+        getattr(bug, 'short_desc', None),
+        getattr(bug, 'status_whiteboard', None),
+    ]
+    texts.extend([comment['thetext'] for comment in bug.comments])
+    return texts
+
+
+class BugIndex(object):
+    '''
+    Inverted index of bug summaries, whiteboards and comments.
+    '''
+    def __init__(self, path):
+        self.logger = logging.getLogger('suse.bugzilla.index')
+        self.connection = sqlite3.connect(path)
+        for statement in SCHEMA:
+            self.connection.execute(statement)
+        self.connection.commit()
+        self._term_ids = {}
+
+    def close(self):
+        '''
+        Closes the database.
+        '''
+        self.connection.close()
+
+    def _get_term_id(self, term, create=False):
+        '''
+        Returns term ID, creating it if needed.
+        '''
+        if term in self._term_ids:
+            return self._term_ids[term]
+        row = self.connection.execute(
+            'SELECT term_id FROM terms WHERE term = ?', (term,)
+        ).fetchone()
+        if row is not None:
+            term_id = row[0]
+        elif create:
+            term_id = self.connection.execute(
+                'INSERT INTO terms (term) VALUES (?)', (term,)
+            ).lastrowid
+        else:
+            return None
+        self._term_ids[term] = term_id
+        return term_id
+
+    def _remove(self, bugid):
+        '''
+        Removes bug postings without committing.
+        '''
+        self.connection.execute(
+            'DELETE FROM postings WHERE bug_id = ?', (bugid,)
+        )
+        self.connection.execute(
+            'DELETE FROM documents WHERE bug_id = ?', (bugid,)
+        )
+
+    def remove_bug(self, bugid):
+        '''
+        Removes bug from the index.
+        '''
+        self._remove(int(bugid))
+        self.connection.commit()
+
+    def index_bugs(self, bugs):
+        '''
+        Adds or updates bugs in the index, bugs which were not changed
+        since they were indexed are skipped.
+
+        Returns list of indexed bug ids.
+        '''
+        result = []
+        for bug in bugs:
+            bugid = int(bug.bug_id)
+            delta_ts = format_timestamp(bug.delta_ts)
+            row = self.connection.execute(
+                'SELECT delta_ts FROM documents WHERE bug_id = ?', (bugid,)
+            ).fetchone()
+            if row is not None and delta_ts is not None and row[0] == delta_ts:
+                continue
+            self._remove(bugid)
+
+            positions = {}
+            position = 0
+            for text in get_bug_texts(bug):
+                for term in tokenize(text):
+                    positions.setdefault(term, []).append(position)
+                    position += 1
+                # Gap so that phrases do not match across texts
+                position += 1
+
+            self.connection.executemany(
+                'INSERT INTO postings (term_id, bug_id, positions) '
+                'VALUES (?, ?, ?)',
+                [
+                    (
+                        self._get_term_id(term, True),
+                        bugid,
+                        ' '.join([str(item) for item in items]),
+                    )
+                    for term, items in positions.items()
+                ]
+            )
+            self.connection.execute(
+                'INSERT INTO documents (bug_id, delta_ts) VALUES (?, ?)',
+                (bugid, delta_ts)
+            )
+            result.append(bugid)
+        self.connection.commit()
+        self.logger.info('Indexed %d bugs', len(result))
+        return result
+
+    def _get_frequency(self, term_id):
+        '''
+        Returns number of bugs containing term.
+        '''
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM postings WHERE term_id = ?', (term_id,)
+        ).fetchone()[0]
+
+    def _get_postings(self, term_id, bug_ids=None):
+        '''
+        Returns dictionary of term positions for every bug containing it.
+
+        The lookup can be limited to set of bug ids, these are passed to
+        the database so that only matching postings are loaded.
+        '''
+        if bug_ids is None:
+            return dict(self.connection.execute(
+                'SELECT bug_id, positions FROM postings WHERE term_id = ?',
+                (term_id,)
+            ))
+        result = {}
+        bug_ids = sorted(bug_ids)
+        for start in range(0, len(bug_ids), CANDIDATES_CHUNK):
+            chunk = bug_ids[start:start + CANDIDATES_CHUNK]
+            result.update(self.connection.execute(
+                'SELECT bug_id, positions FROM postings '
+                'WHERE term_id = ? AND bug_id IN ({0})'.format(
+                    ', '.join(['?'] * len(chunk))
+                ),
+                [term_id] + chunk
+            ))
+        return result
+
+    def search_term(self, term):
+        '''
+        Returns sorted list of bug ids containing term.
+        '''
+        return self.search_phrase([term])
+
+    def search_phrase(self, terms, bug_ids=None):
+        '''
+        Returns sorted list of bug ids containing terms in given order.
+
+        The search can be limited to set of bug ids.
+        '''
+        term_ids = [self._get_term_id(term.lower()) for term in terms]
+        if not term_ids or None in term_ids:
+            return []
+
+        # Start with the least frequent term to keep candidates low
+        postings = {}
+        for term_id in sorted(set(term_ids), key=self._get_frequency):
+            postings[term_id] = self._get_postings(term_id, bug_ids)
+            bug_ids = set(postings[term_id])
+            if not bug_ids:
+                return []
+        if len(term_ids) == 1:
+            return sorted(bug_ids)
+
+        result = []
+        for bugid in bug_ids:
+            # Positions where the phrase would start according to each term
+            starts = None
+            for offset, term_id in enumerate(term_ids):
+                positions = set([
+                    int(position) - offset
+                    for position in postings[term_id][bugid].split()
+                ])
+                if starts is None:
+                    starts = positions
+                else:
+                    starts &= positions
+                if not starts:
+                    break
+            if starts:
+                result.append(bugid)
+        return sorted(result)
+
+    def search(self, query):
+        '''
+        Returns sorted list of bug ids matching all terms and phrases in the
+        query. Phrases are written in double quotes.
+        '''
+        bug_ids = None
+        for phrase in parse_query(query):
+            bug_ids = set(self.search_phrase(phrase, bug_ids))
+            if not bug_ids:
+                return []
+        if bug_ids is None:
+            return []
+        return sorted(bug_ids)
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM documents'
+        ).fetchone()[0]
+
+    def __contains__(self, bugid):
+        return self.connection.execute(
+            'SELECT 1 FROM documents WHERE bug_id = ?', (int(bugid),)
+        ).fetchone() is not None